@@ -2,14 +2,16 @@ import numpy as np
 import pandas as pd
 import os
 import joblib
+import time
 from typing import List, Dict, Any
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score
 from datetime import datetime
 from simple_ai import simple_ai
+from walk_forward import PurgedWalkForwardSplit, chronological_train_test_split, walk_forward_cross_validate
+from labeling import fixed_threshold_labels
 
 class AdvancedAI:
     def __init__(self):
@@ -22,26 +24,12 @@ class AdvancedAI:
         self.is_trained = False
         self.model_path = "/app/models/"
         self.feature_importance = {}
+        self.feature_columns = None  # الأعمدة المختارة عند التدريب - لا يُعاد الاختيار عند التنبؤ
+        self.model_version = None  # توقيت ملف النموذج - يدخل في مفاتيح التخزين المؤقت
 
         # إنشاء مجلد النماذج إذا لم يكن موجوداً
         os.makedirs(self.model_path, exist_ok=True)
 
-    def clean_numpy_types(self, obj):
-        """تحويل numpy types إلى Python types للـ JSON"""
-        if isinstance(obj, (np.integer, np.int64, np.int32)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64, np.float32)):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, dict):
-            return {k: self.clean_numpy_types(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self.clean_numpy_types(item) for item in obj]
-        elif pd.isna(obj):
-            return None
-        return obj
-
     def engineer_advanced_features(self, prices: List[float], volumes: List[float] = None) -> pd.DataFrame:
         """
         هندسة ميزات متقدمة ومحسنة
@@ -243,52 +231,61 @@ class AdvancedAI:
         """
         إنشاء أهداف التدريب (صعود/هبوط)
         """
-        targets = []
-        for i in range(len(prices) - future_periods):
-            current_price = prices[i]
-            future_price = prices[i + future_periods]
+        # 1 للصعود، 0 للهبوط - آخر هدف يتكرر للوصول لنفس طول المصفوفة
+        return fixed_threshold_labels(prices, horizon=future_periods, up_threshold=0.0, pad="last")
+
+    def build_training_dataset(self, prices: List[float], volumes: List[float] = None,
+                               future_periods: int = 1) -> Dict[str, Any]:
+        """
+        الميزات والأهداف مع موقع كل صف في الأسعار - الصيغة المحفوظة في لقطات التدريب
+        """
+        if len(prices) < 50:
+            return {"error": "يحتاج 50 نقطة على الأقل للتدريب المتقدم"}
 
-            # 1 للصعود، 0 للهبوط
-            target = 1 if future_price > current_price else 0
-            targets.append(target)
+        # هندسة الميزات
+        features_df = self.engineer_advanced_features(prices, volumes)
 
-        # إضافة نقاط للوصول لنفس طول المصفوفة
-        for _ in range(future_periods):
-            targets.append(targets[-1] if targets else 0)
+        # اختيار الميزات المهمة
+        feature_columns = self.select_important_features(features_df)
+        X = features_df[feature_columns].values
 
-        return np.array(targets)
+        # إنشاء الأهداف
+        y = self.create_targets(prices, future_periods)
 
-    def train_ensemble(self, prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+        # إزالة القيم المفقودة
+        valid_indices = ~(np.isnan(y) | np.isnan(X).any(axis=1))
+
+        return {
+            "X": X[valid_indices],
+            "y": y[valid_indices],
+            "row_index": np.flatnonzero(valid_indices),
+            "feature_columns": feature_columns
+        }
+
+    def train_ensemble(self, prices: List[float], volumes: List[float] = None, cv_folds: int = 0,
+                       dataset: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         تدريب مجموعة النماذج
+        cv_folds: طيات التحقق الزمني (0 = بدون) - مجمع عمليات spawn جديد لكل نموذج فهو اختياري
+        dataset: بيانات جاهزة (من build_training_dataset أو لقطة تدريب) بدلاً من حسابها من الأسعار
         """
         try:
-            print(f"Training with {len(prices)} price points")
-
-            if len(prices) < 50:
-                return {"error": "يحتاج 50 نقطة على الأقل للتدريب المتقدم"}
-
-            # هندسة الميزات
-            features_df = self.engineer_advanced_features(prices, volumes)
+            future_periods = 1
+            if dataset is None:
+                print(f"Training with {len(prices)} price points")
+                dataset = self.build_training_dataset(prices, volumes, future_periods)
+            if "error" in dataset:
+                return dataset
 
-            # اختيار الميزات المهمة
-            feature_columns = self.select_important_features(features_df)
-            X = features_df[feature_columns].values
-
-            # إنشاء الأهداف
-            y = self.create_targets(prices)
-
-            # إزالة القيم المفقودة
-            valid_indices = ~(np.isnan(y) | np.isnan(X).any(axis=1))
-            X = X[valid_indices]
-            y = y[valid_indices]
+            feature_columns = dataset["feature_columns"]
+            X, y = dataset["X"], dataset["y"]
 
             if len(X) < 50:
                 return {"error": "بيانات صالحة غير كافية للتدريب"}
 
-            # تقسيم البيانات
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=y
+            # تقسيم زمني: الاختبار هو الفترة الأخيرة مع حذف الصفوف المتداخلة مع أهدافها
+            X_train, X_test, y_train, y_test = chronological_train_test_split(
+                X, y, test_size=0.2, purge=future_periods
             )
 
             # تطبيع البيانات
@@ -297,7 +294,18 @@ class AdvancedAI:
 
             # تدريب النماذج
             model_scores = {}
+            walk_forward_cv = {}
             for name, model in self.models.items():
+                if cv_folds > 0:
+                    try:
+                        walk_forward_cv[name] = walk_forward_cross_validate(
+                            model, X_train, y_train,
+                            PurgedWalkForwardSplit(n_splits=cv_folds, purge=future_periods),
+                            scaler=StandardScaler()
+                        )
+                    except ValueError as e:
+                        walk_forward_cv[name] = {"error": str(e)}
+
                 try:
                     # تدريب النموذج
                     model.fit(X_train_scaled, y_train)
@@ -313,7 +321,8 @@ class AdvancedAI:
                 except Exception as e:
                     model_scores[name] = {'error': str(e)}
 
-            # حفظ النماذج
+            # حفظ النماذج مع الأعمدة المختارة
+            self.feature_columns = list(feature_columns)
             self.save_ensemble()
             self.is_trained = True
 
@@ -334,10 +343,11 @@ class AdvancedAI:
                 "best_accuracy": round(valid_scores.get(best_model, 0), 3),
                 "performance_level": self.get_performance_level(valid_scores.get(best_model, 0)),
                 "top_features": self.get_top_features(5),
-                "enhancement_used": self.has_enhanced_indicators()
+                "enhancement_used": self.has_enhanced_indicators(),
+                "walk_forward_cv": walk_forward_cv
             }
 
-            return self.clean_numpy_types(result)
+            return result
 
         except Exception as e:
             return {"error": f"فشل التدريب المتقدم: {str(e)}"}
@@ -355,7 +365,7 @@ class AdvancedAI:
 
             # هندسة الميزات
             features_df = self.engineer_advanced_features(prices, volumes)
-            feature_columns = self.select_important_features(features_df)
+            feature_columns = self._resolve_feature_columns(features_df)
 
             # أخذ آخر نقطة للتنبؤ
             X = features_df[feature_columns].iloc[-1:].values
@@ -366,23 +376,19 @@ class AdvancedAI:
             # تطبيع البيانات
             X_scaled = self.scaler.transform(X)
 
-            # التنبؤ من كل نموذج
+            # التنبؤ من كل نموذج - استدعاء واحد للاحتماليات والصنف من argmax
+            prediction_times = {}
+            model_probabilities = self._ensemble_probabilities(X_scaled, prediction_times)
+
             predictions = {}
             probabilities = {}
 
-            for name, model in self.models.items():
-                try:
-                    pred = model.predict(X_scaled)[0]
-                    prob = model.predict_proba(X_scaled)[0] if hasattr(model, 'predict_proba') else [0.5, 0.5]
-
-                    predictions[name] = int(pred)
-                    probabilities[name] = {
-                        'down': float(prob[0] * 100),
-                        'up': float(prob[1] * 100)
-                    }
-                except Exception as e:
-                    predictions[name] = 0
-                    probabilities[name] = {'down': 50.0, 'up': 50.0}
+            for name, proba in model_probabilities.items():
+                predictions[name] = int(np.argmax(proba[0]))
+                probabilities[name] = {
+                    'down': float(proba[0][0] * 100),
+                    'up': float(proba[0][1] * 100)
+                }
 
             # التنبؤ المجمع
             ensemble_prediction = self.combine_predictions(predictions, probabilities)
@@ -395,14 +401,110 @@ class AdvancedAI:
                 "individual_predictions": predictions,
                 "individual_probabilities": probabilities,
                 "model_agreement": agreement,
+                "prediction_times_ms": prediction_times,
                 "feature_analysis": self.analyze_current_features(features_df.iloc[-1])
             }
 
-            return self.clean_numpy_types(result)
+            return result
 
         except Exception as e:
             return {"error": f"فشل التنبؤ: {str(e)}"}
 
+    def predict_batch(self, candles_by_symbol: Dict[str, List[Dict]]) -> Dict[str, Dict[str, Any]]:
+        """
+        التنبؤ لعدة عملات دفعة واحدة - مصفوفة ميزات واحدة واستدعاء واحد لكل نموذج
+        """
+        if not self.is_trained:
+            return {symbol: {"error": "النماذج غير مدربة"} for symbol in candles_by_symbol}
+
+        results = {}
+        feature_columns = None
+        rows = []
+        current_features = {}
+
+        for symbol, candles in candles_by_symbol.items():
+            try:
+                prices = [float(candle['close']) for candle in candles or []]
+                volumes = [float(candle.get('volume', 0)) for candle in candles or []]
+                if len(prices) < 50:
+                    results[symbol] = {"error": "يحتاج 50 نقطة على الأقل للتنبؤ"}
+                    continue
+
+                features_df = self.engineer_advanced_features(prices, volumes)
+                if feature_columns is None:
+                    feature_columns = self._resolve_feature_columns(features_df)
+
+                X = features_df[feature_columns].iloc[-1].values.astype(float)
+                if np.isnan(X).any():
+                    results[symbol] = {"error": "بيانات غير صالحة للتنبؤ"}
+                    continue
+
+                rows.append((symbol, X))
+                current_features[symbol] = features_df.iloc[-1]
+            except Exception as e:
+                results[symbol] = {"error": f"فشل التنبؤ: {str(e)}"}
+
+        if not rows:
+            return results
+
+        try:
+            X_scaled = self.scaler.transform(np.vstack([X for _, X in rows]))
+            model_probabilities = self._ensemble_probabilities(X_scaled)
+        except Exception as e:
+            for symbol, _ in rows:
+                results[symbol] = {"error": f"فشل التنبؤ: {str(e)}"}
+            return results
+
+        for i, (symbol, _) in enumerate(rows):
+            predictions = {}
+            probabilities = {}
+            for name, proba in model_probabilities.items():
+                predictions[name] = int(np.argmax(proba[i]))
+                probabilities[name] = {
+                    'down': float(proba[i][0] * 100),
+                    'up': float(proba[i][1] * 100)
+                }
+
+            results[symbol] = {
+                "ensemble_prediction": self.combine_predictions(predictions, probabilities),
+                "individual_predictions": predictions,
+                "individual_probabilities": probabilities,
+                "model_agreement": self.calculate_model_agreement(predictions),
+                "feature_analysis": self.analyze_current_features(current_features[symbol])
+            }
+
+        return results
+
+    def _resolve_feature_columns(self, features_df: pd.DataFrame) -> List[str]:
+        """
+        أعمدة الميزات المستخدمة في التدريب إن كانت معروفة، وإلا الاختيار العادي
+        """
+        if self.feature_columns and all(col in features_df.columns for col in self.feature_columns):
+            return list(self.feature_columns)
+        for importance in self.feature_importance.values():
+            columns = list(importance.keys())
+            if columns and all(col in features_df.columns for col in columns):
+                return columns
+        return self.select_important_features(features_df)
+
+    def _ensemble_probabilities(self, X_scaled: np.ndarray, prediction_times: Dict[str, float] = None) -> Dict[str, np.ndarray]:
+        """
+        احتماليات [down, up] لكل نموذج لجميع الصفوف في استدعاء واحد
+        """
+        model_probabilities = {}
+        for name, model in self.models.items():
+            start = time.perf_counter()
+            try:
+                if hasattr(model, 'predict_proba'):
+                    model_probabilities[name] = model.predict_proba(X_scaled)
+                else:
+                    model_probabilities[name] = np.full((len(X_scaled), 2), 0.5)
+            except Exception:
+                model_probabilities[name] = np.full((len(X_scaled), 2), 0.5)
+            if prediction_times is not None:
+                prediction_times[name] = round((time.perf_counter() - start) * 1000, 2)
+        return model_probabilities
+
     def combine_predictions(self, predictions: Dict, probabilities: Dict) -> Dict[str, Any]:
         """
         دمج تنبؤات النماذج المختلفة
@@ -584,10 +686,15 @@ class AdvancedAI:
             # حفظ scaler
             scaler_path = f"{self.model_path}advanced_scaler.pkl"
             joblib.dump(self.scaler, scaler_path)
+            self.model_version = str(int(os.path.getmtime(scaler_path)))
 
             # حفظ أهمية الميزات
             if self.feature_importance:
                 joblib.dump(self.feature_importance, f"{self.model_path}feature_importance.pkl")
+
+            # الأعمدة المختارة - نفس ترتيب أعمدة المطبّع
+            if self.feature_columns:
+                joblib.dump(self.feature_columns, f"{self.model_path}advanced_features.pkl")
         except Exception as e:
             print(f"خطأ في حفظ النماذج: {e}")
 
@@ -606,12 +713,17 @@ class AdvancedAI:
             scaler_path = f"{self.model_path}advanced_scaler.pkl"
             if os.path.exists(scaler_path):
                 self.scaler = joblib.load(scaler_path)
+                self.model_version = str(int(os.path.getmtime(scaler_path)))
 
             # تحميل أهمية الميزات
             importance_path = f"{self.model_path}feature_importance.pkl"
             if os.path.exists(importance_path):
                 self.feature_importance = joblib.load(importance_path)
 
+            features_path = f"{self.model_path}advanced_features.pkl"
+            if os.path.exists(features_path):
+                self.feature_columns = joblib.load(features_path)
+
             if loaded_models > 0:
                 self.is_trained = True
                 return {"model_loaded": True, "models_count": loaded_models}
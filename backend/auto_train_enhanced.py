@@ -1,20 +1,57 @@
 # ملف: backend/auto_train_enhanced.py
 import asyncio
+import os
 from enhanced_advanced_ai import enhanced_advanced_ai
+from shared_state import model_registry
 from binance_client import BinanceClient, extract_close_prices
 import schedule
 import time
 
+# العملات الرئيسية
+SYMBOLS = [
+    "BTCUSDT", "ETHUSDT", "BNBUSDT",
+    "ADAUSDT", "XRPUSDT", "SOLUSDT",
+    "DOTUSDT", "AVAXUSDT", "MATICUSDT"
+]
+
+# live: استبدال النماذج الحية فوراً - shadow: حفظ مرشح يعمل في الظل حتى ترقيته من /ai/enhanced/shadow/promote
+DEPLOY_MODE = os.getenv("ENHANCED_DEPLOY_MODE", "live").lower()
+# التدريب الموزع: العملة التي تُنشر حزمتها للخادم - باقي العملات تُحفظ في مجلداتها
+SERVE_SYMBOL = os.getenv("ENHANCED_SERVE_SYMBOL", "BTCUSDT").upper()
+
+
+def train_all_symbols_distributed():
+    """تدريب موزع عبر Ray: مهمة لكل (عملة، نموذج) - محلياً أو على العنقود في RAY_ADDRESS"""
+    from distributed_training import DistributedTrainer
+
+    trainer = DistributedTrainer(serve_path=enhanced_advanced_ai.model_path)
+    summary = trainer.train_symbols(SYMBOLS, "1h", 2000, optimize_symbols=["BTCUSDT"], deploy=DEPLOY_MODE,
+                                    serve_symbol=SERVE_SYMBOL)
+    if "error" in summary:
+        print(f"❌ {summary['error']}")
+        return summary
+
+    for symbol, result in summary["symbols"].items():
+        if "error" in result:
+            print(f"❌ {symbol}: {result['error']}")
+
+    # الإصدار الذي دُرب فعلاً للعملة المنشورة - عمال الخادم يعيدون التحميل من serve_path
+    if summary["served_model_version"]:
+        model_registry.publish("enhanced_ai", summary["served_model_version"])
+        print(f"📦 {SERVE_SYMBOL}: نُشر الإصدار {summary['served_model_version']}")
+    elif DEPLOY_MODE != "shadow":
+        print(f"⚠️ {SERVE_SYMBOL}: لم يُنشر إصدار جديد - النماذج الحية لم تتغير")
+
+    print(f"\n✅ اكتمل التدريب الموزع: {len(summary['successful_symbols'])}/{len(SYMBOLS)} "
+          f"عملة في {summary['total_time_seconds']} ثانية ({summary['cluster']['mode']})")
+    return summary
+
+
 async def train_all_symbols():
     """تدريب النماذج لجميع العملات المهمة"""
     binance_client = BinanceClient()
     
-    # العملات الرئيسية
-    symbols = [
-        "BTCUSDT", "ETHUSDT", "BNBUSDT", 
-        "ADAUSDT", "XRPUSDT", "SOLUSDT",
-        "DOTUSDT", "AVAXUSDT", "MATICUSDT"
-    ]
+    symbols = SYMBOLS
     
     for symbol in symbols:
         print(f"\n{'='*50}")
@@ -25,17 +62,22 @@ async def train_all_symbols():
             # جلب البيانات
             klines = binance_client.get_klines(symbol, "1h", 2000)
             prices = extract_close_prices(klines)
-            volumes = [float(k[5]) for k in klines]
+            volumes = [float(k['volume']) for k in klines]
             
             # التدريب
             result = enhanced_advanced_ai.train_enhanced_ensemble(
                 prices, 
                 volumes,
-                optimize_hyperparameters=(symbol == "BTCUSDT")  # تحسين BTC فقط
+                optimize_hyperparameters=(symbol == "BTCUSDT"),  # تحسين BTC فقط
+                symbol=symbol,
+                interval="1h",
+                deploy=DEPLOY_MODE
             )
             
             if "error" not in result:
                 print(f"✅ {symbol}: Accuracy={result['average_accuracy']:.1%}")
+                # عمال الخادم يعيدون تحميل النماذج عند تغير الإصدار الحي (لا يتغير في وضع shadow)
+                model_registry.publish("enhanced_ai", enhanced_advanced_ai.model_version)
             else:
                 print(f"❌ {symbol}: {result['error']}")
                 
@@ -47,6 +89,9 @@ async def train_all_symbols():
     
     print("\n✅ اكتمل التدريب لجميع العملات!")
 
-# تشغيل التدريب
+# تشغيل التدريب - TRAINING_BACKEND=ray للتدريب الموزع
 if __name__ == "__main__":
-    asyncio.run(train_all_symbols())
+    if os.getenv("TRAINING_BACKEND", "serial").lower() == "ray":
+        train_all_symbols_distributed()
+    else:
+        asyncio.run(train_all_symbols())
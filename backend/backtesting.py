@@ -7,11 +7,15 @@ from indicators import comprehensive_analysis, calculate_macd, calculate_rsi
 from simple_ai import simple_ai
 from advanced_ai import advanced_ai
 from binance_client import BinanceClient, extract_close_prices
+from training_snapshots import training_snapshots, array_to_candles
+from labeling import fixed_threshold_labels
+from shared_state import shared_state
 
 class ImprovedBacktestingEngine:
     def __init__(self):
         self.binance_client = BinanceClient()
-        self.results = {}
+        # آخر نتيجة لكل عملة - مشتركة بين العمال
+        self.results = shared_state.namespace("backtest:results")
         
     def prepare_extended_historical_data(self, symbol: str, days: int = 90, interval: str = "1h") -> List[Dict]:
         """
@@ -35,29 +39,11 @@ class ImprovedBacktestingEngine:
         """
         إنشاء أهداف أكثر واقعية - التنبؤ بـ 4 ساعات بدلاً من ساعة واحدة
         """
-        targets = []
-        for i in range(len(prices) - prediction_horizon):
-            current_price = prices[i]
-            future_price = prices[i + prediction_horizon]
-            
-            # استخدام threshold أكبر لتجنب الضوضاء
-            price_change = (future_price - current_price) / current_price
-            
-            # تصنيف أكثر وضوحاً: صعود/هبوط أكبر من 0.5%
-            if price_change > 0.005:  # صعود أكبر من 0.5%
-                target = 1
-            elif price_change < -0.005:  # هبوط أكبر من 0.5%
-                target = 0
-            else:  # استقرار - نتجاهل هذه النقاط
-                target = -1  # سنحذفها لاحقاً
-            
-            targets.append(target)
-        
-        # إضافة نقاط للوصول لنفس طول المصفوفة
-        for _ in range(prediction_horizon):
-            targets.append(targets[-1] if targets else 0)
-        
-        return np.array(targets)
+        # threshold أكبر لتجنب الضوضاء: صعود/هبوط أكبر من 0.5%، والاستقرار -1 (نحذفه لاحقاً)
+        return fixed_threshold_labels(
+            prices, horizon=prediction_horizon, up_threshold=0.005, down_threshold=0.005,
+            neutral=-1, pad="last"
+        )
     
     def simulate_improved_trading_signals(self, data: List[Dict], lookback_period: int = 200) -> List[Dict]:
         """
@@ -389,15 +375,26 @@ class ImprovedBacktestingEngine:
         
         return summary
     
-    def run_improved_backtest(self, symbol: str, days: int = 30, interval: str = "1h") -> Dict[str, Any]:
+    def run_improved_backtest(self, symbol: str, days: int = 30, interval: str = "1h",
+                              snapshot: str = None) -> Dict[str, Any]:
         """
         تشغيل اختبار أداء محسن
+        snapshot: إعادة التشغيل على شموع لقطة محفوظة (latest أو رقم الإصدار) لمقارنة النتائج
         """
         print(f"بدء اختبار الأداء المحسن لـ {symbol} لمدة {days} أيام...")
         
         # جلب بيانات أكثر للتدريب الأفضل
         extended_days = max(days * 2, 90)  # بيانات إضافية للتدريب
-        historical_data = self.prepare_extended_historical_data(symbol, extended_days, interval)
+        if snapshot:
+            saved = training_snapshots.load(symbol, interval, "backtest", snapshot)
+            if not saved:
+                return {"error": f"لا توجد لقطة {snapshot} لـ {symbol} {interval}"}
+            historical_data = array_to_candles(saved["candles"])
+            snapshot_version = saved["manifest"]["version"]
+        else:
+            historical_data = self.prepare_extended_historical_data(symbol, extended_days, interval)
+            if historical_data:
+                snapshot_version = training_snapshots.save(symbol, interval, "backtest", historical_data).get("version")
         
         if not historical_data:
             return {"error": "فشل في جلب البيانات التاريخية"}
@@ -415,13 +412,14 @@ class ImprovedBacktestingEngine:
         # حساب مقاييس الأداء المحسنة
         performance_metrics = self.calculate_improved_performance_metrics(signals)
         
-        # حفظ النتائج
-        self.results[symbol] = {
+        # حفظ النتائج - تُرجع النسخة المحلية: الكتابة تُهمل بصمت إذا تعطل المخزن
+        result = {
             'symbol': symbol,
             'test_period': f"{days} days",
             'training_period': f"{extended_days} days",
             'interval': interval,
             'total_data_points': len(historical_data),
+            'snapshot_version': snapshot_version,
             'total_signals': len(signals),
             'metrics': performance_metrics,
             'improvements': [
@@ -432,13 +430,14 @@ class ImprovedBacktestingEngine:
             ],
             'test_timestamp': datetime.now().isoformat()
         }
+        self.results[symbol] = result
         
-        return self.results[symbol]
+        return result
 # للتوافق مع النسخة القديمة
 class BacktestingEngine(ImprovedBacktestingEngine):
-    def run_backtest(self, symbol: str, days: int = 30, interval: str = "1h"):
+    def run_backtest(self, symbol: str, days: int = 30, interval: str = "1h", snapshot: str = None):
         """wrapper للطريقة القديمة"""
-        return self.run_improved_backtest(symbol, days, interval)
+        return self.run_improved_backtest(symbol, days, interval, snapshot)
 
 # إنشاء instances
 backtesting_engine = BacktestingEngine()
@@ -6,6 +6,16 @@ from datetime import datetime, timedelta
 class BinanceClient:
     def __init__(self):
         self.base_url = "https://api.binance.com"
+        self.used_weight = None  # وزن الطلبات المستهلك في الدقيقة الحالية حسب آخر رد
+
+    def _get(self, endpoint: str, params: Dict = None, timeout: int = 10) -> requests.Response:
+        """طلب GET مع تسجيل الوزن المستهلك من ترويسة Binance"""
+        response = requests.get(endpoint, params=params, timeout=timeout)
+        used_weight = response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used_weight is not None:
+            self.used_weight = int(used_weight)
+        response.raise_for_status()
+        return response
         
     def get_klines(self, symbol: str, interval: str = "1h", limit: int = 100) -> Optional[List[Dict]]:
         """
@@ -19,8 +29,7 @@ class BinanceClient:
                 "limit": limit
             }
             
-            response = requests.get(endpoint, params=params, timeout=10)
-            response.raise_for_status()
+            response = self._get(endpoint, params=params, timeout=10)
             
             data = response.json()
             
@@ -54,8 +63,7 @@ class BinanceClient:
             endpoint = f"{self.base_url}/api/v3/ticker/price"
             params = {"symbol": symbol.upper()}
             
-            response = requests.get(endpoint, params=params, timeout=5)
-            response.raise_for_status()
+            response = self._get(endpoint, params=params, timeout=5)
             
             data = response.json()
             return float(data["price"])
@@ -70,8 +78,7 @@ class BinanceClient:
         """
         try:
             endpoint = f"{self.base_url}/api/v3/exchangeInfo"
-            response = requests.get(endpoint, timeout=10)
-            response.raise_for_status()
+            response = self._get(endpoint, timeout=10)
             
             data = response.json()
             usdt_symbols = []
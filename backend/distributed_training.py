@@ -0,0 +1,185 @@
+"""
+Distributed Multi-Symbol Training - Ray
+تدريب موزع لعدة عملات باستخدام Ray
+
+كل (عملة، نموذج) مهمة Ray مستقلة. مصفوفات التدريب لكل عملة تُرفع إلى
+مخزن الكائنات مرة واحدة وتشاركها مهام النماذج بدون نسخ.
+يعمل محلياً على جهاز واحد، أو على عنقود عند تحديد RAY_ADDRESS.
+
+المحرك الحي نموذج واحد في serve_path (/app/models/enhanced/): حزمة serve_symbol تُحفظ هناك
+فيحملها الخادم، وحزم باقي العملات تُحفظ لكل عملة في /app/models/enhanced/{SYMBOL}/
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from binance_client import BinanceClient, extract_close_prices
+from enhanced_advanced_ai import CANDIDATE_CHANNEL, EnhancedAdvancedAI, fit_and_evaluate_model
+from walk_forward import single_threaded
+
+try:
+    import ray
+
+    RAY_AVAILABLE = True
+except ImportError:
+    RAY_AVAILABLE = False
+    print("⚠️ Ray غير متاح - التدريب الموزع معطل")
+
+
+if RAY_AVAILABLE:
+    @ray.remote(num_cpus=1)
+    def _fit_model_task(name: str, model, X_train, y_train, X_test, y_test):
+        """مهمة Ray: تدريب نموذج واحد لعملة واحدة - المصفوفات تصل من مخزن الكائنات"""
+        return fit_and_evaluate_model(name, model, X_train, y_train, X_test, y_test)
+
+
+class DistributedTrainer:
+    """منسق التدريب الموزع لعدة عملات"""
+
+    def __init__(self, address: Optional[str] = None, model_root: str = "/app/models/enhanced/",
+                 serve_path: str = "/app/models/enhanced/"):
+        self.address = address or os.getenv("RAY_ADDRESS")
+        self.model_root = model_root
+        self.serve_path = serve_path
+        self.binance_client = None
+
+    def init(self) -> Dict[str, Any]:
+        """تشغيل Ray محلياً أو الاتصال بالعنقود"""
+        if not RAY_AVAILABLE:
+            return {"error": "Ray غير مثبت - pip install ray"}
+
+        if not ray.is_initialized():
+            # العمال يحتاجون مجلد backend في المسار لاستيراد المحركات
+            runtime_env = {"env_vars": {"PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}}
+            if self.address:
+                ray.init(address=self.address, runtime_env=runtime_env, ignore_reinit_error=True)
+            else:
+                ray.init(runtime_env=runtime_env, ignore_reinit_error=True, include_dashboard=False)
+
+        resources = ray.cluster_resources()
+        return {
+            "mode": "cluster" if self.address else "local",
+            "address": self.address,
+            "nodes": len(ray.nodes()),
+            "cpus": resources.get("CPU", 0)
+        }
+
+    def shutdown(self):
+        """إيقاف Ray (المحلي فقط - العنقود يبقى يعمل)"""
+        if RAY_AVAILABLE and ray.is_initialized():
+            ray.shutdown()
+
+    def symbol_model_path(self, symbol: str) -> str:
+        return os.path.join(self.model_root, symbol.upper()) + "/"
+
+    def train_symbols(self, symbols: List[str], interval: str = "1h", limit: int = 2000,
+                      optimize_symbols: List[str] = None, deploy: str = "live",
+                      serve_symbol: str = None) -> Dict[str, Any]:
+        """
+        تدريب جميع العملات: التحضير لكل عملة ثم مهمة Ray لكل (عملة، نموذج)
+        وبعد اكتمال مهام العملة يُجمع المحرك ويحفظ
+        deploy="shadow": يُحفظ كل محرك كمرشح في الظل بدلاً من استبدال النماذج الحية
+        serve_symbol: العملة التي تُحفظ حزمتها في serve_path (المحرك الذي يخدم التنبؤات)
+        """
+        cluster = self.init()
+        if "error" in cluster:
+            return cluster
+
+        start_time = datetime.now()
+        optimize_symbols = [s.upper() for s in (optimize_symbols or [])]
+        serve_symbol = serve_symbol.upper() if serve_symbol else None
+        self.binance_client = self.binance_client or BinanceClient()
+
+        engines = {}
+        prepared_by_symbol = {}
+        pending = {}
+        results = {}
+
+        # المرحلة 1: البيانات والتحضير، ثم إطلاق مهام النماذج فوراً
+        for symbol in symbols:
+            symbol = symbol.upper()
+            try:
+                klines = self.binance_client.get_klines(symbol, interval, limit)
+                if not klines:
+                    results[symbol] = {"error": "فشل في جلب البيانات"}
+                    continue
+
+                prices = extract_close_prices(klines)
+                volumes = [float(k['volume']) for k in klines]
+
+                model_path = self.serve_path if symbol == serve_symbol else self.symbol_model_path(symbol)
+                engine = EnhancedAdvancedAI(enable_parallel=False, model_path=model_path)
+                if deploy == "shadow":
+                    engine.bundle_channel = CANDIDATE_CHANNEL
+                prepared = engine.prepare_training_data(prices, volumes, symbol=symbol, interval=interval)
+                if "error" in prepared:
+                    results[symbol] = prepared
+                    continue
+
+                if symbol in optimize_symbols:
+                    prepared["hyperparameter_tuning"] = engine._tune_hyperparameters(
+                        prepared["X_train_scaled"], prepared["y_train"],
+                        prepared["feature_columns"], symbol, interval
+                    )
+
+                # رفع المصفوفات مرة واحدة - كل مهام النماذج تقرأ نفس الكائنات
+                X_train_ref = ray.put(prepared["X_train_scaled"])
+                y_train_ref = ray.put(prepared["y_train"])
+                X_test_ref = ray.put(prepared["X_test_scaled"])
+                y_test_ref = ray.put(prepared["y_test"])
+
+                pending[symbol] = {}
+                for name, model in engine.models.items():
+                    # خيط واحد لكل مهمة - Ray يوزع المهام على الأنوية
+                    task_model, thread_params = single_threaded(model)
+                    pending[symbol][name] = (
+                        _fit_model_task.remote(name, task_model, X_train_ref, y_train_ref, X_test_ref, y_test_ref),
+                        thread_params
+                    )
+
+                engines[symbol] = engine
+                prepared_by_symbol[symbol] = prepared
+                print(f"🚀 {symbol}: {len(pending[symbol])} مهام تدريب")
+
+            except Exception as e:
+                results[symbol] = {"error": f"فشل تحضير {symbol}: {str(e)}"}
+
+        # المرحلة 2: جمع النماذج المدربة وإنهاء كل عملة
+        for symbol, tasks in pending.items():
+            engine = engines[symbol]
+            try:
+                model_results = {}
+                for name, (ref, thread_params) in tasks.items():
+                    try:
+                        model, metrics = ray.get(ref)
+                        if thread_params:
+                            model.set_params(**thread_params)
+                        engine.models[name] = model
+                        model_results[name] = metrics
+                    except Exception as e:
+                        print(f"  ❌ فشل تدريب {name} ({symbol}): {e}")
+                        model_results[name] = {"error": str(e)}
+
+                prepared = prepared_by_symbol[symbol]
+                result = engine.finalize_training(prepared, model_results, start_time)
+                result["hyperparameter_tuning"] = prepared.get("hyperparameter_tuning", {})
+                result["model_path"] = engine.model_path
+                result["served"] = symbol == serve_symbol
+                results[symbol] = result
+                print(f"✅ {symbol}: Accuracy={result['average_accuracy']:.1%}")
+
+            except Exception as e:
+                results[symbol] = {"error": f"فشل إنهاء تدريب {symbol}: {str(e)}"}
+
+        served = results.get(serve_symbol, {"error": "not trained"}) if serve_symbol else {"error": "no serve_symbol"}
+        return {
+            "cluster": cluster,
+            "symbols": results,
+            "served_symbol": serve_symbol,
+            # الإصدار الحي الجديد - None في وضع shadow (المرشح لا يغير الحي) أو عند فشل العملة
+            "served_model_version": served.get("model_version") if deploy != "shadow" and "error" not in served else None,
+            "successful_symbols": [s for s, r in results.items() if "error" not in r],
+            "failed_symbols": [s for s, r in results.items() if "error" in r],
+            "total_time_seconds": round((datetime.now() - start_time).total_seconds(), 2)
+        }
@@ -1720,6 +1720,7 @@ import os
 import joblib
 import hashlib
 import json
+import time
 from typing import List, Dict, Any, Tuple, Optional
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
@@ -1732,9 +1733,11 @@ warnings.filterwarnings('ignore')
 from sklearn.ensemble import (
     RandomForestClassifier,
     GradientBoostingClassifier,
+    GradientBoostingRegressor,
     ExtraTreesClassifier,
     VotingClassifier,
-    AdaBoostClassifier
+    AdaBoostClassifier,
+    HistGradientBoostingClassifier
 )
 from sklearn.linear_model import LogisticRegression, RidgeClassifier
 from sklearn.neural_network import MLPClassifier
@@ -1756,7 +1759,7 @@ except ImportError:
 
 try:
     import lightgbm as lgb
-    from lightgbm import LGBMClassifier
+    from lightgbm import LGBMClassifier, LGBMRegressor
 
     LGBM_AVAILABLE = True
     print("✅ LightGBM متاح")
@@ -1773,26 +1776,141 @@ except ImportError:
     CATBOOST_AVAILABLE = False
     print("⚠️ CatBoost غير متاح - استخدام Extra Trees كبديل")
 
+from model_optimizer import model_optimizer
+from walk_forward import PurgedWalkForwardSplit, chronological_train_test_split, walk_forward_cross_validate
+from labeling import make_labels
+from feature_selection import select_features_for_snapshot, usable_columns_mask
+from training_snapshots import feature_version
+from model_bundle import (
+    LIVE_CHANNEL, discard_channel, manifest_path, promote_bundle, read_bundle, write_bundle
+)
+from prediction_ledger import PredictionLedger, ROLE_LIVE, ROLE_SHADOW
+
+BUNDLE_NAME = "enhanced_bundle"
+CANDIDATE_CHANNEL = "candidate"
+
+# default: الأشجار بالتقسيم الدقيق - fast: نسخ histogram بنفس السعة (ENHANCED_MODEL_PROFILE)
+MODEL_PROFILES = ("default", "fast")
+# كل نموذج في fast مقابل النموذج الذي يحل محله في default
+PROFILE_EQUIVALENTS = {
+    'lgbm_rf': 'enhanced_rf',
+    'hist_gb': 'enhanced_gb',
+    'hist_stumps': 'adaboost',
+    'xgboost': 'xgboost',
+    'lightgbm': 'lightgbm'
+}
+
+try:
+    from tree_inference import compile_tree_ensemble
+
+    COMPILED_INFERENCE_AVAILABLE = True
+except ImportError:
+    COMPILED_INFERENCE_AVAILABLE = False
+    print("⚠️ محرك الأشجار المُجمّع غير متاح - استخدام التنبؤ الأصلي")
+
+
+def fit_and_evaluate_model(name: str, model, X_train, y_train, X_test, y_test) -> Tuple[Any, Dict[str, Any]]:
+    """تدريب نموذج واحد وتقييمه - دالة مستقلة لتعمل محلياً أو كمهمة موزعة"""
+    try:
+        print(f"  📊 تدريب {name}...")
+        start = datetime.now()
+
+        # التدريب مع timeout
+        model.fit(X_train, y_train)
+
+        # التنبؤ
+        train_pred = model.predict(X_train)
+        test_pred = model.predict(X_test)
+
+        # حساب المقاييس
+        train_acc = accuracy_score(y_train, train_pred)
+        test_acc = accuracy_score(y_test, test_pred)
+
+        try:
+            precision = precision_score(y_test, test_pred, average='weighted', zero_division=0)
+            recall = recall_score(y_test, test_pred, average='weighted', zero_division=0)
+            f1 = f1_score(y_test, test_pred, average='weighted', zero_division=0)
+        except:
+            precision = recall = f1 = 0.5
+
+        training_time = (datetime.now() - start).total_seconds()
+
+        print(f"  ✅ {name} - Accuracy: {test_acc:.3f}, F1: {f1:.3f}")
+        return model, {
+            "accuracy": float(test_acc),
+            "train_accuracy": float(train_acc),
+            "precision": float(precision),
+            "recall": float(recall),
+            "f1_score": float(f1),
+            "training_time": float(training_time),
+            "overfitting_score": float(abs(train_acc - test_acc))
+        }
+
+    except Exception as e:
+        print(f"  ❌ فشل تدريب {name}: {e}")
+        return model, {"error": str(e)}
+
 
 class EnhancedAdvancedAI:
     """
     نظام الذكاء الاصطناعي المحسن مع إصلاح جميع الأخطاء
     """
 
-    def __init__(self, enable_parallel=True, cache_size=1000):
-        """تهيئة النظام المحسن"""
+    # أعمدة calculate_safe_indicators - تُحسب عند التنبؤ فقط إذا كان أحدها من الميزات المختارة
+    INDICATOR_FEATURES = frozenset(
+        ['rsi_14', 'macd_12_26', 'macd_signal', 'macd_histogram', 'volatility_20'] +
+        [f'ma_{period}' for period in (5, 10, 20, 50)] +
+        [f'price_to_ma_{period}' for period in (5, 10, 20, 50)] +
+        [f'price_change_{period}' for period in (1, 3, 5, 10)]
+    )
+
+    def __init__(self, enable_parallel=True, cache_size=1000, model_path: str = None, model_profile: str = None):
+        """
+        تهيئة النظام المحسن - model_path لمجلد نماذج خاص (مثلاً لكل عملة)
+        model_profile: default أو fast (نماذج histogram أسرع تدريباً)
+        """
+        model_path = model_path or "/app/models/enhanced/"
+        model_profile = model_profile or os.getenv("ENHANCED_MODEL_PROFILE", "default")
         try:
             self.enable_parallel = enable_parallel
             self.cache_size = cache_size
 
             # إعداد النماذج
-            self.models = self._initialize_enhanced_models()
+            self.model_profile = model_profile if model_profile in MODEL_PROFILES else "default"
+            self.models = self._initialize_enhanced_models(self.model_profile)
 
             # أدوات المعالجة
             self.scaler = RobustScaler()
             self.feature_selector = None
             self.is_trained = False
-            self.model_path = "/app/models/enhanced/"
+            self.model_path = model_path
+
+            # محرك الاستدلال المُجمّع للأشجار
+            self.use_compiled_inference = COMPILED_INFERENCE_AVAILABLE
+            self.compiled_ensemble = None
+            self.model_version = None  # توقيت ملف النموذج - يدخل في مفاتيح التخزين المؤقت
+
+            # النموذج الطالب المقطّر للوضع السريع
+            self.student_model = None
+            self.student_info = {"ready": False}
+            self.fast_mode_min_agreement = 0.9
+
+            # إعدادات الأهداف (labeling.make_labels) - horizon يحدد التطهير قبل فترة الاختبار
+            self.target_config = {"method": "fixed", "horizon": 1, "up_threshold": 0.01}
+
+            # الأعمدة المختارة بعد التقليم - تُحفظ مع النماذج والمطبّع وتُحسب وحدها عند التنبؤ
+            self.feature_columns = None
+            self.feature_selection = {}
+            self.feature_selection_params = {"max_features": 30, "correlation_threshold": 0.98}
+
+            # manifest حزمة النماذج المحفوظة (model_bundle)
+            self.bundle_manifest = None
+
+            # النشر: live يستبدل النماذج الحية، candidate يحفظ مرشحاً يعمل في الظل بجانبها
+            self.bundle_channel = LIVE_CHANNEL
+            self.shadow_engine = None
+            self._shadow_manifest_mtime = None
+            self.prediction_ledger = PredictionLedger(os.path.join(model_path, "prediction_ledger.bin"))
 
             # معلومات الأداء
             self.feature_importance = {}
@@ -1815,9 +1933,9 @@ class EnhancedAdvancedAI:
         except Exception as e:
             print(f"❌ خطأ في تهيئة Enhanced AI: {e}")
             # تهيئة أساسية للعمل
-            self._basic_initialization()
+            self._basic_initialization(model_path)
 
-    def _basic_initialization(self):
+    def _basic_initialization(self, model_path: str = "/app/models/enhanced/"):
         """تهيئة أساسية في حالة فشل التهيئة المتقدمة"""
         self.models = {
             'random_forest': RandomForestClassifier(n_estimators=100, random_state=42),
@@ -1825,40 +1943,60 @@ class EnhancedAdvancedAI:
         }
         self.scaler = StandardScaler()
         self.is_trained = False
-        self.model_path = "/app/models/enhanced/"
+        self.model_path = model_path
+        self.model_profile = "default"
         self.feature_importance = {}
         self.model_performance = {}
         self.training_history = []
         self.enable_parallel = False
+        self.use_compiled_inference = False
+        self.compiled_ensemble = None
+        self.model_version = None
+        self.student_model = None
+        self.student_info = {"ready": False}
+        self.fast_mode_min_agreement = 0.9
+        self.target_config = {"method": "fixed", "horizon": 1, "up_threshold": 0.01}
+        self.feature_columns = None
+        self.feature_selection = {}
+        self.feature_selection_params = {"max_features": 30, "correlation_threshold": 0.98}
+        self.bundle_manifest = None
+        self.bundle_channel = LIVE_CHANNEL
+        self.shadow_engine = None
+        self._shadow_manifest_mtime = None
+        self.prediction_ledger = PredictionLedger(os.path.join(model_path, "prediction_ledger.bin"))
         os.makedirs(self.model_path, exist_ok=True)
 
-    def _initialize_enhanced_models(self) -> Dict:
-        """تهيئة النماذج المحسنة مع معالجة الأخطاء"""
+    def _initialize_enhanced_models(self, profile: str = "default") -> Dict:
+        """تهيئة النماذج المحسنة مع معالجة الأخطاء - profile="fast" لنماذج histogram"""
         models = {}
+        fast = profile == "fast"
 
         try:
             # النماذج الأساسية المضمونة
-            models['enhanced_rf'] = RandomForestClassifier(
-                n_estimators=300,
-                max_depth=15,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                max_features='sqrt',
-                bootstrap=True,
-                n_jobs=-1,
-                random_state=42
-            )
+            if fast:
+                models.update(self._histogram_tree_models())
+            else:
+                models['enhanced_rf'] = RandomForestClassifier(
+                    n_estimators=300,
+                    max_depth=15,
+                    min_samples_split=5,
+                    min_samples_leaf=2,
+                    max_features='sqrt',
+                    bootstrap=True,
+                    n_jobs=-1,
+                    random_state=42
+                )
 
-            models['enhanced_gb'] = GradientBoostingClassifier(
-                n_estimators=200,
-                learning_rate=0.1,
-                max_depth=6,
-                min_samples_split=5,
-                min_samples_leaf=3,
-                subsample=0.8,
-                max_features='sqrt',
-                random_state=42
-            )
+                models['enhanced_gb'] = GradientBoostingClassifier(
+                    n_estimators=200,
+                    learning_rate=0.1,
+                    max_depth=6,
+                    min_samples_split=5,
+                    min_samples_leaf=3,
+                    subsample=0.8,
+                    max_features='sqrt',
+                    random_state=42
+                )
 
             models['extra_trees'] = ExtraTreesClassifier(
                 n_estimators=200,
@@ -1885,7 +2023,9 @@ class EnhancedAdvancedAI:
                         objective='binary:logistic',
                         n_jobs=-1,
                         random_state=42,
-                        verbosity=0
+                        verbosity=0,
+                        # الافتراضي في XGBoost 1.7 هو التقسيم الدقيق للبيانات الصغيرة
+                        **({'tree_method': 'hist', 'max_bin': 64} if fast else {})
                     )
                 except Exception as e:
                     print(f"⚠️ فشل تهيئة XGBoost: {e}")
@@ -1902,7 +2042,8 @@ class EnhancedAdvancedAI:
                         colsample_bytree=0.8,
                         n_jobs=-1,
                         random_state=42,
-                        verbose=-1
+                        verbose=-1,
+                        **({'max_bin': 63} if fast else {})
                     )
                 except Exception as e:
                     print(f"⚠️ فشل تهيئة LightGBM: {e}")
@@ -1923,11 +2064,12 @@ class EnhancedAdvancedAI:
                     print(f"⚠️ فشل تهيئة CatBoost: {e}")
 
             # النماذج الإضافية
-            models['adaboost'] = AdaBoostClassifier(
-                n_estimators=100,
-                learning_rate=1.0,
-                random_state=42
-            )
+            if not fast:
+                models['adaboost'] = AdaBoostClassifier(
+                    n_estimators=100,
+                    learning_rate=1.0,
+                    random_state=42
+                )
 
             models['neural_net'] = MLPClassifier(
                 hidden_layer_sizes=(50, 25),
@@ -1960,6 +2102,57 @@ class EnhancedAdvancedAI:
                 'gradient_boosting': GradientBoostingClassifier(n_estimators=100, random_state=42)
             }
 
+    def _histogram_tree_models(self) -> Dict:
+        """بدائل histogram لنماذج التقسيم الدقيق بنفس السعة (عدد الأشجار والعمق والأوراق)"""
+        models = {}
+
+        # بديل enhanced_rf: غابة عشوائية على bins في LightGBM
+        if LGBM_AVAILABLE:
+            models['lgbm_rf'] = LGBMClassifier(
+                boosting_type='rf',
+                n_estimators=300,
+                max_depth=15,
+                num_leaves=255,
+                min_child_samples=2,
+                subsample=0.632,
+                subsample_freq=1,
+                feature_fraction_bynode=0.3,
+                max_bin=63,
+                n_jobs=-1,
+                random_state=42,
+                verbose=-1
+            )
+        else:
+            models['enhanced_rf'] = RandomForestClassifier(
+                n_estimators=300, max_depth=15, min_samples_split=5, min_samples_leaf=2,
+                max_features='sqrt', n_jobs=-1, random_state=42
+            )
+
+        # بديل enhanced_gb
+        models['hist_gb'] = HistGradientBoostingClassifier(
+            max_iter=200,
+            learning_rate=0.1,
+            max_depth=6,
+            max_leaf_nodes=None,
+            min_samples_leaf=3,
+            max_bins=255,
+            early_stopping=False,
+            random_state=42
+        )
+
+        # بديل adaboost: تعزيز جذوع (عمق 1) بنفس العدد
+        models['hist_stumps'] = HistGradientBoostingClassifier(
+            max_iter=100,
+            learning_rate=0.5,
+            max_depth=1,
+            max_leaf_nodes=None,
+            max_bins=255,
+            early_stopping=False,
+            random_state=42
+        )
+
+        return models
+
     def calculate_safe_indicators(self, prices: List[float]) -> Dict[str, float]:
         """حساب المؤشرات الفنية بطريقة آمنة"""
         try:
@@ -2037,15 +2230,24 @@ class EnhancedAdvancedAI:
             print(f"⚠️ خطأ في حساب المؤشرات: {e}")
             return {}
 
-    def engineer_advanced_features(self, prices: List[float], volumes: List[float] = None) -> pd.DataFrame:
-        """هندسة ميزات متقدمة مع معالجة آمنة للأخطاء"""
+    def engineer_advanced_features(self, prices: List[float], volumes: List[float] = None,
+                                   columns: List[str] = None) -> pd.DataFrame:
+        """
+        هندسة ميزات متقدمة مع معالجة آمنة للأخطاء
+        columns: حساب مجموعات الميزات التي تحتاجها هذه الأعمدة فقط (الميزات المختارة عند التنبؤ)
+        """
         try:
             if len(prices) < 20:
                 # إرجاع ميزات أساسية للبيانات القليلة
                 return self._create_basic_features(prices, volumes)
 
+            needed = set(columns) if columns else None
+
             # حساب المؤشرات الآمنة
-            indicators = self.calculate_safe_indicators(prices)
+            if needed is None or needed & self.INDICATOR_FEATURES:
+                indicators = self.calculate_safe_indicators(prices)
+            else:
+                indicators = {}
 
             # إنشاء DataFrame
             df = pd.DataFrame({'price': prices})
@@ -2059,10 +2261,10 @@ class EnhancedAdvancedAI:
                 df[name] = value
 
             # ميزات إضافية آمنة
-            df = self._add_safe_features(df)
+            df = self._add_safe_features(df, needed)
 
             # ملء القيم المفقودة
-            df = df.fillna(method='ffill').fillna(method='bfill').fillna(0)
+            df = df.ffill().bfill().fillna(0)
 
             # إزالة القيم اللانهائية
             df = df.replace([np.inf, -np.inf], 0)
@@ -2112,11 +2314,14 @@ class EnhancedAdvancedAI:
                 'price_change': [0] * len(prices)
             })
 
-    def _add_safe_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """إضافة ميزات إضافية بطريقة آمنة"""
+    def _add_safe_features(self, df: pd.DataFrame, needed: set = None) -> pd.DataFrame:
+        """إضافة ميزات إضافية بطريقة آمنة - needed لتخطي المجموعات غير المطلوبة"""
+        def wanted(*names) -> bool:
+            return needed is None or any(name in needed for name in names)
+
         try:
             # Bollinger Bands البسيط
-            if len(df) >= 20:
+            if len(df) >= 20 and wanted('bb_upper', 'bb_lower', 'bb_position'):
                 ma_20 = df['price'].rolling(20, min_periods=10).mean()
                 std_20 = df['price'].rolling(20, min_periods=10).std()
                 df['bb_upper'] = ma_20 + (2 * std_20)
@@ -2126,14 +2331,14 @@ class EnhancedAdvancedAI:
 
             # Momentum
             for period in [3, 5, 10]:
-                if len(df) > period:
+                if len(df) > period and wanted(f'momentum_{period}'):
                     df[f'momentum_{period}'] = df['price'] / df['price'].shift(period) - 1
                     df[f'momentum_{period}'] = df[f'momentum_{period}'].fillna(0)
 
             # Volume features
             if 'volume' in df.columns:
                 for period in [5, 10]:
-                    if len(df) >= period:
+                    if len(df) >= period and wanted(f'volume_ma_{period}', f'volume_ratio_{period}'):
                         vol_ma = df['volume'].rolling(period, min_periods=1).mean()
                         df[f'volume_ma_{period}'] = vol_ma
                         df[f'volume_ratio_{period}'] = df['volume'] / vol_ma
@@ -2146,161 +2351,372 @@ class EnhancedAdvancedAI:
             return df
 
     def train_enhanced_ensemble(self, prices: List[float], volumes: List[float] = None,
-                                optimize_hyperparameters: bool = False) -> Dict[str, Any]:
-        """تدريب النماذج المحسنة مع معالجة شاملة للأخطاء"""
-        try:
-            print(f"🎯 بدء التدريب المحسن مع {len(prices)} نقطة بيانات")
+                                optimize_hyperparameters: bool = False,
+                                symbol: str = None, interval: str = "1h",
+                                cv_folds: int = 0, dataset: Dict[str, Any] = None,
+                                deploy: str = "live") -> Dict[str, Any]:
+        """
+        تدريب النماذج المحسنة مع معالجة شاملة للأخطاء
+        dataset: بيانات جاهزة (من build_training_dataset أو لقطة تدريب) بدلاً من حسابها من الأسعار
+        deploy: live يستبدل النماذج الحية - shadow يدرب مرشحاً يعمل في الظل حتى ترقيته
+        """
+        if deploy == "shadow" and self.bundle_channel == LIVE_CHANNEL:
+            candidate = self._create_candidate_engine()
+            result = candidate.train_enhanced_ensemble(
+                prices, volumes, optimize_hyperparameters, symbol, interval, cv_folds, dataset
+            )
+            if "error" not in result:
+                self.shadow_engine = candidate
+                self._shadow_manifest_mtime = self._candidate_manifest_mtime()
+                result["deploy"] = "shadow"
+                result["live_model_version"] = self.model_version
+            return result
 
-            if len(prices) < 50:
-                return {"error": "يحتاج 50 نقطة على الأقل للتدريب المحسن"}
+        try:
+            if dataset is None:
+                print(f"🎯 بدء التدريب المحسن مع {len(prices)} نقطة بيانات")
+            else:
+                print(f"🎯 بدء التدريب المحسن من بيانات جاهزة ({len(dataset.get('X', []))} صف)")
 
-            # هندسة الميزات
             start_time = datetime.now()
-            features_df = self.engineer_advanced_features(prices, volumes)
-            feature_time = (datetime.now() - start_time).total_seconds()
-            print(f"✅ هندسة الميزات اكتملت في {feature_time:.2f} ثانية - {len(features_df.columns)} ميزة")
+            prepared = self.prepare_training_data(prices, volumes, dataset, symbol, interval)
+            if "error" in prepared:
+                return prepared
+
+            # ضبط المعاملات بالبحث المتدرج - محفوظ لكل (عملة، فترة، إصدار الميزات)
+            tuning_results = {}
+            if optimize_hyperparameters:
+                tuning_results = self._tune_hyperparameters(
+                    prepared["X_train_scaled"], prepared["y_train"], prepared["feature_columns"], symbol, interval
+                )
+
+            # تحقق متقاطع زمني اختياري - الطيات في عمليات متوازية
+            walk_forward_cv = {}
+            if cv_folds > 0:
+                walk_forward_cv = self._walk_forward_evaluation(prepared["X_train"], prepared["y_train"], cv_folds)
+
+            # تدريب النماذج
+            print("🚀 بدء تدريب النماذج...")
+            model_results = self._safe_model_training(
+                prepared["X_train_scaled"], prepared["y_train"], prepared["X_test_scaled"], prepared["y_test"]
+            )
+            for name, cv_result in walk_forward_cv.items():
+                if name in model_results and 'error' not in model_results[name] and 'error' not in cv_result:
+                    model_results[name]["cv_accuracy"] = cv_result["mean_accuracy"]
+                    model_results[name]["cv_accuracy_std"] = cv_result["std_accuracy"]
+
+            result = self.finalize_training(prepared, model_results, start_time)
+            result["hyperparameter_tuning"] = tuning_results
+            result["walk_forward_cv"] = walk_forward_cv
+            return result
 
-            # اختيار الميزات
-            feature_columns = self._select_safe_features(features_df)
-            X = features_df[feature_columns].values
+        except Exception as e:
+            print(f"❌ خطأ في التدريب: {e}")
+            return {"error": f"فشل التدريب المحسن: {str(e)}"}
 
-            # إنشاء الأهداف
-            y = self._create_safe_targets(prices)
+    def build_training_dataset(self, prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+        """الميزات والأهداف مع موقع كل صف في الأسعار - الصيغة المحفوظة في لقطات التدريب"""
+        if len(prices) < 50:
+            return {"error": "يحتاج 50 نقطة على الأقل للتدريب المحسن"}
+
+        # هندسة الميزات
+        start_time = datetime.now()
+        features_df = self.engineer_advanced_features(prices, volumes)
+        feature_time = (datetime.now() - start_time).total_seconds()
+        print(f"✅ هندسة الميزات اكتملت في {feature_time:.2f} ثانية - {len(features_df.columns)} ميزة")
+
+        # اختيار الميزات
+        feature_columns = self._select_safe_features(features_df)
+        X = features_df[feature_columns].values
+
+        # إنشاء الأهداف
+        y = self._create_safe_targets(prices)
+
+        # التحقق من صحة البيانات
+        valid_indices = ~(np.isnan(y) | np.isnan(X).any(axis=1) | np.isinf(X).any(axis=1))
+
+        return {
+            "X": X[valid_indices],
+            "y": y[valid_indices],
+            "row_index": np.flatnonzero(valid_indices),
+            "feature_columns": feature_columns,
+            "feature_time": feature_time
+        }
 
-            # التحقق من صحة البيانات
-            valid_indices = ~(np.isnan(y) | np.isnan(X).any(axis=1) | np.isinf(X).any(axis=1))
-            X = X[valid_indices]
-            y = y[valid_indices]
+    def prepare_training_data(self, prices: List[float], volumes: List[float] = None,
+                              dataset: Dict[str, Any] = None, symbol: str = None,
+                              interval: str = "1h") -> Dict[str, Any]:
+        """
+        المرحلة الأولى: الميزات والأهداف والتقسيم الزمني وتقليم الميزات والتطبيع (يُدرَّب المطبّع هنا)
+        التقليم يُحسب على فترة التدريب فقط ويُحفظ مع لقطة التدريب إن وُجدت
+        """
+        if dataset is None:
+            dataset = self.build_training_dataset(prices, volumes)
+        if "error" in dataset:
+            return dataset
+
+        feature_columns = dataset["feature_columns"]
+        feature_time = dataset.get("feature_time", 0.0)
+        X, y = dataset["X"], dataset["y"]
+
+        if len(X) < 30:
+            return {"error": "بيانات صالحة غير كافية للتدريب"}
+
+        # تقسيم زمني: الاختبار هو الفترة الأخيرة مع حذف الصفوف المتداخلة مع أهدافها
+        # (التقسيم العشوائي يسرّب المستقبل إلى التدريب)
+        try:
+            # التأكد من وجود كلا الصنفين
+            unique_classes = np.unique(y)
+            if len(unique_classes) < 2:
+                return {"error": "يحتاج صنفين على الأقل للتدريب"}
 
-            if len(X) < 30:
-                return {"error": "بيانات صالحة غير كافية للتدريب"}
+            X_train, X_test, y_train, y_test = chronological_train_test_split(
+                X, y, test_size=0.2, purge=self.target_config["horizon"]
+            )
+            if len(np.unique(y_train)) < 2:
+                return {"error": "يحتاج صنفين على الأقل في فترة التدريب"}
+        except ValueError as e:
+            return {"error": f"فشل تقسيم البيانات: {str(e)}"}
+
+        # تقليم الميزات - مرة واحدة لكل لقطة
+        feature_selection = select_features_for_snapshot(
+            X_train, y_train, feature_columns, symbol=symbol, interval=interval, engine="enhanced",
+            snapshot_version=dataset.get("snapshot_version"), params=self.feature_selection_params
+        )
+        selected_idx = [feature_columns.index(col) for col in feature_selection["selected_columns"]]
+        feature_columns = feature_selection["selected_columns"]
+        X_train, X_test = X_train[:, selected_idx], X_test[:, selected_idx]
+        print(f"✂️ تقليم الميزات: {feature_selection['source_columns']} ← {len(feature_columns)} ميزة"
+              f"{' (من اللقطة)' if feature_selection.get('from_cache') else ''}")
+
+        # تطبيع البيانات
+        try:
+            X_train_scaled = self.scaler.fit_transform(X_train)
+            X_test_scaled = self.scaler.transform(X_test)
+        except Exception as e:
+            print(f"⚠️ خطأ في التطبيع: {e}")
+            return {"error": f"فشل في تطبيع البيانات: {str(e)}"}
+
+        return {
+            "feature_columns": feature_columns,
+            "feature_selection": feature_selection,
+            "feature_time": feature_time,
+            "X_train": X_train,
+            "X_test": X_test,
+            "y_train": y_train,
+            "y_test": y_test,
+            "X_train_scaled": X_train_scaled,
+            "X_test_scaled": X_test_scaled
+        }
 
-            # تقسيم البيانات
-            try:
-                # التأكد من وجود كلا الصنفين
-                unique_classes = np.unique(y)
-                if len(unique_classes) < 2:
-                    return {"error": "يحتاج صنفين على الأقل للتدريب"}
+    def finalize_training(self, prepared: Dict[str, Any], model_results: Dict[str, Dict],
+                          start_time: datetime) -> Dict[str, Any]:
+        """المرحلة الأخيرة بعد تدريب النماذج: الأهمية والحفظ والتجميع والتقطير والإحصائيات"""
+        feature_columns = prepared["feature_columns"]
+        X_train_scaled = prepared["X_train_scaled"]
+        X_test_scaled = prepared["X_test_scaled"]
 
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, test_size=0.2, random_state=42, stratify=y
-                )
-            except ValueError:
-                # إذا فشل stratify، استخدم تقسيم عادي
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X, y, test_size=0.2, random_state=42
-                )
+        # حساب أهمية الميزات
+        self._calculate_safe_feature_importance(feature_columns, X_train_scaled, prepared["y_train"])
 
-            # تطبيع البيانات
-            try:
-                X_train_scaled = self.scaler.fit_transform(X_train)
-                X_test_scaled = self.scaler.transform(X_test)
-            except Exception as e:
-                print(f"⚠️ خطأ في التطبيع: {e}")
-                return {"error": f"فشل في تطبيع البيانات: {str(e)}"}
+        # الأعمدة المختارة تُحفظ مع النماذج والمطبّع
+        self.feature_columns = list(feature_columns)
+        self.feature_selection = {
+            k: v for k, v in prepared.get("feature_selection", {}).items() if k != "mutual_information"
+        }
 
-            # تدريب النماذج
-            print("🚀 بدء تدريب النماذج...")
-            model_results = self._safe_model_training(
-                X_train_scaled, y_train, X_test_scaled, y_test
-            )
+        # تجميع الأشجار للاستدلال السريع
+        self._compile_inference_engine(X_test_scaled)
 
-            # حساب أهمية الميزات
-            self._calculate_safe_feature_importance(feature_columns, X_train_scaled, y_train)
+        # تقطير المجموعة في نموذج طالب للوضع السريع
+        distillation = self._distill_student_model(X_train_scaled, X_test_scaled)
 
-            # حفظ النماذج
-            self._save_enhanced_models()
-            self.is_trained = True
+        # إحصائيات النتائج
+        valid_results = {k: v for k, v in model_results.items() if 'error' not in v}
+        if valid_results:
+            best_model = max(valid_results.keys(), key=lambda k: valid_results[k].get('f1_score', 0))
+            avg_accuracy = np.mean([v.get('accuracy', 0) for v in valid_results.values()])
+            avg_f1 = np.mean([v.get('f1_score', 0) for v in valid_results.values()])
+        else:
+            best_model = "none"
+            avg_accuracy = 0
+            avg_f1 = 0
+
+        training_time = (datetime.now() - start_time).total_seconds()
+
+        result = {
+            "training_completed": True,
+            "training_time_seconds": round(training_time, 2),
+            "feature_engineering_time": round(prepared["feature_time"], 2),
+            "training_samples": len(prepared["X_train"]),
+            "test_samples": len(prepared["X_test"]),
+            "feature_count": len(feature_columns),
+            "feature_selection": self.feature_selection,
+            "models_trained": len(valid_results),
+            "successful_models": list(valid_results.keys()),
+            "failed_models": [k for k, v in model_results.items() if 'error' in v],
+            "model_results": model_results,
+            "best_model": best_model,
+            "best_accuracy": round(valid_results.get(best_model, {}).get('accuracy', 0), 3),
+            "best_f1_score": round(valid_results.get(best_model, {}).get('f1_score', 0), 3),
+            "average_accuracy": round(avg_accuracy, 3),
+            "average_f1_score": round(avg_f1, 3),
+            "top_features": self._get_top_features(10),
+            "performance_level": self._get_performance_level(avg_accuracy),
+            "compiled_models": self.compiled_ensemble.compiled_models if self.compiled_ensemble else [],
+            "distillation": distillation
+        }
 
-            # إحصائيات النتائج
-            valid_results = {k: v for k, v in model_results.items() if 'error' not in v}
-            if valid_results:
-                best_model = max(valid_results.keys(), key=lambda k: valid_results[k].get('f1_score', 0))
-                avg_accuracy = np.mean([v.get('accuracy', 0) for v in valid_results.values()])
-                avg_f1 = np.mean([v.get('f1_score', 0) for v in valid_results.values()])
-            else:
-                best_model = "none"
-                avg_accuracy = 0
-                avg_f1 = 0
+        # حفظ كل شيء في حزمة واحدة ذرية
+        self.model_performance = valid_results
+        self._save_enhanced_models({
+            "trained_at": datetime.now().isoformat(),
+            "training_samples": result["training_samples"],
+            "test_samples": result["test_samples"],
+            "snapshot_version": prepared.get("feature_selection", {}).get("snapshot_version"),
+            "average_accuracy": result["average_accuracy"],
+            "average_f1_score": result["average_f1_score"],
+            "best_model": best_model
+        })
+        result["model_version"] = self.model_version
+        result["bundle"] = self.bundle_manifest.get("file") if self.bundle_manifest else None
+        self.is_trained = True
+
+        # حفظ سجل التدريب
+        self.training_history.append({
+            "timestamp": datetime.now().isoformat(),
+            "result": result
+        })
+
+        return result
+
+    def benchmark_model_profiles(self, prices: List[float], volumes: List[float] = None,
+                                 dataset: Dict[str, Any] = None,
+                                 profiles: Tuple[str, ...] = MODEL_PROFILES) -> Dict[str, Any]:
+        """
+        مقارنة زمن التدريب والتنبؤ والدقة بين إعدادات النماذج على نفس البيانات والتقسيم
+        يعمل على محرك مؤقت - النماذج الحية والمطبّع لا يتغيران ولا يُحفظ شيء
+        """
+        bench = EnhancedAdvancedAI(enable_parallel=False, model_path=self.model_path)
+        bench.target_config = dict(self.target_config)
+        bench.feature_selection_params = dict(self.feature_selection_params)
+        prepared = bench.prepare_training_data(prices, volumes, dataset)
+        if "error" in prepared:
+            return prepared
+
+        X_train, X_test = prepared["X_train_scaled"], prepared["X_test_scaled"]
+        y_train, y_test = prepared["y_train"], prepared["y_test"]
+        results = {}
 
-            training_time = (datetime.now() - start_time).total_seconds()
+        for profile in profiles:
+            models = {}
+            for name, model in bench._initialize_enhanced_models(profile).items():
+                try:
+                    start = time.perf_counter()
+                    model.fit(X_train, y_train)
+                    fit_seconds = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    test_pred = model.predict(X_test)
+                    predict_ms = (time.perf_counter() - start) * 1000
+
+                    models[name] = {
+                        "fit_seconds": round(fit_seconds, 3),
+                        "predict_ms": round(predict_ms, 2),
+                        "accuracy": round(float(accuracy_score(y_test, test_pred)), 4),
+                        "f1_score": round(float(f1_score(y_test, test_pred, average='weighted', zero_division=0)), 4)
+                    }
+                except Exception as e:
+                    models[name] = {"error": str(e)}
 
-            result = {
-                "training_completed": True,
-                "training_time_seconds": round(training_time, 2),
-                "feature_engineering_time": round(feature_time, 2),
-                "training_samples": len(X_train),
-                "test_samples": len(X_test),
-                "feature_count": len(feature_columns),
-                "models_trained": len(valid_results),
-                "successful_models": list(valid_results.keys()),
-                "failed_models": [k for k, v in model_results.items() if 'error' in v],
-                "model_results": model_results,
-                "best_model": best_model,
-                "best_accuracy": round(valid_results.get(best_model, {}).get('accuracy', 0), 3),
-                "best_f1_score": round(valid_results.get(best_model, {}).get('f1_score', 0), 3),
-                "average_accuracy": round(avg_accuracy, 3),
-                "average_f1_score": round(avg_f1, 3),
-                "top_features": self._get_top_features(10),
-                "performance_level": self._get_performance_level(avg_accuracy)
+            valid = [m for m in models.values() if "error" not in m]
+            results[profile] = {
+                "models": models,
+                "total_fit_seconds": round(sum(m["fit_seconds"] for m in valid), 3),
+                "average_accuracy": round(float(np.mean([m["accuracy"] for m in valid])), 4) if valid else None
             }
 
-            # حفظ سجل التدريب
-            self.training_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "result": result
-            })
+        comparison = {}
+        if "default" in results and "fast" in results:
+            default_models, fast_models = results["default"]["models"], results["fast"]["models"]
+            for fast_name, default_name in PROFILE_EQUIVALENTS.items():
+                fast_result, default_result = fast_models.get(fast_name, {}), default_models.get(default_name, {})
+                if "fit_seconds" in fast_result and "fit_seconds" in default_result:
+                    comparison[f"{default_name} → {fast_name}"] = {
+                        "fit_speedup": round(default_result["fit_seconds"] / max(fast_result["fit_seconds"], 1e-6), 1),
+                        "accuracy_delta": round(fast_result["accuracy"] - default_result["accuracy"], 4)
+                    }
+            comparison["total_fit_speedup"] = round(
+                results["default"]["total_fit_seconds"] / max(results["fast"]["total_fit_seconds"], 1e-6), 1)
+
+        return {
+            "training_samples": len(X_train),
+            "test_samples": len(X_test),
+            "feature_count": len(prepared["feature_columns"]),
+            "profiles": results,
+            "comparison": comparison,
+            "timestamp": datetime.now().isoformat()
+        }
 
-            return result
+    def _walk_forward_evaluation(self, X_train, y_train, cv_folds: int) -> Dict[str, Any]:
+        """تحقق متقاطع زمني مع تطهير لكل نموذج على بيانات التدريب غير المطبّعة"""
+        results = {}
+        splitter = PurgedWalkForwardSplit(n_splits=cv_folds, purge=self.target_config["horizon"])
+        for name, model in self.models.items():
+            try:
+                results[name] = walk_forward_cross_validate(
+                    model, X_train, y_train, splitter, scaler=self.scaler
+                )
+                print(f"  🔁 {name} - CV Accuracy: {results[name]['mean_accuracy']}")
+            except Exception as e:
+                print(f"  ⚠️ فشل التحقق المتقاطع لـ {name}: {e}")
+                results[name] = {"error": str(e)}
+        return results
 
+    def _tune_hyperparameters(self, X_train, y_train, feature_columns: List[str],
+                              symbol: str = None, interval: str = "1h") -> Dict[str, Any]:
+        """ضبط معاملات النماذج وتطبيق أفضلها قبل التدريب"""
+        try:
+            tuning_results = model_optimizer.tune_enhanced_models(
+                self.models, X_train, y_train,
+                symbol=symbol, interval=interval,
+                feature_version=feature_version(feature_columns)
+            )
+            for name, result in tuning_results.items():
+                if 'error' not in result and name in self.models:
+                    self.models[name].set_params(**result['best_params'])
+            return tuning_results
         except Exception as e:
-            print(f"❌ خطأ في التدريب: {e}")
-            return {"error": f"فشل التدريب المحسن: {str(e)}"}
+            print(f"⚠️ فشل ضبط المعاملات - استخدام المعاملات الافتراضية: {e}")
+            return {"error": str(e)}
 
     def _select_safe_features(self, features_df: pd.DataFrame) -> List[str]:
-        """اختيار الميزات بطريقة آمنة"""
+        """اختيار الميزات بطريقة آمنة - الأعمدة الرقمية المنتهية وغير الثابتة (التقليم يأتي بعد التقسيم)"""
         try:
             # الميزات الرقمية فقط
-            numeric_cols = features_df.select_dtypes(include=[np.number]).columns.tolist()
+            numeric_df = features_df.select_dtypes(include=[np.number])
+            numeric_cols = numeric_df.columns.tolist()
 
-            # إزالة الأعمدة الثابتة أو التي بها مشاكل
-            safe_cols = []
-            for col in numeric_cols:
-                try:
-                    series = features_df[col]
-                    if series.std() > 0 and not series.isnull().all() and np.isfinite(series).all():
-                        safe_cols.append(col)
-                except:
-                    continue
+            # إزالة الأعمدة الثابتة أو التي بها مشاكل - فحص واحد على المصفوفة كاملة
+            usable = usable_columns_mask(numeric_df.to_numpy(dtype=float))
+            safe_cols = [col for col, ok in zip(numeric_cols, usable) if ok]
 
             # الحد الأدنى من الميزات
             if len(safe_cols) < 3:
                 safe_cols = ['price'] + [col for col in numeric_cols if col != 'price'][:5]
 
-            return safe_cols[:50]  # حد أقصى 50 ميزة
+            return safe_cols
 
         except Exception as e:
             print(f"⚠️ خطأ في اختيار الميزات: {e}")
             return ['price']
 
     def _create_safe_targets(self, prices: List[float]) -> np.ndarray:
-        """إنشاء أهداف آمنة للتدريب"""
+        """إنشاء أهداف آمنة للتدريب - الحركات المحايدة (-1) تصبح NaN وتُحذف مع الصفوف غير الصالحة"""
         try:
-            targets = []
-            threshold = 0.01  # 1%
-
-            for i in range(len(prices) - 1):
-                try:
-                    price_change = (prices[i + 1] - prices[i]) / prices[i]
-                    target = 1 if price_change > threshold else 0
-                    targets.append(target)
-                except:
-                    targets.append(0)
-
-            # إضافة آخر قيمة
-            targets.append(targets[-1] if targets else 0)
-
-            return np.array(targets)
+            targets = make_labels(prices, **self.target_config).astype(np.float64)
+            targets[targets == -1] = np.nan
+            return targets
 
         except Exception as e:
             print(f"⚠️ خطأ في إنشاء الأهداف: {e}")
@@ -2312,45 +2728,9 @@ class EnhancedAdvancedAI:
         results = {}
 
         for name, model in self.models.items():
-            try:
-                print(f"  📊 تدريب {name}...")
-                start = datetime.now()
-
-                # التدريب مع timeout
-                model.fit(X_train, y_train)
-
-                # التنبؤ
-                train_pred = model.predict(X_train)
-                test_pred = model.predict(X_test)
-
-                # حساب المقاييس
-                train_acc = accuracy_score(y_train, train_pred)
-                test_acc = accuracy_score(y_test, test_pred)
-
-                try:
-                    precision = precision_score(y_test, test_pred, average='weighted', zero_division=0)
-                    recall = recall_score(y_test, test_pred, average='weighted', zero_division=0)
-                    f1 = f1_score(y_test, test_pred, average='weighted', zero_division=0)
-                except:
-                    precision = recall = f1 = 0.5
-
-                training_time = (datetime.now() - start).total_seconds()
-
-                results[name] = {
-                    "accuracy": float(test_acc),
-                    "train_accuracy": float(train_acc),
-                    "precision": float(precision),
-                    "recall": float(recall),
-                    "f1_score": float(f1),
-                    "training_time": float(training_time),
-                    "overfitting_score": float(abs(train_acc - test_acc))
-                }
-
-                print(f"  ✅ {name} - Accuracy: {test_acc:.3f}, F1: {f1:.3f}")
-
-            except Exception as e:
-                print(f"  ❌ فشل تدريب {name}: {e}")
-                results[name] = {"error": str(e)}
+            self.models[name], results[name] = fit_and_evaluate_model(
+                name, model, X_train, y_train, X_test, y_test
+            )
 
         return results
 
@@ -2413,8 +2793,14 @@ class EnhancedAdvancedAI:
         else:
             return "ضعيف"
 
-    def predict_enhanced_ensemble(self, prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
-        """التنبؤ المحسن مع معالجة شاملة للأخطاء"""
+    def predict_enhanced_ensemble(self, prices: List[float], volumes: List[float] = None,
+                                  mode: str = "full", symbol: str = None, interval: str = "1h",
+                                  candle_time: int = None) -> Dict[str, Any]:
+        """
+        التنبؤ المحسن مع معالجة شاملة للأخطاء - mode="fast" للنموذج الطالب المقطّر وحده
+        symbol + candle_time (وقت فتح آخر شمعة): تسجيل التنبؤ في سجل التنبؤات وتشغيل المرشح في الظل
+        """
+        start_time = datetime.now()
         try:
             if not self.is_trained:
                 # محاولة تحميل النماذج
@@ -2429,15 +2815,9 @@ class EnhancedAdvancedAI:
             if len(prices) < 20:
                 return {"error": "يحتاج 20 نقطة على الأقل للتنبؤ المحسن"}
 
-            # هندسة الميزات
-            features_df = self.engineer_advanced_features(prices, volumes)
-
-            # استخدام الميزات المحفوظة أو المتاحة
-            if self.feature_importance:
-                available_features = [col for col in self.feature_importance.keys()
-                                      if col in features_df.columns]
-            else:
-                available_features = self._select_safe_features(features_df)
+            # هندسة الميزات المختارة فقط
+            features_df = self.engineer_advanced_features(prices, volumes, columns=self.feature_columns)
+            available_features = self._prediction_features(features_df)
 
             if not available_features:
                 return {"error": "لا توجد ميزات صالحة للتنبؤ"}
@@ -2465,54 +2845,37 @@ class EnhancedAdvancedAI:
             except Exception as e:
                 return {"error": f"خطأ في تطبيع البيانات: {str(e)}"}
 
-            # التنبؤ من كل نموذج
-            predictions = {}
-            probabilities = {}
-            prediction_times = {}
-            successful_models = 0
-
-            for name, model in self.models.items():
-                try:
-                    start = datetime.now()
-
-                    # التنبؤ
-                    pred = model.predict(X_scaled)[0]
-                    prediction_time = (datetime.now() - start).total_seconds() * 1000
-
-                    predictions[name] = int(pred)
-                    prediction_times[name] = round(prediction_time, 2)
-
-                    # الاحتماليات
-                    if hasattr(model, 'predict_proba'):
-                        try:
-                            prob = model.predict_proba(X_scaled)[0]
-                            if len(prob) >= 2:
-                                probabilities[name] = {
-                                    'down': float(prob[0] * 100),
-                                    'up': float(prob[1] * 100)
-                                }
-                            else:
-                                probabilities[name] = {
-                                    'down': float((1 - prob[0]) * 100),
-                                    'up': float(prob[0] * 100)
-                                }
-                        except:
-                            probabilities[name] = {'down': 50.0, 'up': 50.0}
-                    else:
-                        # تقدير بسيط للاحتماليات
-                        confidence = 65.0 if pred == 1 else 35.0
+            fast_mode = mode == "fast" and self._fast_mode_ready()
+            if fast_mode:
+                predictions, probabilities, prediction_times = self._student_prediction(X_scaled)
+                engine_info = {"mode": "fast", "distillation": self.student_info}
+                successful_models = len(predictions)
+                total_models = len(predictions)
+            else:
+                # التنبؤ من كل نموذج - استدعاء واحد للاحتماليات والصنف من argmax
+                model_probabilities, prediction_times, engine_info = self._ensemble_probabilities(X_scaled)
+
+                predictions = {}
+                probabilities = {}
+                for name in self.models:
+                    if name in model_probabilities:
+                        prob = model_probabilities[name][0]
+                        predictions[name] = int(np.argmax(prob))
                         probabilities[name] = {
-                            'down': 100 - confidence,
-                            'up': confidence
+                            'down': float(prob[0] * 100),
+                            'up': float(prob[1] * 100)
                         }
+                    else:
+                        predictions[name] = 0
+                        probabilities[name] = {'down': 50.0, 'up': 50.0}
+                        prediction_times[name] = 0
 
-                    successful_models += 1
-
-                except Exception as e:
-                    print(f"⚠️ فشل التنبؤ بـ {name}: {e}")
-                    predictions[name] = 0
-                    probabilities[name] = {'down': 50.0, 'up': 50.0}
-                    prediction_times[name] = 0
+                successful_models = len(model_probabilities)
+                total_models = len(self.models)
+                engine_info["mode"] = "full"
+                if mode == "fast":
+                    engine_info["fast_mode_unavailable"] = self.student_info.get(
+                        "error", "اتفاق النموذج الطالب مع المجموعة أقل من الحد المطلوب")
 
             if successful_models == 0:
                 return {"error": "فشل جميع النماذج في التنبؤ"}
@@ -2534,8 +2897,9 @@ class EnhancedAdvancedAI:
                 "individual_predictions": predictions,
                 "individual_probabilities": probabilities,
                 "prediction_times_ms": prediction_times,
+                "inference_engine": engine_info,
                 "successful_models": successful_models,
-                "total_models": len(self.models),
+                "total_models": total_models,
                 "market_analysis": market_analysis,
                 "confidence_analysis": confidence_analysis,
                 "risk_assessment": risk_assessment,
@@ -2544,12 +2908,153 @@ class EnhancedAdvancedAI:
                 "timestamp": datetime.now().isoformat()
             }
 
+            if symbol and candle_time is not None:
+                latency = (datetime.now() - start_time).total_seconds() * 1000
+                self._record_prediction(ROLE_LIVE, result, mode, symbol, interval, candle_time, latency)
+                self._run_shadow_prediction(prices, volumes, mode, symbol, interval, candle_time)
+
             return result
 
         except Exception as e:
             print(f"❌ خطأ في التنبؤ المحسن: {e}")
             return {"error": f"فشل التنبؤ المحسن: {str(e)}"}
 
+    def predict_batch(self, candles_by_symbol: Dict[str, List[Dict]]) -> Dict[str, Dict[str, Any]]:
+        """التنبؤ لعدة عملات دفعة واحدة - مصفوفة ميزات واحدة واستدعاء واحد لكل نموذج"""
+        if not self.is_trained:
+            load_result = self.load_enhanced_models()
+            if not self.is_trained:
+                return {symbol: {"error": "النماذج غير مدربة", "load_attempt": load_result}
+                        for symbol in candles_by_symbol}
+
+        results = {}
+        rows = []
+        available_features = None
+
+        for symbol, candles in candles_by_symbol.items():
+            try:
+                prices = [float(candle['close']) for candle in candles or []]
+                volumes = [float(candle.get('volume', 0)) for candle in candles or []]
+                if len(prices) < 20:
+                    results[symbol] = {"error": "يحتاج 20 نقطة على الأقل للتنبؤ المحسن"}
+                    continue
+
+                features_df = self.engineer_advanced_features(prices, volumes, columns=self.feature_columns)
+
+                if available_features is None:
+                    available_features = self._prediction_features(features_df)
+
+                X = features_df[available_features].iloc[-1].values.astype(float)
+                if not np.isfinite(X).all() and len(features_df) > 1:
+                    X = features_df[available_features].iloc[-2].values.astype(float)
+                if not np.isfinite(X).all():
+                    results[symbol] = {"error": "بيانات غير صالحة للتنبؤ"}
+                    continue
+
+                rows.append((symbol, X, features_df.iloc[-1], prices))
+            except Exception as e:
+                results[symbol] = {"error": f"فشل التنبؤ المحسن: {str(e)}"}
+
+        if not rows:
+            return results
+
+        try:
+            X_scaled = self.scaler.transform(np.vstack([row[1] for row in rows]))
+            model_probabilities, _, _ = self._ensemble_probabilities(X_scaled)
+        except Exception as e:
+            for symbol, *_ in rows:
+                results[symbol] = {"error": f"فشل التنبؤ المحسن: {str(e)}"}
+            return results
+
+        if not model_probabilities:
+            for symbol, *_ in rows:
+                results[symbol] = {"error": "فشل جميع النماذج في التنبؤ"}
+            return results
+
+        for i, (symbol, _, current_features, prices) in enumerate(rows):
+            predictions = {}
+            probabilities = {}
+            for name in self.models:
+                if name in model_probabilities:
+                    prob = model_probabilities[name][i]
+                    predictions[name] = int(np.argmax(prob))
+                    probabilities[name] = {'down': float(prob[0] * 100), 'up': float(prob[1] * 100)}
+                else:
+                    predictions[name] = 0
+                    probabilities[name] = {'down': 50.0, 'up': 50.0}
+
+            ensemble_result = self._safe_ensemble_prediction(predictions, probabilities)
+            market_analysis = self._safe_market_analysis(current_features, prices)
+
+            results[symbol] = {
+                "ensemble_prediction": ensemble_result,
+                "individual_predictions": predictions,
+                "individual_probabilities": probabilities,
+                "successful_models": len(model_probabilities),
+                "total_models": len(self.models),
+                "market_analysis": market_analysis,
+                "confidence_analysis": self._safe_confidence_analysis(predictions, probabilities),
+                "risk_assessment": self._safe_risk_assessment(ensemble_result, market_analysis),
+                "features_used": len(available_features),
+                "current_price": float(prices[-1]),
+                "timestamp": datetime.now().isoformat()
+            }
+
+        return results
+
+    def _prediction_features(self, features_df: pd.DataFrame) -> List[str]:
+        """أعمدة التنبؤ: المختارة عند التدريب، ثم أعمدة أهمية الميزات للنماذج القديمة"""
+        if self.feature_columns:
+            return list(self.feature_columns)
+        if self.feature_importance:
+            return [col for col in self.feature_importance.keys() if col in features_df.columns]
+        return self._select_safe_features(features_df)
+
+    def _ensemble_probabilities(self, X_scaled: np.ndarray) -> Tuple[Dict[str, np.ndarray], Dict[str, float], Dict[str, Any]]:
+        """احتماليات [down, up] لكل نموذج لجميع الصفوف - المحرك المُجمّع أولاً ثم استدعاء predict_proba واحد لكل نموذج"""
+        model_probabilities = {}
+        prediction_times = {}
+        compiled_time = 0.0
+
+        if self.compiled_ensemble is not None and self.compiled_ensemble.is_ready:
+            try:
+                start = datetime.now()
+                model_probabilities = self.compiled_ensemble.predict_proba(X_scaled)
+                compiled_time = (datetime.now() - start).total_seconds() * 1000
+                # زمن التمريرة المشتركة موزعاً على النماذج المُجمّعة
+                for name in model_probabilities:
+                    prediction_times[name] = round(compiled_time / len(model_probabilities), 3)
+            except Exception as e:
+                print(f"⚠️ فشل المحرك المُجمّع - التنبؤ الأصلي: {e}")
+                model_probabilities = {}
+                prediction_times = {}
+                compiled_time = 0.0
+
+        engine_info = {
+            "compiled_models": list(model_probabilities.keys()),
+            "compiled_pass_ms": round(compiled_time, 3)
+        }
+
+        for name, model in self.models.items():
+            if name in model_probabilities:
+                continue
+            try:
+                start = datetime.now()
+                if hasattr(model, 'predict_proba'):
+                    proba = np.asarray(model.predict_proba(X_scaled), dtype=float)
+                    if proba.shape[1] < 2:
+                        proba = np.column_stack([1 - proba[:, 0], proba[:, 0]])
+                else:
+                    # تقدير بسيط للاحتماليات
+                    up = np.where(np.asarray(model.predict(X_scaled)) == 1, 0.65, 0.35)
+                    proba = np.column_stack([1 - up, up])
+                model_probabilities[name] = proba
+                prediction_times[name] = round((datetime.now() - start).total_seconds() * 1000, 2)
+            except Exception as e:
+                print(f"⚠️ فشل التنبؤ بـ {name}: {e}")
+
+        return model_probabilities, prediction_times, engine_info
+
     def _safe_ensemble_prediction(self, predictions: Dict, probabilities: Dict) -> Dict:
         """التنبؤ المجمع الآمن"""
         try:
@@ -2645,9 +3150,12 @@ class EnhancedAdvancedAI:
                     'catboost': 1.4,
                     'enhanced_rf': 1.2,
                     'enhanced_gb': 1.2,
+                    'lgbm_rf': 1.2,
+                    'hist_gb': 1.2,
                     'extra_trees': 1.1,
                     'neural_net': 1.0,
                     'adaboost': 0.9,
+                    'hist_stumps': 0.9,
                     'logistic_l2': 0.8
                 }
                 return {k: v for k, v in default_weights.items() if k in self.models}
@@ -2859,46 +3367,355 @@ class EnhancedAdvancedAI:
                 "error": str(e)
             }
 
-    def _save_enhanced_models(self):
-        """حفظ آمن للنماذج"""
+    def _compile_inference_engine(self, probe_X: np.ndarray = None):
+        """تجميع نماذج الأشجار المدربة في محرك استدلال واحد"""
+        self.compiled_ensemble = None
+        if not self.use_compiled_inference:
+            return
+
         try:
-            saved_models = 0
+            n_features = getattr(self.scaler, 'n_features_in_', None)
+            if n_features is None:
+                return
+
+            self.compiled_ensemble = compile_tree_ensemble(self.models, n_features, probe_X)
+            info = self.compiled_ensemble.get_info()
+            print(f"⚡ تم تجميع {len(info['compiled_models'])} نماذج أشجار "
+                  f"({info['total_trees']} شجرة) - أصلية: {info['native_models']}")
+        except Exception as e:
+            print(f"⚠️ فشل تجميع محرك الأشجار: {e}")
+            self.compiled_ensemble = None
+
+    def _ensemble_soft_output(self, X_scaled: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """احتمالية الصعود الموزونة والقرار النهائي للمجموعة لكل صف - نفس منطق _safe_ensemble_prediction"""
+        model_probabilities, _, _ = self._ensemble_probabilities(X_scaled)
+        weights = self._get_safe_model_weights()
+
+        weighted_up = np.zeros(len(X_scaled))
+        weighted_votes = np.zeros(len(X_scaled))
+        total_weight = 0.0
+        for name in self.models:
+            weight = weights.get(name, 1.0)
+            proba = model_probabilities.get(name)
+            if proba is None:
+                # النموذج الفاشل يُحتسب 50/50 بصوت هبوط كما في التنبؤ العادي
+                weighted_up += 0.5 * weight
+            else:
+                weighted_up += proba[:, 1] * weight
+                weighted_votes += np.argmax(proba, axis=1) * weight
+            total_weight += weight
 
-            for name, model in self.models.items():
-                try:
-                    model_path = os.path.join(self.model_path, f"enhanced_{name}.pkl")
-                    joblib.dump(model, model_path)
-                    saved_models += 1
-                except Exception as e:
-                    print(f"⚠️ فشل حفظ {name}: {e}")
+        return weighted_up / total_weight, (weighted_votes / total_weight > 0.5).astype(int)
+
+    def _distill_student_model(self, X_train_scaled: np.ndarray, X_test_scaled: np.ndarray) -> Dict[str, Any]:
+        """تقطير المجموعة في نموذج واحد صغير يقلد احتمالية الصعود الموزونة"""
+        self.student_model = None
+        self.student_info = {"ready": False}
+
+        try:
+            soft_train, _ = self._ensemble_soft_output(X_train_scaled)
+            soft_test, teacher_test = self._ensemble_soft_output(X_test_scaled)
+
+            if LGBM_AVAILABLE:
+                student = LGBMRegressor(
+                    n_estimators=150,
+                    learning_rate=0.05,
+                    max_depth=4,
+                    num_leaves=15,
+                    min_child_samples=10,
+                    random_state=42,
+                    verbose=-1
+                )
+                student_type = "lightgbm"
+            else:
+                student = GradientBoostingRegressor(
+                    n_estimators=150,
+                    learning_rate=0.05,
+                    max_depth=3,
+                    random_state=42
+                )
+                student_type = "gradient_boosting"
+
+            student.fit(X_train_scaled, soft_train)
+            student_up = np.clip(student.predict(X_test_scaled), 0.0, 1.0)
+
+            # الاتفاق مع القرار النهائي للمجموعة على بيانات الاختبار
+            agreement_rate = float(np.mean((student_up > 0.5).astype(int) == teacher_test))
+            self.student_model = student
+            self.student_info = {
+                "ready": True,
+                "student_type": student_type,
+                "agreement_rate": round(agreement_rate, 4),
+                "probability_mae": round(float(np.mean(np.abs(student_up - soft_test))), 4),
+                "evaluation_samples": len(X_test_scaled),
+                "min_agreement": self.fast_mode_min_agreement,
+                "fast_mode_enabled": agreement_rate >= self.fast_mode_min_agreement,
+                "distilled_at": datetime.now().isoformat()
+            }
+
+            print(f"🎓 النموذج الطالب ({student_type}) يتفق مع المجموعة بنسبة {agreement_rate * 100:.1f}%")
+
+        except Exception as e:
+            print(f"⚠️ فشل تقطير النموذج الطالب: {e}")
+            self.student_info = {"ready": False, "error": str(e)}
 
-            # حفظ المعالجات
+        return self.student_info
+
+    def _load_student_model(self):
+        """تحميل النموذج الطالب المقطّر من الصيغة القديمة (الحزمة تحمله مع باقي النماذج)"""
+        self.student_model = None
+        self.student_info = {"ready": False}
+        try:
+            student_path = os.path.join(self.model_path, "enhanced_student.pkl")
+            if os.path.exists(student_path):
+                bundle = joblib.load(student_path)
+                self.student_model = bundle["model"]
+                self.student_info = bundle["info"]
+        except Exception as e:
+            print(f"⚠️ فشل تحميل النموذج الطالب: {e}")
+
+    def _fast_mode_ready(self) -> bool:
+        """الوضع السريع متاح فقط عندما يكون اتفاق الطالب مع المجموعة كافياً"""
+        return (self.student_model is not None and
+                self.student_info.get("agreement_rate", 0) >= self.fast_mode_min_agreement)
+
+    def _student_prediction(self, X_scaled: np.ndarray) -> Tuple[Dict, Dict, Dict]:
+        """تنبؤ النموذج الطالب بصيغة تنبؤات النماذج الفردية"""
+        start = datetime.now()
+        up_probability = float(np.clip(self.student_model.predict(X_scaled)[0], 0.0, 1.0))
+        prediction_time = (datetime.now() - start).total_seconds() * 1000
+
+        predictions = {"student": int(up_probability > 0.5)}
+        probabilities = {"student": {
+            'down': (1 - up_probability) * 100,
+            'up': up_probability * 100
+        }}
+        return predictions, probabilities, {"student": round(prediction_time, 3)}
+
+    # ---------- النشر في الظل ----------
+
+    def _create_candidate_engine(self) -> "EnhancedAdvancedAI":
+        """محرك مرشح بنفس الإعدادات يحفظ في قناة candidate ويشارك سجل التنبؤات"""
+        candidate = EnhancedAdvancedAI(enable_parallel=False, model_path=self.model_path,
+                                       model_profile=self.model_profile)
+        candidate.bundle_channel = CANDIDATE_CHANNEL
+        candidate.prediction_ledger = self.prediction_ledger
+        candidate.target_config = dict(self.target_config)
+        candidate.feature_selection_params = dict(self.feature_selection_params)
+        candidate.fast_mode_min_agreement = self.fast_mode_min_agreement
+        candidate.use_compiled_inference = self.use_compiled_inference
+        return candidate
+
+    def _candidate_manifest_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(manifest_path(self.model_path, BUNDLE_NAME, CANDIDATE_CHANNEL)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _sync_shadow_engine(self) -> Optional[Dict[str, Any]]:
+        """تحميل المرشح إذا تغيّر manifest القناة (مثلاً بعد تدريب في عملية أخرى)"""
+        mtime = self._candidate_manifest_mtime()
+        if mtime == self._shadow_manifest_mtime:
+            return self._shadow_info()
+
+        self._shadow_manifest_mtime = mtime
+        self.shadow_engine = None
+        if mtime is None:
+            return None
+
+        candidate = self._create_candidate_engine()
+        try:
+            if candidate._load_enhanced_bundle():
+                self.shadow_engine = candidate
+                print(f"🕶️ المرشح {candidate.model_version} يعمل في الظل بجانب {self.model_version}")
+        except ValueError as e:
+            print(f"❌ تعذر تحميل المرشح: {e}")
+            return {"error": str(e)}
+        return self._shadow_info()
+
+    def _shadow_info(self) -> Optional[Dict[str, Any]]:
+        if self.shadow_engine is None:
+            return None
+        return {
+            "model_version": self.shadow_engine.model_version,
+            "bundle": self.shadow_engine.bundle_manifest.get("file"),
+            "training": self.shadow_engine.bundle_manifest.get("training", {})
+        }
+
+    def _ledger_version(self, mode: str) -> Optional[str]:
+        """الوضع السريع نموذج مختلف فيُسجل كإصدار منفصل"""
+        if not self.model_version:
+            return None
+        return f"{self.model_version}-fast" if mode == "fast" else self.model_version
+
+    def _record_prediction(self, role: int, result: Dict[str, Any], mode: str, symbol: str,
+                           interval: str, candle_time: int, latency_ms: float):
+        ensemble = result.get("ensemble_prediction", {})
+        if "error" in ensemble:
+            return
+        mode = result.get("inference_engine", {}).get("mode", mode)
+        self.prediction_ledger.record(
+            symbol, interval, self._ledger_version(mode), role, candle_time,
+            price=result["current_price"],
+            prob_up=ensemble["probabilities"]["up"] / 100,
+            prediction=1 if ensemble["final_prediction"] == "UP" else 0,
+            latency_ms=latency_ms,
+            target_config=self.target_config
+        )
+
+    def _run_shadow_prediction(self, prices: List[float], volumes: List[float], mode: str,
+                               symbol: str, interval: str, candle_time: int):
+        """تنبؤ المرشح على نفس البيانات - في خيط منفصل عند تفعيل التوازي فلا يؤخر الرد"""
+        self._sync_shadow_engine()
+        shadow = self.shadow_engine
+        if shadow is None:
+            return
+
+        def task():
             try:
-                scaler_path = os.path.join(self.model_path, "enhanced_scaler.pkl")
-                joblib.dump(self.scaler, scaler_path)
+                start = datetime.now()
+                result = shadow.predict_enhanced_ensemble(prices, volumes, mode=mode)
+                if "error" not in result:
+                    latency = (datetime.now() - start).total_seconds() * 1000
+                    shadow._record_prediction(ROLE_SHADOW, result, mode, symbol, interval, candle_time, latency)
             except Exception as e:
-                print(f"⚠️ فشل حفظ Scaler: {e}")
+                print(f"⚠️ فشل تنبؤ المرشح في الظل: {e}")
 
-            # حفظ معلومات الأداء
-            try:
-                if self.feature_importance:
-                    importance_path = os.path.join(self.model_path, "feature_importance.pkl")
-                    joblib.dump(self.feature_importance, importance_path)
+        if self.enable_parallel and hasattr(self, 'thread_executor'):
+            self.thread_executor.submit(task)
+        else:
+            task()
+
+    def resolve_predictions(self, symbol: str, interval: str, klines: List[Dict]) -> int:
+        """حل التنبؤات المسجلة التي أُغلقت شمعة أفقها"""
+        return self.prediction_ledger.resolve(symbol, interval, klines)
+
+    def get_shadow_report(self, window: int = 500, symbol: str = None) -> Dict[str, Any]:
+        """الأداء الحي للإصدار الحي والمرشح: الدقة و Brier score والزمن"""
+        if self.bundle_channel == LIVE_CHANNEL:
+            self._sync_shadow_engine()
+        report = self.prediction_ledger.report(window, symbol)
+        report["live_model_version"] = self.model_version
+        report["shadow"] = self._shadow_info()
+        return report
+
+    def promote_shadow(self) -> Dict[str, Any]:
+        """ترقية المرشح إلى النماذج الحية (استبدال ذري للـ manifest) ثم تحميلها"""
+        manifest = promote_bundle(self.model_path, BUNDLE_NAME, CANDIDATE_CHANNEL)
+        if not manifest:
+            return {"status": "error", "error": "لا يوجد نموذج مرشح"}
+
+        self.shadow_engine = None
+        self._shadow_manifest_mtime = None
+        self.is_trained = False
+        load_result = self.load_enhanced_models()
+        print(f"🚀 تمت ترقية {manifest['model_version']} (السابق: {manifest.get('previous_version')})")
+        return {
+            "status": load_result.get("status", "error"),
+            "model_version": manifest["model_version"],
+            "previous_version": manifest.get("previous_version"),
+            "load_result": load_result
+        }
 
-                if self.model_performance:
-                    performance_path = os.path.join(self.model_path, "model_performance.pkl")
-                    joblib.dump(self.model_performance, performance_path)
-            except Exception as e:
-                print(f"⚠️ فشل حفظ معلومات الأداء: {e}")
+    def reject_shadow(self) -> Dict[str, Any]:
+        """إلغاء المرشح - تبقى النماذج الحية كما هي"""
+        version = self.shadow_engine.model_version if self.shadow_engine else None
+        if not discard_channel(self.model_path, BUNDLE_NAME, CANDIDATE_CHANNEL):
+            return {"status": "error", "error": "لا يوجد نموذج مرشح"}
+        self.shadow_engine = None
+        self._shadow_manifest_mtime = None
+        return {"status": "success", "rejected_version": version, "live_model_version": self.model_version}
+
+    def _save_enhanced_models(self, training_metadata: Dict[str, Any] = None):
+        """حفظ النماذج والمطبّع والميزات والمحرك المُجمّع والطالب في حزمة واحدة ذرية"""
+        try:
+            payload = {
+                "models": self.models,
+                "scaler": self.scaler,
+                "feature_columns": self.feature_columns,
+                "feature_selection": self.feature_selection,
+                "feature_importance": self.feature_importance,
+                "model_performance": self.model_performance,
+                "target_config": self.target_config,
+                "compiled_ensemble": self.compiled_ensemble,
+                "student": {"model": self.student_model, "info": self.student_info}
+            }
+            metadata = {
+                "models": list(self.models.keys()),
+                "model_profile": self.model_profile,
+                "feature_columns": self.feature_columns or [],
+                "feature_version": self.feature_selection.get("feature_version"),
+                "target_config": self.target_config,
+                "compiled_models": self.compiled_ensemble.compiled_models if self.compiled_ensemble else [],
+                "student_ready": self.student_model is not None,
+                "training": training_metadata or {}
+            }
 
-            print(f"✅ تم حفظ {saved_models} نماذج من أصل {len(self.models)}")
+            self.bundle_manifest = write_bundle(self.model_path, BUNDLE_NAME, payload, metadata,
+                                                channel=self.bundle_channel)
+            self.model_version = self.bundle_manifest["model_version"]
+            print(f"✅ تم حفظ {len(self.models)} نماذج في حزمة واحدة "
+                  f"({self.bundle_manifest['size_bytes'] / 1e6:.1f} MB)")
 
         except Exception as e:
             print(f"❌ خطأ في حفظ النماذج: {e}")
 
+    def _load_enhanced_bundle(self) -> Optional[Dict[str, Any]]:
+        """تحميل الحزمة (mmap + التحقق من البصمة) - None إذا لم تُحفظ حزمة بعد"""
+        bundle = read_bundle(self.model_path, BUNDLE_NAME, channel=self.bundle_channel)
+        if bundle is None:
+            return None
+
+        payload, manifest = bundle
+        self.models = dict(payload["models"])
+        self.scaler = payload["scaler"]
+        self.feature_columns = payload.get("feature_columns")
+        self.feature_selection = payload.get("feature_selection") or {}
+        self.feature_importance = payload.get("feature_importance") or {}
+        self.model_performance = payload.get("model_performance") or {}
+        self.target_config = payload.get("target_config") or self.target_config
+        student = payload.get("student") or {}
+        self.student_model = student.get("model")
+        self.student_info = student.get("info") or {"ready": False}
+        self.bundle_manifest = manifest
+        self.model_version = manifest["model_version"]
+        self.model_profile = manifest.get("model_profile", self.model_profile)
+        self.is_trained = True
+
+        # المحرك المُجمّع محفوظ في الحزمة - بدون إعادة تجميع
+        self.compiled_ensemble = payload.get("compiled_ensemble") if self.use_compiled_inference else None
+        if self.use_compiled_inference and self.compiled_ensemble is None:
+            self._compile_inference_engine()
+
+        return {
+            "status": "success",
+            "format": "bundle",
+            "bundle": manifest["file"],
+            "model_version": self.model_version,
+            "models_loaded": len(self.models),
+            "total_models": len(self.models),
+            "failed_models": [],
+            "scaler_loaded": True,
+            "performance_loaded": bool(self.model_performance),
+            "features_loaded": bool(self.feature_columns),
+            "compiled_models": self.compiled_ensemble.compiled_models if self.compiled_ensemble else [],
+            "student_loaded": self.student_model is not None
+        }
+
     def load_enhanced_models(self) -> Dict[str, Any]:
-        """تحميل آمن للنماذج"""
+        """تحميل آمن للنماذج - الحزمة أولاً، ثم ملفات pickle المنفصلة للنماذج الأقدم"""
         try:
+            try:
+                bundle_result = self._load_enhanced_bundle()
+            except ValueError as e:
+                # حزمة تالفة - لا نخلط معها ملفات من إصدار آخر
+                print(f"❌ {e}")
+                return {"status": "error", "error": str(e)}
+            if bundle_result:
+                if self.bundle_channel == LIVE_CHANNEL:
+                    bundle_result["shadow"] = self._sync_shadow_engine()
+                return bundle_result
+
             loaded_models = 0
             failed_models = []
 
@@ -2919,10 +3736,21 @@ class EnhancedAdvancedAI:
                 scaler_path = os.path.join(self.model_path, "enhanced_scaler.pkl")
                 if os.path.exists(scaler_path):
                     self.scaler = joblib.load(scaler_path)
+                    self.model_version = str(int(os.path.getmtime(scaler_path)))
                     scaler_loaded = True
             except Exception as e:
                 print(f"⚠️ فشل تحميل Scaler: {e}")
 
+            # الأعمدة المختارة (النماذج الأقدم بدونها تستخدم أعمدة أهمية الميزات)
+            try:
+                features_path = os.path.join(self.model_path, "enhanced_features.pkl")
+                if os.path.exists(features_path):
+                    bundle = joblib.load(features_path)
+                    self.feature_columns = bundle["feature_columns"]
+                    self.feature_selection = bundle.get("selection", {})
+            except Exception as e:
+                print(f"⚠️ فشل تحميل الميزات المختارة: {e}")
+
             # تحميل معلومات الأداء
             importance_loaded = False
             performance_loaded = False
@@ -2945,6 +3773,8 @@ class EnhancedAdvancedAI:
 
             if loaded_models > 0:
                 self.is_trained = True
+                self._compile_inference_engine()
+                self._load_student_model()
                 return {
                     "status": "success",
                     "models_loaded": loaded_models,
@@ -2952,7 +3782,9 @@ class EnhancedAdvancedAI:
                     "failed_models": failed_models,
                     "scaler_loaded": scaler_loaded,
                     "performance_loaded": performance_loaded,
-                    "features_loaded": importance_loaded
+                    "features_loaded": importance_loaded,
+                    "compiled_models": self.compiled_ensemble.compiled_models if self.compiled_ensemble else [],
+                    "student_loaded": self.student_model is not None
                 }
             else:
                 return {
@@ -2970,14 +3802,21 @@ class EnhancedAdvancedAI:
                 "is_trained": self.is_trained,
                 "models_count": len(self.models),
                 "models": list(self.models.keys()),
+                "model_profile": self.model_profile,
                 "parallel_processing": self.enable_parallel,
                 "cache_size": self.cache_size,
                 "features_count": len(self.feature_importance) if self.feature_importance else 0,
+                "selected_features": self.feature_columns or [],
                 "top_features": self._get_top_features(5),
                 "training_history_count": len(self.training_history),
                 "xgboost_available": XGB_AVAILABLE,
                 "lightgbm_available": LGBM_AVAILABLE,
-                "catboost_available": CATBOOST_AVAILABLE
+                "catboost_available": CATBOOST_AVAILABLE,
+                "compiled_inference": self.compiled_ensemble.get_info() if self.compiled_ensemble else {"ready": False},
+                "model_version": self.model_version,
+                "bundle": self.bundle_manifest,
+                "shadow": self._shadow_info(),
+                "distillation": self.student_info
             }
 
             if self.model_performance:
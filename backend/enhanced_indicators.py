@@ -357,8 +357,9 @@ def select_best_features(df: pd.DataFrame, target: pd.Series, max_features: int
         feature_importance = pd.Series(rf.feature_importances_, index=X_clean.columns)
         rf_features = feature_importance.nlargest(max_features//2).index.tolist()
         
-        # دمج النتائج
-        selected_features = list(set(f_features + mi_features + rf_features))
+        # دمج النتائج - بترتيب الأعمدة الأصلي ليبقى ثابتاً بين التشغيلات (ترتيب set عشوائي)
+        chosen = set(f_features + mi_features + rf_features)
+        selected_features = [col for col in X_clean.columns if col in chosen]
         return selected_features[:max_features]
         
     except Exception as e:
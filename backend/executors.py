@@ -0,0 +1,324 @@
+"""
+Executors
+طبقة التنفيذ: إخراج العمل الثقيل من حلقة الأحداث في FastAPI
+
+    cpu      : ProcessPoolExecutor - التحليل الفني والأنماط ووايكوف (دوال بلا حالة على قوائم الأسعار)
+    model    : ThreadPoolExecutor  - تنبؤ النماذج (المحركات تحتفظ بحالتها في العملية الرئيسية)
+    training : ThreadPoolExecutor  - التدريب وتحميل النماذج (عامل واحد افتراضياً)
+    io       : ThreadPoolExecutor  - استدعاءات HTTP المتزامنة (Binance والمشاعر)
+
+لكل مجمع طابور محدود: عند امتلائه يُرفض الطلب فوراً بـ ExecutorSaturated بدلاً من تراكم
+الطلبات بلا حد. كل محرك نماذج محمي بقفل قراءة/كتابة: التنبؤات تعمل معاً والتدريب وحده،
+فلا يقرأ تنبؤ نماذج نصف مدربة. التنبؤ ينتظر التدريب في حلقة الأحداث قبل أخذ مكان في مجمع
+model، فلا تمتلئ خيوطه بتنبؤات محرك قيد التدريب بينما المحركات الأخرى جاهزة.
+
+عمال مجمع cpu يُنشأون من forkserver نظيف (لا fork لعملية الخادم بخيوطها) يستورد مسبقاً
+وحدات التحليل فقط - لا main ولا النماذج.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from profiler import current_profile
+
+LATENCY_WINDOW = 1024
+# الوحدات التي يستوردها عمال cpu مسبقاً - كل ما تحتاجه مهام cpu ولا شيء غيره
+CPU_WORKER_PRELOAD = ["executors", "profiler", "indicators", "pattern_recognition", "wyckoff_analysis"]
+
+
+class ExecutorSaturated(RuntimeError):
+    """طابور المجمع ممتلئ"""
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EngineLock:
+    """
+    قفل قراءة/كتابة لمحرك نماذج - الكاتب المنتظر يوقف القراء الجدد حتى لا ينتظر التدريب للأبد
+    القراء (التنبؤات) ينتظرون في حلقة الأحداث، والكاتب (التدريب) ينتظر في خيط مجمع training
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self._async_waiters = []
+
+    async def acquire_shared(self):
+        """حجز قراءة دون حجز خيط - يُحرر بـ release_shared"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if not (self._writer or self._writers_waiting):
+                    self._readers += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release_shared(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+                waiters, self._async_waiters = self._async_waiters, []
+            for loop, waiter in waiters:
+                try:
+                    loop.call_soon_threadsafe(_wake, waiter)
+                except RuntimeError:
+                    pass  # الحلقة أُغلقت
+
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict, guard: Callable = None):
+    """تنفيذ الدالة مع أوقات البدء والانتهاء (ساعة الحائط لتُقارن عبر العمليات) - انتظار القفل يُحسب انتظاراً"""
+    if guard is None:
+        started = time.time()
+        return started, func(*args, **kwargs), time.time()
+    with guard():
+        started = time.time()
+        return started, func(*args, **kwargs), time.time()
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2)
+    }
+
+
+class BoundedExecutor:
+    """مجمع عمال بطابور محدود وقياس زمن الانتظار والتنفيذ"""
+
+    def __init__(self, name: str, kind: str, max_workers: int, max_queue: int):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"kind must be 'process' or 'thread', got {kind!r}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._wait_ms = deque(maxlen=LATENCY_WINDOW)
+        self._run_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                context = multiprocessing.get_context(os.getenv("EXECUTOR_START_METHOD", "forkserver"))
+                if context.get_start_method() == "forkserver":
+                    # بدون هذا يستورد خادم forkserver وحدة __main__ (main.py كاملة مع النماذج واتصالات قاعدة البيانات)
+                    context.set_forkserver_preload(CPU_WORKER_PRELOAD)
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    async def run(self, func: Callable, *args, guard: Callable = None, release: Callable = None,
+                  **kwargs) -> Any:
+        """
+        تنفيذ func في المجمع وانتظار النتيجة دون حجز حلقة الأحداث
+        guard: مدير سياق يُدخل داخل العامل قبل التنفيذ (أقفال المحركات - مجمعات الخيوط فقط)
+        release: يُستدعى مرة واحدة عند انتهاء المهمة فعلاً أو رفضها - حتى لو أُلغي انتظارها
+        """
+        if guard is not None and self.kind == "process":
+            raise ValueError("guards can only be used with thread pools")
+
+        # طلب تحت التحليل (profiler.py): عينات العامل أثناء تنفيذ هذه المهمة
+        profile = current_profile()
+        if profile is not None:
+            func, args = profile.wrap(self.name, self.kind, func, args)
+
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                if release is not None:
+                    release()
+                raise ExecutorSaturated(
+                    f"{self.name} pool saturated ({self._in_flight} tasks in flight, "
+                    f"{self.max_workers} workers + {self.max_queue} queued)"
+                )
+            self._in_flight += 1
+            self._counters["submitted"] += 1
+            executor = self._get_executor()
+
+        submitted_at = time.time()
+        try:
+            future = executor.submit(_timed_call, func, args, kwargs, guard)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            if release is not None:
+                release()
+            raise
+        future.add_done_callback(lambda f: self._on_done(f, submitted_at))
+        if release is not None:
+            future.add_done_callback(lambda f: release())
+
+        _, result, _ = await asyncio.wrap_future(future)
+        if profile is not None:
+            result = profile.unwrap(self.name, self.kind, result)
+        return result
+
+    def _on_done(self, future, submitted_at: float):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                self._counters["failed"] += 1
+                return
+            error = future.exception()
+            if error is not None:
+                self._counters["failed"] += 1
+                if isinstance(error, BrokenExecutor) and self._executor is not None:
+                    # عامل مات (نفاد ذاكرة مثلاً) - مجمع جديد عند الإرسال التالي
+                    print(f"⚠️ {self.name} pool broken, recreating: {error}")
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                return
+            started, _, finished = future.result()
+            self._counters["completed"] += 1
+            self._wait_ms.append(max(0.0, started - submitted_at) * 1000)
+            self._run_ms.append((finished - started) * 1000)
+
+    def start(self):
+        """إنشاء المجمع وتشغيل عماله الآن بدل أول طلب - يحجز الخيط المستدعي حتى يجهز العامل"""
+        with self._lock:
+            executor = self._get_executor()
+        executor.submit(os.getpid).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+            counters = dict(self._counters)
+            wait_ms, run_ms = list(self._wait_ms), list(self._run_ms)
+        running = min(in_flight, self.max_workers)
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queue_depth": in_flight - running,
+            **counters,
+            "wait_ms": _percentiles(wait_ms),
+            "run_ms": _percentiles(run_ms)
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ExecutorRegistry:
+    """المجمعات الأربعة وأقفال المحركات"""
+
+    def __init__(self):
+        cpu_count = os.cpu_count() or 2
+        # مع عدة عمال uvicorn (WEB_CONCURRENCY) تُقسم الأنوية بينهم بدل أن يشغل كل عامل مجمعاً كاملاً
+        web_workers = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+        self.pools = {
+            "cpu": BoundedExecutor("cpu", "process",
+                                   int(os.getenv("EXECUTOR_CPU_WORKERS", max(1, (cpu_count - 1) // web_workers))),
+                                   int(os.getenv("EXECUTOR_CPU_QUEUE", 64))),
+            "model": BoundedExecutor("model", "thread",
+                                     int(os.getenv("EXECUTOR_MODEL_WORKERS", 4)),
+                                     int(os.getenv("EXECUTOR_MODEL_QUEUE", 32))),
+            "training": BoundedExecutor("training", "thread",
+                                        int(os.getenv("EXECUTOR_TRAINING_WORKERS", 1)),
+                                        int(os.getenv("EXECUTOR_TRAINING_QUEUE", 2))),
+            "io": BoundedExecutor("io", "thread",
+                                  int(os.getenv("EXECUTOR_IO_WORKERS", 32)),
+                                  int(os.getenv("EXECUTOR_IO_QUEUE", 256)))
+        }
+        self._engine_locks: Dict[int, EngineLock] = {}
+        self._engine_locks_guard = threading.Lock()
+
+    def engine_lock(self, engine) -> EngineLock:
+        with self._engine_locks_guard:
+            return self._engine_locks.setdefault(id(engine), EngineLock())
+
+    async def run_cpu(self, func: Callable, *args, **kwargs) -> Any:
+        """حساب ثقيل بلا حالة في عملية منفصلة - func ومعاملاتها يجب أن تكون قابلة لـ pickle"""
+        return await self.pools["cpu"].run(func, *args, **kwargs)
+
+    async def run_io(self, func: Callable, *args, **kwargs) -> Any:
+        """استدعاء متزامن ينتظر الشبكة"""
+        return await self.pools["io"].run(func, *args, **kwargs)
+
+    async def run_model(self, engine, func: Callable, *args, **kwargs) -> Any:
+        """
+        تنبؤ بمحرك - يعمل مع التنبؤات الأخرى وينتظر انتهاء تدريب نفس المحرك قبل دخول المجمع
+        القفل يُحرر عند انتهاء التنبؤ في الخيط لا عند إلغاء انتظاره (مهلة الطبقة)
+        """
+        lock = self.engine_lock(engine)
+        await lock.acquire_shared()
+        return await self.pools["model"].run(func, *args, release=lock.release_shared, **kwargs)
+
+    async def run_training(self, engine, func: Callable, *args, **kwargs) -> Any:
+        """تدريب أو تحميل نماذج محرك - وحده على المحرك (engine=None لعمل طويل لا يغير أي محرك)"""
+        guard = self.engine_lock(engine).exclusive if engine is not None else None
+        return await self.pools["training"].run(func, *args, guard=guard, **kwargs)
+
+    async def warm_up(self):
+        """تشغيل forkserver لمجمع cpu عند بدء الخادم - في خيط لأن تشغيله يستغرق ثانية أو أكثر"""
+        if self.pools["cpu"].kind == "process":
+            await asyncio.to_thread(self.pools["cpu"].start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: stats["queue_depth"] for name, stats in self.stats().items()}
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+
+
+def detect_patterns(prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+    """مهمة cpu: كشف الأنماط السعرية"""
+    from pattern_recognition import pattern_recognizer
+    return pattern_recognizer.detect_all_patterns(prices, volumes)
+
+
+def analyze_wyckoff(prices: List[float], volumes: List[float], timestamps: List[Any] = None) -> Dict[str, Any]:
+    """مهمة cpu: تحليل وايكوف - محلل جديد لكل طلب لأنه يحتفظ بالمرحلة الحالية"""
+    from wyckoff_analysis import WyckoffAnalyzer
+    return WyckoffAnalyzer().analyze_wyckoff_pattern(prices, volumes, timestamps)
+
+
+# إنشاء مثيل عام
+executors = ExecutorRegistry()
@@ -0,0 +1,79 @@
+"""
+Fast JSON
+تسلسل JSON للاستجابات والتخزين المؤقت والبث بمرور واحد على البيانات
+
+orjson يكتب أنواع NumPy (القيم والمصفوفات) مباشرة ويحول NaN/Inf إلى null،
+فلا حاجة لتنظيف الاستجابة مسبقاً. ما لا يدعمه (pandas Timestamp/NaT/NA، مصفوفات object
+أو غير متصلة) يمر عبر _default - أنواع pandas تُفحص فقط إذا استوردها غيرنا. بدون orjson: تحويل تكراري ثم المكتبة القياسية.
+"""
+
+import json
+import sys
+from datetime import date
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj: Any) -> Any:
+    """الأنواع التي لا يكتبها orjson مباشرة"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    # pandas لا يُستورد هنا: قيمه لا تصل إلا إذا كانت الوحدة محملة
+    pd = sys.modules.get("pandas")
+    if pd is not None and (obj is pd.NaT or obj is pd.NA):
+        return None
+    if isinstance(obj, date):
+        # يشمل pd.Timestamp (صنف فرعي من datetime)
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _to_builtin(data: Any) -> Any:
+    """تحويل تكراري لأنواع Python الأساسية - مسار المكتبة القياسية فقط"""
+    if isinstance(data, dict):
+        return {k: _to_builtin(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_to_builtin(item) for item in data]
+    if isinstance(data, float) and not np.isfinite(data):
+        return None
+    if isinstance(data, (str, int, float, bool)) or data is None:
+        return data
+    return _to_builtin(_default(data))
+
+
+def dumps(data: Any) -> bytes:
+    """JSON بصيغة UTF-8"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(_to_builtin(data), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """استجابة JSON بـ orjson - تقبل أنواع NumPy مباشرة"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
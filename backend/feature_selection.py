@@ -0,0 +1,111 @@
+"""
+Feature Pruning
+تقليم الميزات مرة واحدة لكل لقطة تدريب
+
+المراحل (كلها بعمليات المصفوفات على بيانات التدريب فقط):
+    1. حذف الأعمدة الثابتة أو التي بها قيم غير منتهية
+    2. حذف الأعمدة شبه المكررة (ارتباط مطلق أعلى من correlation_threshold)
+    3. ترتيب الباقي بالمعلومات المتبادلة مع الهدف وإبقاء أفضل max_features
+
+النتيجة تُحفظ مع لقطة التدريب (feature_selection.json) فإعادة التدريب على نفس
+اللقطة لا تعيد الحساب، والمحرك يحفظ الأعمدة المختارة مع نماذجه ليحسبها وحدها عند التنبؤ.
+"""
+
+import numpy as np
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sklearn.feature_selection import mutual_info_classif
+
+from training_snapshots import feature_version, training_snapshots
+
+SELECTION_ARTIFACT = "feature_selection"
+
+
+def usable_columns_mask(X: np.ndarray) -> np.ndarray:
+    """الأعمدة المنتهية وغير الثابتة"""
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) == 0:
+        return np.zeros(X.shape[1], dtype=bool)
+    finite = np.isfinite(X).all(axis=0)
+    spread = np.zeros(X.shape[1])
+    spread[finite] = np.ptp(X[:, finite], axis=0)
+    return finite & (spread > 0)
+
+
+def prune_features(X: np.ndarray, y: np.ndarray, feature_columns: List[str], max_features: int = 30,
+                   correlation_threshold: float = 0.98, random_state: int = 42) -> Dict[str, Any]:
+    """اختيار الأعمدة - يعيد الأعمدة المختارة بترتيبها الأصلي مع سبب حذف الباقي"""
+    start = datetime.now()
+    X = np.asarray(X, dtype=np.float64)
+    columns = np.asarray(feature_columns)
+
+    usable = usable_columns_mask(X)
+    dropped_unusable = columns[~usable].tolist()
+    candidates = np.flatnonzero(usable)
+
+    # الأعمدة شبه المكررة: يبقى الأول من كل مجموعة مترابطة
+    dropped_correlated = []
+    if len(candidates) > 1:
+        correlation = np.abs(np.corrcoef(X[:, candidates], rowvar=False))
+        correlated = np.triu(correlation > correlation_threshold, k=1)
+        redundant = correlated.any(axis=0)
+        dropped_correlated = columns[candidates[redundant]].tolist()
+        candidates = candidates[~redundant]
+
+    scores = {}
+    dropped_low_rank = []
+    if len(candidates) > max_features:
+        mi = mutual_info_classif(X[:, candidates], y, random_state=random_state)
+        scores = {columns[i]: round(float(s), 5) for i, s in zip(candidates, mi)}
+        ranked = candidates[np.argsort(-mi, kind="stable")]
+        dropped_low_rank = columns[np.sort(ranked[max_features:])].tolist()
+        candidates = np.sort(ranked[:max_features])
+
+    selected = columns[candidates].tolist()
+    if not selected:
+        # لا شيء صالح - السعر وحده أفضل من نموذج بلا ميزات
+        selected = [feature_columns[0]]
+
+    return {
+        "selected_columns": selected,
+        "selected_count": len(selected),
+        "source_columns": len(feature_columns),
+        "source_feature_version": feature_version(list(feature_columns)),
+        "feature_version": feature_version(selected),
+        "dropped": {
+            "unusable": dropped_unusable,
+            "correlated": dropped_correlated,
+            "low_rank": dropped_low_rank
+        },
+        "mutual_information": scores,
+        "params": {
+            "max_features": max_features,
+            "correlation_threshold": correlation_threshold
+        },
+        "selection_time_seconds": round((datetime.now() - start).total_seconds(), 3)
+    }
+
+
+def select_features_for_snapshot(X_train: np.ndarray, y_train: np.ndarray, feature_columns: List[str],
+                                 symbol: str = None, interval: str = "1h", engine: str = "enhanced",
+                                 snapshot_version: str = None, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    الاختيار المحفوظ مع اللقطة إن وُجد ويطابق الأعمدة والمعاملات، وإلا حسابه وحفظه
+    بدون عملة أو إصدار لقطة يُحسب الاختيار بدون تخزين
+    """
+    params = params or {}
+    cacheable = bool(symbol and snapshot_version)
+    if cacheable:
+        cached = training_snapshots.load_artifact(symbol, interval, engine, snapshot_version, SELECTION_ARTIFACT)
+        if (cached and cached.get("source_feature_version") == feature_version(list(feature_columns))
+                and all(cached.get("params", {}).get(k) == v for k, v in params.items())):
+            cached["from_cache"] = True
+            return cached
+
+    selection = prune_features(X_train, y_train, feature_columns, **params)
+    selection["snapshot_version"] = snapshot_version
+    if cacheable:
+        training_snapshots.save_artifact(symbol, interval, engine, snapshot_version, SELECTION_ARTIFACT, selection)
+    selection["from_cache"] = False
+    return selection
@@ -0,0 +1,123 @@
+"""
+HTTP Cache
+تخزين مؤقت على مستوى HTTP للاستجابات التي لا تتغير قبل إغلاق الشمعة
+
+    CandleCacheMiddleware : ETag و Last-Modified و Cache-Control تُحسب قبل تشغيل المعالج من
+                            (المسار، المعاملات، وقت إغلاق الشمعة، إصدار النماذج) - الطلب الشرطي
+                            المطابق يُجاب بـ 304 دون جلب شموع أو تشغيل نماذج
+    SelectiveCompressionMiddleware: ضغط brotli (أو gzip حسب Accept-Encoding) للاستجابات الكبيرة -
+                                    ما عدا مسارات البث حتى لا يحجز الضاغط الأحداث حتى امتلاء كتلته
+
+الاستجابة التي يضع معالجها Cache-Control: no-store (نتيجة جزئية) تمر دون ETag أو max-age،
+فلا يحمل العميل محدداً لها ولا تُؤكد لاحقاً بـ 304.
+"""
+
+import hashlib
+import math
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+class CandleValidator(NamedTuple):
+    """ما تعتمد عليه الاستجابة: بذرة ETag وحدود الشمعة الحالية (ms)"""
+    seed: str
+    open_time: int
+    close_time: int
+
+
+class CandleCacheMiddleware:
+    """
+    resolve(path, query_params) -> CandleValidator أو None (المسار غير قابل للتخزين)
+    تُضاف الترويسات لاستجابات 200 فقط - الأخطاء والاستجابات بـ no-store لا تُخزن
+    """
+
+    def __init__(self, app, resolve: Callable[[str, QueryParams], Optional[CandleValidator]]):
+        self.app = app
+        self.resolve = resolve
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        validator = self.resolve(scope["path"], QueryParams(scope.get("query_string", b"")))
+        if validator is None:
+            await self.app(scope, receive, send)
+            return
+
+        etag, cache_headers = self._cache_headers(validator)
+        if self._not_modified(Headers(scope=scope), etag, validator.open_time):
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cache_headers(message):
+            if (message["type"] == "http.response.start" and message["status"] == 200
+                    and not self._no_store(message.get("headers", []))):
+                message["headers"] = list(message.get("headers", [])) + cache_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+    @staticmethod
+    def _no_store(headers) -> bool:
+        return "no-store" in Headers(raw=list(headers)).get("cache-control", "").lower()
+
+    @staticmethod
+    def _cache_headers(validator: CandleValidator) -> Tuple[str, list]:
+        etag = f'"{hashlib.blake2b(validator.seed.encode(), digest_size=12).hexdigest()}"'
+        max_age = max(0, math.ceil(validator.close_time / 1000 - time.time()))
+        return etag, [
+            (b"etag", etag.encode()),
+            (b"last-modified", formatdate(validator.open_time / 1000, usegmt=True).encode()),
+            (b"cache-control", f"max-age={max_age}".encode())
+        ]
+
+    @staticmethod
+    def _not_modified(headers: Headers, etag: str, open_time: int) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            # If-None-Match يتقدم على If-Modified-Since
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= open_time // 1000
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class SelectiveCompressionMiddleware:
+    """
+    ضغط مع استثناء مسارات البث (SSE و NDJSON و WebSocket)
+    brotli للعملاء الذين يقبلونه و gzip لغيرهم - gzip فقط إذا لم تُثبت brotli-asgi
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, exclude_paths: Tuple[str, ...] = (),
+                 brotli_quality: int = 4):
+        self.app = app
+        if BROTLI_AVAILABLE:
+            self.compress = BrotliMiddleware(app, quality=brotli_quality, minimum_size=minimum_size,
+                                             gzip_fallback=True)
+        else:
+            self.compress = GZipMiddleware(app, minimum_size=minimum_size)
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_paths):
+            await self.compress(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -34,8 +34,10 @@ def calculate_rsi(prices: List[float], period: int = 14) -> Dict[str, Any]:
     rs = avg_gains / avg_losses
     rsi = 100 - (100 / (1 + rs))
     
-    current_rsi = round(rsi.iloc[-1], 2)
-    
+    return rsi_signal(round(rsi.iloc[-1], 2))
+
+def rsi_signal(current_rsi: float) -> Dict[str, Any]:
+    """إشارة RSI من آخر قيمة"""
     # تحديد الإشارة
     if current_rsi >= 70:
         signal = "OVERBOUGHT"
@@ -73,20 +75,25 @@ def calculate_moving_averages(prices: List[float]) -> Dict[str, Any]:
     """
     close_prices = pd.Series(prices)
     
+    ma20 = round(calculate_sma(close_prices, 20).iloc[-1], 2) if len(prices) >= 20 else None
+    ma50 = round(calculate_sma(close_prices, 50).iloc[-1], 2) if len(prices) >= 50 else None
+    ma200 = round(calculate_sma(close_prices, 200).iloc[-1], 2) if len(prices) >= 200 else None
+    return moving_average_signals(prices[-1], ma20, ma50, ma200)
+
+def moving_average_signals(current_price: float, ma20: float = None, ma50: float = None,
+                           ma200: float = None) -> Dict[str, Any]:
+    """إشارات المتوسطات من آخر قيمها - None للمتوسط الذي لا تكفيه البيانات"""
     result = {}
     
     # المتوسطات قصيرة المدى
-    if len(prices) >= 20:
-        ma20 = calculate_sma(close_prices, 20)
-        result["ma20"] = round(ma20.iloc[-1], 2)
+    if ma20 is not None:
+        result["ma20"] = ma20
     
     # المتوسطات متوسطة المدى
-    if len(prices) >= 50:
-        ma50 = calculate_sma(close_prices, 50)
-        result["ma50"] = round(ma50.iloc[-1], 2)
+    if ma50 is not None:
+        result["ma50"] = ma50
         
         # تحديد الاتجاه بناءً على MA50
-        current_price = prices[-1]
         if current_price > result["ma50"]:
             result["ma50_signal"] = "ABOVE"
             result["ma50_interpretation"] = "السعر أعلى من المتوسط - اتجاه صاعد"
@@ -95,11 +102,9 @@ def calculate_moving_averages(prices: List[float]) -> Dict[str, Any]:
             result["ma50_interpretation"] = "السعر أسفل المتوسط - اتجاه هابط"
     
     # المتوسطات طويلة المدى
-    if len(prices) >= 200:
-        ma200 = calculate_sma(close_prices, 200)
-        result["ma200"] = round(ma200.iloc[-1], 2)
+    if ma200 is not None:
+        result["ma200"] = ma200
         
-        current_price = prices[-1]
         if current_price > result["ma200"]:
             result["ma200_signal"] = "ABOVE"
             result["ma200_interpretation"] = "اتجاه صاعد طويل المدى"
@@ -141,19 +146,21 @@ def calculate_macd(prices: List[float], fast_period: int = 12, slow_period: int
     histogram = macd_line - signal_line
     
     # الحصول على آخر القيم
-    current_macd = round(macd_line.iloc[-1], 6)
-    current_signal = round(signal_line.iloc[-1], 6)
-    current_histogram = round(histogram.iloc[-1], 6)
-    
+    return macd_signal(
+        round(macd_line.iloc[-1], 6), round(signal_line.iloc[-1], 6), round(histogram.iloc[-1], 6),
+        macd_line.iloc[-2] if len(macd_line) > 1 else None,
+        signal_line.iloc[-2] if len(macd_line) > 1 else None
+    )
+
+def macd_signal(current_macd: float, current_signal: float, current_histogram: float,
+                prev_macd: float = None, prev_signal: float = None) -> Dict[str, Any]:
+    """إشارة MACD من آخر قيمتين"""
     # تحديد الإشارة
     signal = "HOLD"
     signal_strength = "WEAK"
     
     # فحص التقاطع
-    if len(macd_line) > 1:
-        prev_macd = macd_line.iloc[-2]
-        prev_signal = signal_line.iloc[-2]
-        
+    if prev_macd is not None:
         # تقاطع صاعد (إشارة شراء)
         if current_macd > current_signal and prev_macd <= prev_signal:
             signal = "BUY"
@@ -198,10 +205,59 @@ def comprehensive_analysis(prices: List[float]) -> Dict[str, Any]:
         return {"error": "Need at least 50 data points for comprehensive analysis"}
     
     # حساب كل المؤشرات
-    macd_result = calculate_macd(prices)
-    rsi_result = calculate_rsi(prices)
-    ma_result = calculate_moving_averages(prices)
+    return combine_indicator_signals(calculate_macd(prices), calculate_rsi(prices), calculate_moving_averages(prices))
+
+def comprehensive_analysis_batch(prices_by_symbol: Dict[str, List[float]]) -> Dict[str, Dict[str, Any]]:
+    """
+    comprehensive_analysis لعدة عملات - العملات بنفس طول السلسلة تُحسب مؤشراتها معاً
+    كأعمدة DataFrame واحد (عملية pandas واحدة لكل مؤشر بدلاً من واحدة لكل عملة)
+    النتيجة لكل عملة مطابقة لـ comprehensive_analysis
+    """
+    results = {}
+    symbols_by_length = {}
+    for symbol, prices in prices_by_symbol.items():
+        if len(prices) < 50:
+            results[symbol] = {"error": "Need at least 50 data points for comprehensive analysis"}
+        else:
+            symbols_by_length.setdefault(len(prices), []).append(symbol)
     
+    for length, symbols in symbols_by_length.items():
+        close_prices = pd.DataFrame({symbol: prices_by_symbol[symbol] for symbol in symbols}, dtype=float)
+        
+        # MACD
+        macd_line = calculate_ema(close_prices, 12) - calculate_ema(close_prices, 26)
+        signal_line = calculate_ema(macd_line, 9)
+        histogram = macd_line - signal_line
+        
+        # RSI
+        delta = close_prices.diff()
+        gains = delta.where(delta > 0, 0)
+        losses = -delta.where(delta < 0, 0)
+        rsi = 100 - (100 / (1 + gains.rolling(window=14).mean() / losses.rolling(window=14).mean()))
+        
+        # المتوسطات
+        ma20 = calculate_sma(close_prices, 20).iloc[-1]
+        ma50 = calculate_sma(close_prices, 50).iloc[-1]
+        ma200 = calculate_sma(close_prices, 200).iloc[-1] if length >= 200 else None
+        
+        macd_last, macd_prev = macd_line.iloc[-1], macd_line.iloc[-2]
+        signal_last, signal_prev = signal_line.iloc[-1], signal_line.iloc[-2]
+        histogram_last, rsi_last = histogram.iloc[-1], rsi.iloc[-1]
+        
+        for symbol in symbols:
+            results[symbol] = combine_indicator_signals(
+                macd_signal(round(macd_last[symbol], 6), round(signal_last[symbol], 6),
+                            round(histogram_last[symbol], 6), macd_prev[symbol], signal_prev[symbol]),
+                rsi_signal(round(rsi_last[symbol], 2)),
+                moving_average_signals(prices_by_symbol[symbol][-1], round(ma20[symbol], 2), round(ma50[symbol], 2),
+                                       round(ma200[symbol], 2) if ma200 is not None else None)
+            )
+    
+    return {symbol: results[symbol] for symbol in prices_by_symbol}
+
+def combine_indicator_signals(macd_result: Dict[str, Any], rsi_result: Dict[str, Any],
+                              ma_result: Dict[str, Any]) -> Dict[str, Any]:
+    """التوصية الإجمالية من نتائج MACD و RSI والمتوسطات"""
     # تجميع الإشارات
     signals = []
     
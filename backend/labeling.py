@@ -0,0 +1,175 @@
+"""
+Vectorized Target Labeling
+إنشاء أهداف التدريب بعمليات المصفوفات
+
+كل الدوال تعيد مصفوفة بنفس طول الأسعار. الصفوف الأخيرة التي لا يُعرف مستقبلها
+تُملأ حسب pad:
+    "last"  : تكرار آخر هدف معروف (سلوك المحركات الحالية)
+    np.nan  : قيمة مفقودة تُحذف مع فلترة الصفوف غير الصالحة
+    رقم     : قيمة ثابتة
+
+الأهداف: 1 صعود، 0 هبوط، و neutral (-1 افتراضياً) للحركات داخل النطاق عند تحديد حد الهبوط
+"""
+
+import numpy as np
+from typing import Any, Dict, Sequence, Union
+
+# حجم الدفعة لحساب الحواجز الثلاثة - يحد الذاكرة إلى chunk × horizon
+TRIPLE_BARRIER_CHUNK = 100_000
+
+
+def _as_prices(prices) -> np.ndarray:
+    return np.asarray(prices, dtype=np.float64)
+
+
+def forward_returns(prices, horizon: int = 1) -> np.ndarray:
+    """العائد بعد horizon شمعة - NaN للصفوف الأخيرة"""
+    prices = _as_prices(prices)
+    returns = np.full(len(prices), np.nan)
+    if horizon < len(prices):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[:-horizon] = prices[horizon:] / prices[:-horizon] - 1.0
+    return returns
+
+
+def rolling_volatility(prices, window: int = 20) -> np.ndarray:
+    """الانحراف المعياري المتحرك للعوائد اللوغاريتمية (بدون pandas)"""
+    prices = _as_prices(prices)
+    volatility = np.full(len(prices), np.nan)
+    if len(prices) <= window:
+        return volatility
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.diff(np.log(prices))
+    # مجاميع تراكمية: تباين كل نافذة في O(n)
+    cumsum = np.concatenate(([0.0], np.cumsum(log_returns)))
+    cumsum_sq = np.concatenate(([0.0], np.cumsum(log_returns ** 2)))
+    window_sum = cumsum[window:] - cumsum[:-window]
+    window_sum_sq = cumsum_sq[window:] - cumsum_sq[:-window]
+    variance = (window_sum_sq - window_sum ** 2 / window) / (window - 1)
+    volatility[window:] = np.sqrt(np.maximum(variance, 0.0))
+    return volatility
+
+
+def _pad(labels: np.ndarray, known: int, pad: Union[str, float]) -> np.ndarray:
+    """ملء الصفوف الأخيرة غير المعروفة"""
+    if known >= len(labels):
+        return labels
+    if isinstance(pad, str):
+        if pad != "last":
+            raise ValueError(f"قيمة pad غير مدعومة: {pad}")
+        labels[known:] = labels[known - 1] if known > 0 else 0
+        return labels
+    if np.isnan(pad) and labels.dtype.kind != 'f':
+        labels = labels.astype(np.float64)
+    labels[known:] = pad
+    return labels
+
+
+def _threshold_labels(returns: np.ndarray, up: np.ndarray, down, neutral: int) -> np.ndarray:
+    if down is None:
+        return (returns > up).astype(np.int64)
+    return np.where(returns > up, 1, np.where(returns < -down, 0, neutral)).astype(np.int64)
+
+
+def fixed_threshold_labels(prices, horizon: int = 1, up_threshold: float = 0.0,
+                           down_threshold: float = None, neutral: int = -1,
+                           pad: Union[str, float] = "last") -> np.ndarray:
+    """
+    أهداف بعتبة ثابتة
+    بدون down_threshold: 1 إذا تجاوز العائد up_threshold وإلا 0
+    مع down_threshold: 1 صعود، 0 هبوط أكبر من down_threshold، neutral بينهما
+    """
+    returns = forward_returns(prices, horizon)
+    known = max(0, len(returns) - horizon)
+    labels = _threshold_labels(returns, up_threshold, down_threshold, neutral)
+    return _pad(labels, known, pad)
+
+
+def multi_horizon_labels(prices, horizons: Sequence[int] = (1, 4, 12, 24), up_threshold: float = 0.0,
+                         down_threshold: float = None, neutral: int = -1,
+                         pad: Union[str, float] = np.nan) -> Dict[int, np.ndarray]:
+    """أهداف لعدة آفاق دفعة واحدة: {الأفق: الأهداف}"""
+    prices = _as_prices(prices)
+    return {
+        horizon: fixed_threshold_labels(prices, horizon, up_threshold, down_threshold, neutral, pad)
+        for horizon in horizons
+    }
+
+
+def volatility_scaled_labels(prices, horizon: int = 1, volatility_window: int = 20,
+                             multiplier: float = 1.0, neutral: int = -1,
+                             pad: Union[str, float] = np.nan) -> np.ndarray:
+    """
+    عتبة تتكيف مع التقلب: الحركة المعنوية = multiplier × تقلب الشمعة × √horizon
+    الصفوف قبل اكتمال نافذة التقلب تُعامل كغير معروفة (NaN)
+    """
+    returns = forward_returns(prices, horizon)
+    threshold = multiplier * rolling_volatility(prices, volatility_window) * np.sqrt(horizon)
+    labels = _threshold_labels(returns, threshold, threshold, neutral)
+
+    labels = _pad(labels, max(0, len(returns) - horizon), pad)
+    if np.isnan(threshold).any():
+        labels = labels.astype(np.float64)
+        labels[np.isnan(threshold)] = np.nan
+    return labels
+
+
+def triple_barrier_labels(prices, horizon: int = 24, profit_take: float = 0.02, stop_loss: float = 0.02,
+                          volatility_window: int = None, neutral: int = -1,
+                          pad: Union[str, float] = np.nan) -> np.ndarray:
+    """
+    طريقة الحواجز الثلاثة: 1 إذا لمس السعر حاجز الربح أولاً، 0 إذا لمس حاجز الخسارة أولاً،
+    neutral إذا انتهى الأفق دون لمس أي منهما
+
+    volatility_window: عند تحديده تصبح profit_take و stop_loss مضاعفات للتقلب المتحرك
+    """
+    prices = _as_prices(prices)
+    n = len(prices)
+    known = max(0, n - horizon)
+    labels = np.full(n, neutral, dtype=np.int64)
+
+    upper = np.full(n, float(profit_take))
+    lower = np.full(n, float(stop_loss))
+    if volatility_window:
+        volatility = rolling_volatility(prices, volatility_window) * np.sqrt(horizon)
+        upper = upper * volatility
+        lower = lower * volatility
+
+    if known > 0:
+        # نوافذ [i+1, i+horizon] بدون نسخ - تُعالج على دفعات لتحديد الذاكرة
+        windows = np.lib.stride_tricks.sliding_window_view(prices[1:], horizon)
+        for start in range(0, known, TRIPLE_BARRIER_CHUNK):
+            stop = min(start + TRIPLE_BARRIER_CHUNK, known)
+            path = windows[start:stop] / prices[start:stop, None] - 1.0
+
+            hit_upper = path >= upper[start:stop, None]
+            hit_lower = path <= -lower[start:stop, None]
+            # أول لمس لكل حاجز (horizon = لم يُلمس)
+            first_upper = np.where(hit_upper.any(axis=1), hit_upper.argmax(axis=1), horizon)
+            first_lower = np.where(hit_lower.any(axis=1), hit_lower.argmax(axis=1), horizon)
+
+            chunk = labels[start:stop]
+            chunk[first_upper < first_lower] = 1
+            chunk[first_lower < first_upper] = 0
+
+    labels = _pad(labels, known, pad)
+    if volatility_window:
+        labels = labels.astype(np.float64)
+        labels[np.isnan(upper)] = np.nan
+    return labels
+
+
+LABEL_METHODS = {
+    "fixed": fixed_threshold_labels,
+    "volatility": volatility_scaled_labels,
+    "triple_barrier": triple_barrier_labels
+}
+
+
+def make_labels(prices, method: str = "fixed", **params: Any) -> np.ndarray:
+    """إنشاء الأهداف بالطريقة المحددة في إعدادات المحرك"""
+    if method not in LABEL_METHODS:
+        raise ValueError(f"طريقة أهداف غير معروفة: {method} - المتاح: {list(LABEL_METHODS)}")
+    return LABEL_METHODS[method](prices, **params)
+
@@ -1,27 +1,67 @@
-from fastapi import FastAPI, HTTPException, Query, Body
+import time
+
+MAIN_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, Body, Request, WebSocket, WebSocketDisconnect, Header, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from sqlalchemy import create_engine, text
 import redis
-import json
+import re
 import traceback
 import gc
 import asyncio
+from contextlib import ExitStack
 import os
-import pandas as pd
-import numpy as np
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
+import fast_json
+from fast_json import FastJSONResponse
+from http_cache import CandleCacheMiddleware, CandleValidator, SelectiveCompressionMiddleware
+from metrics import metrics, Gauge, Counter, RequestMetricsMiddleware, CACHE_REQUESTS, TRAINING_BUCKETS
+from profiler import ProfilingMiddleware, profile_store, admin_token_valid, to_collapsed, to_speedscope
+from services import services, ServicesReadyMiddleware
+from shared_state import shared_state, model_registry, WORKER_ID
 import traceback
 
 # Load environment variables first
 load_dotenv()
 
 # Initialize FastAPI app
-app = FastAPI(title="Trading AI Platform", version="1.0.0")
+app = FastAPI(title="Trading AI Platform", version="1.0.0", default_response_class=FastJSONResponse)
+
+# مسارات البث - لا تُضغط حتى لا يحجز الضاغط الأحداث
+STREAMING_PATHS = ("/stream/", "/ws/", "/analysis/batch", "/ai/ultimate-analysis/batch")
+
+# المحركات التي يستخدمها كل مسار - أول بادئة مطابقة، والمسارات الأخرى لا تستخدم المحركات
+MODEL_SERVICES = ("simple_ai", "advanced_ai", "enhanced_ai")
+SERVICE_ROUTES = (
+    ("/ai/simple/", ("simple_ai",)),
+    ("/ai/advanced/", ("advanced_ai",)),
+    ("/ai/enhanced/", ("enhanced_ai",)),
+    ("/debug/test-enhanced/", ("enhanced_ai",)),
+    ("/ai/forecast/", ("price_forecaster",)),
+    ("/api/sentiment/", ("sentiment",)),
+    ("/ai/ultimate-analysis/", ("simple_ai", "advanced_ai", "sentiment")),
+    ("/stream/analysis", ("simple_ai", "advanced_ai", "sentiment")),
+    ("/ws/analysis", ("simple_ai", "advanced_ai", "sentiment")),
+    ("/ai/predict/batch", MODEL_SERVICES + ("price_forecaster",)),
+    ("/ai/predict/", ("simple_ai", "advanced_ai")),
+    ("/ai/train/", MODEL_SERVICES),
+    ("/ai/training-status/", MODEL_SERVICES),
+    ("/ai/test-connection", MODEL_SERVICES + ("sentiment",)),
+    ("/models/status", MODEL_SERVICES),
+    ("/models/load-all", MODEL_SERVICES),
+)
+
+# الطلبات أثناء الإحماء تنتظر استيراد محركات مسارها في خيط بدل استيرادها على حلقة الأحداث
+app.add_middleware(ServicesReadyMiddleware, container=services, routes=SERVICE_ROUTES)
+# ضغط الاستجابات الكبيرة و ETag/304 حتى إغلاق الشمعة - قبل CORS حتى تحمل ردود 304 ترويساته
+app.add_middleware(SelectiveCompressionMiddleware, minimum_size=1024, exclude_paths=STREAMING_PATHS)
+app.add_middleware(CandleCacheMiddleware, resolve=lambda path, params: resolve_http_cache(path, params))
 
 # Enhanced CORS middleware - This fixes your CORS issues
 app.add_middleware(
@@ -45,9 +85,15 @@ app.add_middleware(
         "Origin",
         "Access-Control-Request-Method",
         "Access-Control-Request-Headers",
+        "X-Admin-Token",
+        "X-Profile",
     ],
     expose_headers=["*"],
 )
+# زمن الطلبات لكل مسار - الطبقة الخارجية حتى تشمل ردود 304 والضغط
+app.add_middleware(RequestMetricsMiddleware, router=app.router, exclude_paths=("/stream/", "/ws/"))
+# تحليل أداء طلب عند الطلب (X-Profile: 1 + X-Admin-Token) - النتائج في /debug/profiles
+app.add_middleware(ProfilingMiddleware, store=profile_store)
 # Add OPTIONS handler for all routes to fix preflight requests
 @app.options("/{rest_of_path:path}")
 async def preflight_handler(rest_of_path: str):
@@ -103,7 +149,8 @@ print("🔄 Loading modules...")
 
 # Import basic modules
 try:
-    from indicators import calculate_macd, generate_sample_data, comprehensive_analysis, calculate_rsi
+    from indicators import (calculate_macd, generate_sample_data, comprehensive_analysis,
+                            comprehensive_analysis_batch, calculate_rsi)
 
     print("✅ Indicators module loaded")
 except Exception as e:
@@ -122,6 +169,10 @@ except Exception as e:
         return {"error": "indicators module not available"}
 
 
+    def comprehensive_analysis_batch(prices_by_symbol):
+        return {symbol: {"error": "indicators module not available"} for symbol in prices_by_symbol}
+
+
     def calculate_rsi(*args):
         return []
 
@@ -147,95 +198,135 @@ except Exception as e:
     print(f"❌ Failed to load alert service: {e}")
     alert_service = None
 
+# محركات النماذج والمشاعر كسولة (services.py): تُستورد عند أول استخدام أو في الإحماء بعد بدء الخادم،
+# فيجيب /health فور التشغيل. *_AVAILABLE صحيح إذا نجح الاستيراد (ServicesReadyMiddleware يستورد قبل المعالج)
+simple_ai = services.register("simple_ai", "simple_ai", "simple_ai", warm_up="load_model")
+advanced_ai = services.register("advanced_ai", "advanced_ai", "advanced_ai", warm_up="load_ensemble")
+enhanced_advanced_ai = services.register("enhanced_ai", "enhanced_advanced_ai", "enhanced_advanced_ai",
+                                         warm_up="load_enhanced_models")
+ENHANCED_AI_AVAILABLE = services.flag("enhanced_ai")
+price_forecaster = services.register("price_forecaster", "price_forecaster", "price_forecaster",
+                                     warm_up="load_models")
+FORECASTER_AVAILABLE = services.flag("price_forecaster")
+sentiment_analyzer = services.register("sentiment", "sentiment_analysis", "sentiment_analyzer")
+SENTIMENT_AVAILABLE = services.flag("sentiment")
+
 try:
-    from simple_ai import simple_ai
+    from training_snapshots import training_snapshots
 
-    print("✅ Simple AI loaded")
+    print("✅ Training snapshots loaded")
 except Exception as e:
-    print(f"❌ Failed to load simple AI: {e}")
-    simple_ai = None
+    print(f"❌ Failed to load training snapshots: {e}")
+    training_snapshots = None
 
-try:
-    from advanced_ai import advanced_ai
+from executors import executors, ExecutorSaturated, detect_patterns, analyze_wyckoff
+from market_stream import AnalysisHub
 
-    print("✅ Advanced AI loaded")
-except Exception as e:
-    print(f"❌ Failed to load advanced AI: {e}")
-    advanced_ai = None
 
-# Try to import enhanced AI
-ENHANCED_AI_AVAILABLE = False
-enhanced_advanced_ai = None
-try:
-    from enhanced_advanced_ai import enhanced_advanced_ai
+# ============ Redis Cache Configuration ============
+# مدة كل فترة شموع بالثواني - الشموع تبدأ عند مضاعفات المدة منذ epoch
+INTERVAL_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "8h": 28800, "12h": 43200,
+    "1d": 86400, "3d": 259200, "1w": 604800
+}
+WEEK_OPEN_OFFSET = 4 * 86400  # الأسبوع في Binance يبدأ يوم الاثنين وepoch كان خميساً
+
+
+def current_candle_close_time(interval: str) -> Optional[int]:
+    """وقت إغلاق الشمعة الحالية (ms) كما تحسبه Binance - None للفترات غير المعروفة"""
+    seconds = INTERVAL_SECONDS.get(interval)
+    if not seconds:
+        return None
+    offset = WEEK_OPEN_OFFSET if interval == "1w" else 0
+    open_time = (int(time.time()) - offset) // seconds * seconds + offset
+    return (open_time + seconds) * 1000 - 1
 
-    ENHANCED_AI_AVAILABLE = True
-    print("✅ Enhanced AI loaded successfully")
-except ImportError as e:
-    print(f"⚠️ Enhanced AI not available: {e}")
-    ENHANCED_AI_AVAILABLE = False
-except Exception as e:
-    print(f"❌ Enhanced AI failed to load: {e}")
-    ENHANCED_AI_AVAILABLE = False
 
-# Try to import sentiment analyzer
-SENTIMENT_AVAILABLE = False
-sentiment_analyzer = None
-try:
-    from sentiment_analysis import sentiment_analyzer
+def closed_klines(klines: Optional[List[Dict]], limit: int = None) -> List[Dict]:
+    """
+    الشموع المغلقة فقط (آخر limit منها) - الشمعة المتشكلة تتغير حتى إغلاقها
+    المسارات المخزنة مؤقتاً تجلب limit + 1 وتتنبأ على هذه فيبقى المفتاح "آخر شمعة مغلقة"
+    """
+    now_ms = int(time.time() * 1000)
+    closed = [k for k in klines or [] if int(k["close_time"]) < now_ms]
+    return closed[-limit:] if limit else closed
 
-    SENTIMENT_AVAILABLE = True
-    print("✅ Sentiment analysis loaded")
-except ImportError:
-    print("⚠️ Sentiment analysis not available - install vaderSentiment")
-    SENTIMENT_AVAILABLE = False
-except Exception as e:
-    print(f"❌ Sentiment analysis failed: {e}")
-    SENTIMENT_AVAILABLE = False
+
+def get_model_version(*engines) -> Optional[str]:
+    """إصدار النماذج المستخدمة في التنبؤ - None إذا كان أي منها غير مدرب"""
+    versions = [getattr(engine, 'model_version', None) for engine in engines]
+    if not versions or any(version is None for version in versions):
+        return None
+    return "-".join(versions)
 
 
-# ============ Redis Cache Configuration ============
 class AICache:
-    """نظام التخزين المؤقت للتنبؤات مع معالجة الأخطاء"""
+    """نظام التخزين المؤقت للتنبؤات مع معالجة الأخطاء
+
+    مفتاح التنبؤ: (المحرك، العملة، الفترة، إصدار النموذج، وقت إغلاق الشمعة الحالية)
+    والتنبؤ مبني على الشموع المغلقة (closed_klines) فلا يتغير قبل إغلاق الشمعة الحالية.
+    """
 
     def __init__(self, redis_client):
         self.redis = redis_client
-        self.default_ttl = 300  # 5 دقائق
         self.enabled = redis_client is not None
 
-    def get_prediction(self, symbol: str) -> Dict:
-        """جلب تنبؤ من التخزين المؤقت"""
-        if not self.enabled:
+    def prediction_key(self, engine: str, symbol: str, interval: str, model_version: str, close_time: int) -> str:
+        return f"prediction:{engine}:{symbol.upper()}:{interval}:{model_version}:{close_time}"
+
+    def get_prediction(self, engine: str, symbol: str, interval: str, model_version: Optional[str]) -> Dict:
+        """جلب تنبؤ الشمعة الحالية من التخزين المؤقت"""
+        if not self.enabled or model_version is None:
             return None
-        key = f"prediction:enhanced:{symbol}"
+        close_time = current_candle_close_time(interval)
+        if close_time is None:
+            return None
+        key = self.prediction_key(engine, symbol, interval, model_version, close_time)
         try:
             cached = self.redis.get(key)
             if cached:
-                return json.loads(cached)
+                entry = fast_json.loads(cached)
+                prediction = entry["prediction"]
+                prediction["from_cache"] = True
+                prediction["cache_age_seconds"] = round(time.time() - entry["cached_at"], 1)
+                CACHE_REQUESTS.inc(cache=f"prediction:{engine}", result="hit")
+                return prediction
         except Exception as e:
             print(f"Cache get error: {e}")
+        CACHE_REQUESTS.inc(cache=f"prediction:{engine}", result="miss")
         return None
 
-    def set_prediction(self, symbol: str, prediction: Dict, ttl: int = None):
-        """حفظ تنبؤ في التخزين المؤقت"""
-        if not self.enabled:
+    def set_prediction(self, engine: str, symbol: str, interval: str, model_version: Optional[str],
+                       klines: List[Dict], prediction: Dict):
+        """حفظ تنبؤ مبني على شموع مغلقة حتى إغلاق الشمعة التالية لآخرها (الشمعة الحالية)"""
+        if not self.enabled or model_version is None or not klines or interval not in INTERVAL_SECONDS:
             return
-        key = f"prediction:enhanced:{symbol}"
-        ttl = ttl or self.default_ttl
+        last_close = int(klines[-1]["close_time"])
+        if last_close >= time.time() * 1000:
+            return  # البيانات تشمل الشمعة المتشكلة - لا تُخزن حتى إغلاقها
+        close_time = last_close + INTERVAL_SECONDS[interval] * 1000
+        ttl = int(close_time / 1000 - time.time()) + 1
+        if ttl <= 0:
+            return  # الشمعة التالية أُغلقت أيضاً - البيانات قديمة
+        key = self.prediction_key(engine, symbol, interval, model_version, close_time)
         try:
-            self.redis.setex(key, ttl, json.dumps(prediction))
+            self.redis.setex(key, ttl, fast_json.dumps({"cached_at": time.time(), "prediction": prediction}))
         except Exception as e:
             print(f"Cache set error: {e}")
 
+    def training_key(self, symbol: str) -> str:
+        return f"training:enhanced:{symbol.upper()}"
+
     def get_training_result(self, symbol: str) -> Dict:
         """جلب نتيجة تدريب"""
         if not self.enabled:
             return None
-        key = f"training:enhanced:{symbol}"
+        key = self.training_key(symbol)
         try:
             cached = self.redis.get(key)
             if cached:
-                return json.loads(cached)
+                return fast_json.loads(cached)
         except Exception as e:
             print(f"Cache get error: {e}")
         return None
@@ -244,9 +335,9 @@ class AICache:
         """حفظ نتيجة تدريب"""
         if not self.enabled:
             return
-        key = f"training:enhanced:{symbol}"
+        key = self.training_key(symbol)
         try:
-            self.redis.setex(key, 86400, json.dumps(result))
+            self.redis.setex(key, 86400, fast_json.dumps(result))
         except Exception as e:
             print(f"Cache set error: {e}")
 
@@ -254,45 +345,490 @@ class AICache:
         """مسح كل التخزين المؤقت لعملة معينة"""
         if not self.enabled:
             return
-        keys = [f"prediction:enhanced:{symbol}", f"training:enhanced:{symbol}"]
+        try:
+            keys = list(self.redis.scan_iter(match=f"prediction:*:{symbol.upper()}:*"))
+        except redis.RedisError as e:
+            print(f"Cache scan error: {e}")
+            keys = []
+        keys.append(self.training_key(symbol))
         for key in keys:
             try:
                 self.redis.delete(key)
-            except:
-                pass
+            except redis.RedisError as e:
+                print(f"Cache delete error: {e}")
 
 
 # إنشاء instance من التخزين المؤقت
 ai_cache = AICache(redis_client)
 
+# مسارات GET التي تتحدد استجابتها بـ (العملة، الفترة، إغلاق الشمعة، إصدار النماذج):
+# (نمط المسار، المحركات، الفترة الثابتة - None = معامل interval وافتراضيه 1h)
+# /analysis و /market/data غير مدرجة: تعرض الشمعة المتشكلة (السعر والحجم) فتتغير قبل الإغلاق
+HTTP_CACHE_ROUTES = [
+    # peek لا يستورد المحرك داخل الوسيط - المحرك غير المستورد إصداره غير معروف فلا تخزين
+    (re.compile(r"^/ai/simple/predict/[^/]+$"), lambda: (services["simple_ai"].peek(),), "1h"),
+    (re.compile(r"^/ai/advanced/predict/[^/]+$"), lambda: (services["advanced_ai"].peek(),), "1h"),
+    (re.compile(r"^/ai/enhanced/predict/[^/]+$"), lambda: (services["enhanced_ai"].peek(),), "1h"),
+    (re.compile(r"^/ai/predict/[^/]+$"), lambda: (services["simple_ai"].peek(), services["advanced_ai"].peek()), "1h"),
+    (re.compile(r"^/ai/ultimate-analysis/[^/]+$"),
+     lambda: (services["simple_ai"].peek(), services["advanced_ai"].peek()), None)
+]
 
-# ============ Helper Functions ============
-def clean_response_data(data):
-    """تنظيف البيانات من numpy types قبل إرسالها"""
-    if isinstance(data, dict):
-        return {k: clean_response_data(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [clean_response_data(item) for item in data]
-    elif isinstance(data, (np.integer, np.int64, np.int32)):
-        return int(data)
-    elif isinstance(data, (np.floating, np.float64, np.float32)):
-        return float(data)
-    elif isinstance(data, np.ndarray):
-        return data.tolist()
-    elif pd.isna(data):
+
+# استجابة لا تُخزن عند العميل ولا يضيف لها CandleCacheMiddleware محددات (خطأ أو نتيجة جزئية)
+NO_STORE_HEADERS = {"Cache-Control": "no-store"}
+
+
+def resolve_http_cache(path: str, params) -> Optional[CandleValidator]:
+    """مدخلات ETag للطلب دون تشغيل المعالج - None إذا قد تتغير الاستجابة قبل إغلاق الشمعة"""
+    if (params.get("force_refresh", "false").lower() in ("1", "true", "yes", "on")
+            or params.get("use_cache", "true").lower() in ("0", "false", "no", "off")):
         return None
-    return data
+
+    for pattern, engines, fixed_interval in HTTP_CACHE_ROUTES:
+        if pattern.match(path):
+            break
+    else:
+        return None
+
+    interval = fixed_interval or params.get("interval", "1h")
+    close_time = current_candle_close_time(interval)
+    if close_time is None:
+        return None
+
+    model_version = ""
+    if engines():
+        # نماذج غير محملة بعد - الإصدار غير معروف حتى أول تنبؤ
+        model_version = get_model_version(*engines())
+        if model_version is None:
+            return None
+
+    seed = f"{path}?{sorted(params.multi_items())}|{close_time}|{model_version}"
+    return CandleValidator(seed, close_time + 1 - INTERVAL_SECONDS[interval] * 1000, close_time)
+
+
+# ============ Metrics ============
+BINANCE_CALL_SECONDS = metrics.histogram(
+    "binance_call_duration_seconds", "Binance REST call latency", ["call", "status"]
+)
+BINANCE_USED_WEIGHT = metrics.gauge(
+    "binance_used_weight_1m", "Request weight used in the current minute (X-MBX-USED-WEIGHT-1M)"
+)
+MODEL_INFERENCE_SECONDS = metrics.histogram(
+    "model_inference_duration_seconds", "Prediction call latency per engine (lock wait excluded)", ["engine", "call"]
+)
+SUBMODEL_INFERENCE_SECONDS = metrics.histogram(
+    "submodel_inference_duration_seconds", "Per-model inference time inside ensemble predictions", ["engine", "model"]
+)
+TRAINING_JOB_SECONDS = metrics.histogram(
+    "training_job_duration_seconds", "Training and model loading job duration", ["engine", "job", "status"],
+    buckets=TRAINING_BUCKETS
+)
+EVENT_LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "Delay of a periodic asyncio timer beyond its schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+# أرقام المجمعات تُقرأ من executors عند كل طلب /metrics
+EXECUTOR_QUEUE_DEPTH = Gauge("executor_queue_depth", "Tasks waiting for a free worker", ["pool"])
+EXECUTOR_RUNNING = Gauge("executor_running", "Tasks currently running", ["pool"])
+EXECUTOR_TASKS = Counter("executor_tasks_total", "Executor tasks by outcome", ["pool", "state"])
+
+
+def collect_executor_metrics():
+    stats = executors.stats()
+    return [
+        (EXECUTOR_QUEUE_DEPTH, [("", {"pool": name}, pool["queue_depth"]) for name, pool in stats.items()]),
+        (EXECUTOR_RUNNING, [("", {"pool": name}, pool["running"]) for name, pool in stats.items()]),
+        (EXECUTOR_TASKS, [
+            ("", {"pool": name, "state": state}, pool[state])
+            for name, pool in stats.items() for state in ("submitted", "completed", "failed", "rejected")
+        ])
+    ]
+
+
+metrics.register_collector(collect_executor_metrics)
 
 
+async def monitor_event_loop_lag():
+    """تأخر مؤقت دوري عن موعده = زمن حجز حلقة الأحداث بعمل متزامن"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - start - EVENT_LOOP_LAG_INTERVAL))
+
+
+def engine_label(engine) -> str:
+    # __class__ لا type() حتى يُرجع وكيل الخدمة صنف المحرك الحقيقي
+    return engine.__class__.__name__ if engine is not None else "none"
+
+
+def timed_model_call(engine_name: str, func, *args, **kwargs):
+    """تنفيذ التنبؤ داخل العامل مع قياس زمنه وزمن كل نموذج في المجموعة"""
+    with MODEL_INFERENCE_SECONDS.time(engine=engine_name, call=getattr(func, "__name__", "call")):
+        result = func(*args, **kwargs)
+    if isinstance(result, dict):
+        for model_name, ms in (result.get("prediction_times_ms") or {}).items():
+            if ms:
+                SUBMODEL_INFERENCE_SECONDS.observe(ms / 1000, engine=engine_name, model=model_name)
+    return result
+
+
+def timed_training_call(engine_name: str, func, *args, **kwargs):
+    """تنفيذ التدريب داخل العامل مع قياس مدته"""
+    labels = {"engine": engine_name, "job": getattr(func, "__name__", "job")}
+    start = time.perf_counter()
+    status = "error"
+    try:
+        result = func(*args, **kwargs)
+        status = "error" if isinstance(result, dict) and "error" in result else "ok"
+        return result
+    finally:
+        TRAINING_JOB_SECONDS.observe(time.perf_counter() - start, status=status, **labels)
+
+
+# ============ Helper Functions ============
 def safe_binance_call(func, *args, **kwargs):
     """تنفيذ آمن لاستدعاءات Binance API"""
     if not binance_client:
         raise HTTPException(status_code=503, detail="Binance client not available")
+    start = time.perf_counter()
+    status = "error"
     try:
-        return func(*args, **kwargs)
+        result = func(*args, **kwargs)
+        status = "ok" if result is not None else "error"
+        return result
     except Exception as e:
         print(f"Binance API error: {e}")
         raise HTTPException(status_code=500, detail=f"Binance API error: {str(e)}")
+    finally:
+        BINANCE_CALL_SECONDS.observe(time.perf_counter() - start, call=func.__name__, status=status)
+        if getattr(binance_client, "used_weight", None) is not None:
+            BINANCE_USED_WEIGHT.set(binance_client.used_weight)
+
+
+# ---- التنفيذ خارج حلقة الأحداث (executors.py) - امتلاء الطابور يصبح 503 ----
+async def _offload(awaitable):
+    try:
+        return await awaitable
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+async def run_cpu(func, *args, **kwargs):
+    """حساب ثقيل بلا حالة في مجمع العمليات"""
+    return await _offload(executors.run_cpu(func, *args, **kwargs))
+
+
+async def run_io(func, *args, **kwargs):
+    """استدعاء شبكة متزامن في مجمع الخيوط"""
+    return await _offload(executors.run_io(func, *args, **kwargs))
+
+
+async def binance_call(func, *args, **kwargs):
+    """safe_binance_call دون حجز حلقة الأحداث"""
+    return await run_io(safe_binance_call, func, *args, **kwargs)
+
+
+async def run_model(engine, func, *args, **kwargs):
+    """تنبؤ بمحرك نماذج - ينتظر انتهاء أي تدريب لنفس المحرك"""
+    await sync_engine_models(engine)
+    return await _offload(executors.run_model(engine, timed_model_call, engine_label(engine), func, *args, **kwargs))
+
+
+async def run_training(engine, func, *args, **kwargs):
+    """تدريب أو تحميل نماذج محرك - وحده على المحرك"""
+    result = await _offload(executors.run_training(engine, timed_training_call, engine_label(engine), func, *args, **kwargs))
+    publish_engine_models(engine)
+    return result
+
+
+# ---- عدة عمال (shared_state.py): الإصدار الحي لكل محرك في سجل النماذج المشترك ----
+async def sync_engine_models(engine):
+    """إعادة تحميل نماذج المحرك من المجلد المشترك إذا نشر عامل آخر إصداراً غير المحمل هنا"""
+    service = services.for_engine(engine)
+    if service is None or not service.warm_up:
+        return
+    published = model_registry.newer_version(service.name, engine.model_version)
+    if published:
+        print(f"🔄 {service.name}: reloading models {engine.model_version} -> {published}")
+        # بدون نشر: ما يُحمل هو ما في المجلد المشترك
+        await _offload(executors.run_training(engine, timed_training_call, engine_label(engine),
+                                              getattr(engine, service.warm_up)))
+        if engine.model_version != published:
+            print(f"⚠️ {service.name}: loaded {engine.model_version} but {published} is live - "
+                  f"is the models directory shared between workers?")
+
+
+def publish_engine_models(engine):
+    """نشر الإصدار الحي بعد تدريب أو تحميل أو ترقية - لا شيء إذا لم يتغير"""
+    service = services.for_engine(engine)
+    if service is not None and service.peek() is not None:
+        model_registry.publish(service.name, engine.model_version)
+
+
+TRAINING_LOCK_TTL = float(os.getenv("TRAINING_LOCK_TTL", 3600))
+
+
+def training_claim(*names: str):
+    """اعتمادية: تدريب المحرك في عامل واحد بين كل العمال - 409 إذا كان يتدرب عند عامل آخر"""
+    def claim():
+        with ExitStack() as stack:
+            for name in names:
+                if not stack.enter_context(shared_state.lock(f"training:{name}", TRAINING_LOCK_TTL)):
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"{name} training already running on worker {shared_state.lock_owner(f'training:{name}')}"
+                    )
+            yield
+
+    return claim
+
+
+async def iter_klines(symbols: List[str], interval: str, limit: int, concurrency: int = 10):
+    """جلب الشموع لعدة عملات بشكل متزامن - كل عملة تُرجع (العملة، الشموع أو None) فور وصولها"""
+    if not binance_client:
+        raise HTTPException(status_code=503, detail="Binance client not available")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(symbol: str):
+        async with semaphore:
+            try:
+                return symbol, await executors.run_io(binance_client.get_klines, symbol, interval, limit)
+            except Exception as e:
+                print(f"Binance API error for {symbol}: {e}")
+                return symbol, None
+
+    tasks = [asyncio.create_task(fetch(symbol)) for symbol in symbols]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # العميل انقطع أثناء البث - لا داعي لإكمال الجلب
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_klines_batch(symbols: List[str], interval: str, limit: int,
+                             concurrency: int = 10) -> Dict[str, Optional[List[Dict]]]:
+    """جلب الشموع لعدة عملات بشكل متزامن مع حد للطلبات المتوازية"""
+    fetched = {symbol: klines async for symbol, klines in iter_klines(symbols, interval, limit, concurrency)}
+    return {symbol: fetched[symbol] for symbol in symbols}
+
+
+MAX_BATCH_SYMBOLS = 300
+BATCH_CHUNK_SIZE = 25  # عملات كل مهمة في مجمع التنفيذ - أول النتائج تصل بعد أول دفعة
+
+
+def normalize_batch_symbols(symbols: List[str], limit: int) -> List[str]:
+    """توحيد قائمة العملات (بدون تكرار) والتحقق من الحدود"""
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if s and s.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="قائمة العملات فارغة")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"عدد العملات {len(symbols)} يتجاوز الحد الأقصى ({MAX_BATCH_SYMBOLS})"
+        )
+    if limit < 50 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit يجب أن يكون بين 50 و 1000")
+    return symbols
+
+
+async def iter_klines_chunks(symbols: List[str], interval: str, limit: int, chunk_size: int = BATCH_CHUNK_SIZE,
+                             closed: bool = False):
+    """
+    تجميع الشموع الواصلة في دفعات - (دفعة {العملة: الشموع}، عملات فشل جلبها)
+    closed: الشموع المغلقة فقط (للنتائج المخزنة مؤقتاً حتى إغلاق الشمعة)
+    """
+    chunk, failed = {}, []
+    async for symbol, klines in iter_klines(symbols, interval, limit + 1 if closed else limit):
+        if closed:
+            klines = closed_klines(klines, limit)
+        if klines:
+            chunk[symbol] = klines
+        else:
+            failed.append(symbol)
+        if len(chunk) >= chunk_size:
+            yield chunk, failed
+            chunk, failed = {}, []
+    if chunk or failed:
+        yield chunk, failed
+
+
+async def stream_chunk_results(chunks, process_chunk):
+    """
+    تشغيل process_chunk لكل دفعة فور وصولها وإرجاع نتائجها بترتيب انتهائها
+    process_chunk: دالة async تُرجع قائمة نتائج (قاموس لكل عملة)
+    """
+    pending = set()
+    async for chunk, failed in chunks:
+        for symbol in failed:
+            yield {"symbol": symbol, "error": "Could not fetch data"}
+        if chunk:
+            pending.add(asyncio.create_task(process_chunk(chunk)))
+        for task in [task for task in pending if task.done()]:
+            pending.discard(task)
+            for item in task.result():
+                yield item
+    try:
+        for next_done in asyncio.as_completed(pending):
+            for item in await next_done:
+                yield item
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def ndjson_stream(items, started: float):
+    """بث النتائج سطراً JSON لكل عملة، وسطر ملخص في النهاية"""
+    succeeded = failed = 0
+    async for item in items:
+        if "error" in item:
+            failed += 1
+        else:
+            succeeded += 1
+        yield fast_json.dumps(item) + b"\n"
+    yield fast_json.dumps({"summary": {
+        "succeeded": succeeded,
+        "failed": failed,
+        "processing_time_ms": round((time.perf_counter() - started) * 1000, 2)
+    }}) + b"\n"
+
+
+def load_training_snapshot(engine_name: str, symbol: str, interval: str, version: str) -> Dict[str, Any]:
+    """بيانات تدريب من لقطة محفوظة بدلاً من جلب الشموع وهندسة الميزات"""
+    if not training_snapshots:
+        raise HTTPException(status_code=501, detail="Training snapshots not available")
+    dataset = training_snapshots.load_dataset(symbol, interval, engine_name, version)
+    if dataset is None:
+        raise HTTPException(status_code=404,
+                            detail=f"No {engine_name} training snapshot '{version}' for {symbol} {interval}")
+    return dataset
+
+
+def snapshot_training_dataset(engine_name: str, engine, symbol: str, interval: str,
+                              klines: List[Dict], prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+    """بناء بيانات التدريب من الشموع وحفظها كلقطة بإصدار"""
+    if engine_name == "simple":
+        dataset = engine.build_training_dataset(prices) or {"error": "البيانات غير كافية للتدريب"}
+    else:
+        dataset = engine.build_training_dataset(prices, volumes)
+
+    # الحفظ فقط عندما تطابق الأسعار الشموع صفاً بصف (لحفظ توقيت كل صف)
+    if training_snapshots and "error" not in dataset and len(prices) == len(klines):
+        manifest = training_snapshots.save(
+            symbol, interval, engine_name, klines, dataset["X"], dataset["y"],
+            dataset["row_index"], dataset["feature_columns"]
+        )
+        dataset["snapshot_version"] = manifest.get("version")
+    return dataset
+
+
+# مهلة كل طبقة في التحليل الشامل (ثوانٍ) - الترتيب هو ترتيب الطبقات في الاستجابة
+ULTIMATE_LAYER_TIMEOUTS = {
+    "technical": float(os.getenv("ULTIMATE_TECHNICAL_TIMEOUT", 5)),
+    "simple_ai": float(os.getenv("ULTIMATE_SIMPLE_AI_TIMEOUT", 5)),
+    "advanced_ai": float(os.getenv("ULTIMATE_ADVANCED_AI_TIMEOUT", 10)),
+    "sentiment": float(os.getenv("ULTIMATE_SENTIMENT_TIMEOUT", 8))
+}
+
+
+async def run_analysis_layer(name: str, layer, timeout: float = None) -> tuple:
+    """تشغيل طبقة تحليل بمهلتها - تُرجع (النتيجة، التوقيت) ولا ترفع استثناء أبداً"""
+    timeout = timeout or ULTIMATE_LAYER_TIMEOUTS[name]
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(layer, timeout)
+        status = "error" if isinstance(result, dict) and "error" in result else "ok"
+    except asyncio.TimeoutError:
+        # العامل يكمل في الخلفية ونتيجته تُهمل - والمهمة التي لم تبدأ تُلغى من الطابور
+        result = {"error": f"{name} timed out after {timeout}s", "timed_out": True}
+        status = "timeout"
+    except Exception as e:
+        result = {"error": f"{name} error: {getattr(e, 'detail', None) or str(e)}"}
+        status = "error"
+    return result, {"status": status, "ms": round((time.perf_counter() - start) * 1000, 2), "timeout_s": timeout}
+
+
+async def simple_ai_layer(close_prices: List[float]) -> Dict:
+    """طبقة AI البسيط - تحميل النموذج عند الحاجة ثم التنبؤ"""
+    if not simple_ai:
+        return {"error": "Simple AI not available"}
+    if not (simple_ai.is_trained or await run_training(simple_ai, simple_ai.load_model)):
+        return {"error": "Model not trained"}
+    return await run_model(simple_ai, simple_ai.predict, close_prices)
+
+
+async def advanced_ai_layer(close_prices: List[float], volumes: List[float]) -> Dict:
+    """طبقة AI المتقدم - تحميل المجموعة عند الحاجة ثم التنبؤ"""
+    if not advanced_ai:
+        return {"error": "Advanced AI not available"}
+    if not (advanced_ai.is_trained or await run_training(advanced_ai, advanced_ai.load_ensemble)):
+        return {"error": "Models not trained"}
+    return await run_model(advanced_ai, advanced_ai.predict_ensemble, close_prices, volumes)
+
+
+def build_analysis_response(symbol: str, interval: str, klines: List[Dict], analysis_result: Dict) -> Dict:
+    """استجابة /analysis لعملة من شموعها ونتيجة التحليل"""
+    latest_candle = klines[-1]
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "data_points": len(klines),
+        "current_price": latest_candle["close"],
+        "volume": latest_candle["volume"],
+        "last_update": datetime.fromtimestamp(latest_candle["timestamp"] / 1000).strftime(
+            "%Y-%m-%d %H:%M:%S UTC"),
+        "comprehensive_analysis": analysis_result
+    }
+
+
+def add_frontend_aliases(technical: Dict) -> Dict:
+    """إضافة القيم المفقودة للتوافق مع الفرونت-إند (macd_line / signal_line / value)"""
+    if "error" not in technical:
+        # إصلاح MACD
+        if "macd" in technical and technical["macd"]:
+            macd_data = technical["macd"]
+            if "macd" in macd_data:
+                macd_data["macd_line"] = macd_data["macd"]
+            if "signal" in macd_data:
+                macd_data["signal_line"] = macd_data["signal"]
+
+        # إصلاح RSI
+        if "rsi" in technical and technical["rsi"]:
+            rsi_data = technical["rsi"]
+            if "rsi" in rsi_data:
+                rsi_data["value"] = rsi_data["rsi"]
+    return technical
+
+
+def build_ultimate_result(symbol: str, interval: str, klines: List[Dict], technical_analysis: Dict,
+                          simple_ai_result: Dict, advanced_ai_result: Dict, sentiment_result: Dict,
+                          layer_timings: Dict, analysis_time_ms: float) -> Dict:
+    """نتيجة التحليل الشامل من مخرجات الطبقات الأربع"""
+    latest_candle = klines[-1]
+    return {
+        "symbol": symbol.upper(),
+        "current_price": float(latest_candle["close"]),
+        "timestamp": datetime.fromtimestamp(latest_candle["timestamp"] / 1000).isoformat(),
+        "interval": interval,
+        "data_points": len(klines),
+        "analysis_layers": {
+            "1_technical_analysis": technical_analysis,
+            "2_simple_ai": simple_ai_result,
+            "3_advanced_ai": advanced_ai_result,
+            "4_sentiment_analysis": sentiment_result
+        },
+        "ultimate_decision": combine_recommendations_with_sentiment(
+            technical_analysis, simple_ai_result, advanced_ai_result, sentiment_result
+        ),
+        "layer_timings": layer_timings,
+        "analysis_time_ms": analysis_time_ms,
+        "last_update": datetime.now().isoformat()
+    }
 
 
 def map_sentiment_to_recommendation(sentiment_trend: str) -> str:
@@ -367,16 +903,17 @@ async def root():
             "Real-time data from Binance" if binance_client else "Binance API (Not Available)",
             "MACD Technical Analysis",
             "Multiple cryptocurrency support",
-            "AI-powered predictions" if simple_ai or advanced_ai else "AI predictions (Not Available)",
-            "Sentiment Analysis" if SENTIMENT_AVAILABLE else "Sentiment Analysis (Not Available)",
-            "Enhanced AI" if ENHANCED_AI_AVAILABLE else "Enhanced AI (Not Available)"
+            "AI-powered predictions" if services["simple_ai"].available or services["advanced_ai"].available
+            else "AI predictions (Not Available)",
+            "Sentiment Analysis" if services["sentiment"].available else "Sentiment Analysis (Not Available)",
+            "Enhanced AI" if services["enhanced_ai"].available else "Enhanced AI (Not Available)"
         ],
         "modules_status": {
             "binance": binance_client is not None,
-            "simple_ai": simple_ai is not None,
-            "advanced_ai": advanced_ai is not None,
-            "enhanced_ai": ENHANCED_AI_AVAILABLE,
-            "sentiment": SENTIMENT_AVAILABLE,
+            "simple_ai": services["simple_ai"].available,
+            "advanced_ai": services["advanced_ai"].available,
+            "enhanced_ai": services["enhanced_ai"].available,
+            "sentiment": services["sentiment"].available,
             "redis": redis_client is not None,
             "database": engine is not None
         }
@@ -411,7 +948,7 @@ async def health_check():
     # Binance API status
     try:
         if binance_client:
-            price = safe_binance_call(binance_client.get_symbol_price, "BTCUSDT")
+            price = await binance_call(binance_client.get_symbol_price, "BTCUSDT")
             status["binance_api"] = "connected" if price else "error"
         else:
             status["binance_api"] = "not_configured"
@@ -419,7 +956,7 @@ async def health_check():
         status["binance_api"] = f"error: {str(e)}"
 
     # Sentiment analysis status
-    if SENTIMENT_AVAILABLE:
+    if services["sentiment"].available:
         try:
             from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
             status["sentiment_analysis"] = "available"
@@ -428,20 +965,30 @@ async def health_check():
     else:
         status["sentiment_analysis"] = "not_available"
 
-    # Enhanced AI status
-    status["enhanced_ai"] = "available" if ENHANCED_AI_AVAILABLE else "not_available"
+    # Enhanced AI status - حالة الخدمات لا تستورد المحركات (pending حتى يصلها الإحماء)
+    status["enhanced_ai"] = "available" if services["enhanced_ai"].available else "not_available"
+    status["services"] = services.states()
+    status["state_backend"] = shared_state.backend_name
+    status["worker"] = WORKER_ID
+    status["executor_queues"] = executors.queue_depths()
     status["api"] = "healthy"
 
     return status
 
 
+@app.get("/health/startup")
+async def startup_timings():
+    """زمن استيراد main وبدء الخادم وزمن استيراد وإحماء كل خدمة"""
+    return {**STARTUP_TIMINGS, "services": services.status()}
+
+
 @app.get("/symbols")
 async def get_available_symbols():
     """الحصول على قائمة العملات المتاحة"""
     try:
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        symbols = safe_binance_call(binance_client.get_available_symbols)
+        symbols = await binance_call(binance_client.get_available_symbols)
         return {
             "symbols": symbols,
             "count": len(symbols),
@@ -451,6 +998,18 @@ async def get_available_symbols():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """المقاييس بصيغة Prometheus النصية"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health/executors")
+async def get_executor_stats():
+    """مجمعات التنفيذ: العمال وعمق الطابور والمرفوض وزمن الانتظار والتنفيذ (p50/p95)"""
+    return {"pools": executors.stats(), "timestamp": datetime.now().isoformat()}
+
+
 # ============ Trading Analysis Endpoints ============
 @app.get("/analysis/{symbol}")
 async def get_comprehensive_analysis(
@@ -463,36 +1022,89 @@ async def get_comprehensive_analysis(
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
 
-        klines_data = safe_binance_call(binance_client.get_klines, symbol, interval, limit)
+        klines_data = await binance_call(binance_client.get_klines, symbol, interval, limit)
         if not klines_data:
             raise HTTPException(status_code=404, detail=f"Could not fetch data for {symbol}")
 
         close_prices = extract_close_prices(klines_data)
 
         try:
-            analysis_result = comprehensive_analysis(close_prices)
+            analysis_result = await run_cpu(comprehensive_analysis, close_prices)
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Analysis error: {e}")
             analysis_result = {"error": f"Analysis failed: {str(e)}"}
 
-        latest_candle = klines_data[-1]
+        return FastJSONResponse(build_analysis_response(symbol, interval, klines_data, analysis_result))
 
-        return clean_response_data({
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Comprehensive analysis error: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/analysis/{symbol}/patterns")
+async def get_pattern_analysis(
+        symbol: str,
+        interval: str = Query(default="1h", description="Timeframe: 1m, 5m, 15m, 1h, 4h, 1d"),
+        limit: int = Query(default=200, ge=50, le=1000, description="Number of data points")
+):
+    """الأنماط السعرية: انعكاس واستمرار ودعم ومقاومة وحجم"""
+    try:
+        klines_data = await binance_call(binance_client.get_klines, symbol, interval, limit)
+        if not klines_data:
+            raise HTTPException(status_code=404, detail=f"Could not fetch data for {symbol}")
+
+        prices = extract_close_prices(klines_data)
+        volumes = [float(k['volume']) for k in klines_data]
+        patterns = await run_cpu(detect_patterns, prices, volumes)
+
+        return FastJSONResponse({
             "symbol": symbol.upper(),
             "interval": interval,
-            "data_points": len(close_prices),
-            "current_price": latest_candle["close"],
-            "volume": latest_candle["volume"],
-            "last_update": pd.Timestamp.fromtimestamp(latest_candle["timestamp"] / 1000).strftime(
-                "%Y-%m-%d %H:%M:%S UTC"),
-            "comprehensive_analysis": analysis_result
+            "data_points": len(prices),
+            "current_price": prices[-1],
+            "patterns": patterns
         })
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Comprehensive analysis error: {e}")
-        print(traceback.format_exc())
+        print(f"Pattern analysis error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/analysis/{symbol}/wyckoff")
+async def get_wyckoff_analysis(
+        symbol: str,
+        interval: str = Query(default="1h", description="Timeframe: 15m, 1h, 4h, 1d"),
+        limit: int = Query(default=200, ge=50, le=1000, description="Number of data points")
+):
+    """تحليل وايكوف: المرحلة الحالية والأحداث والمستويات الرئيسية"""
+    try:
+        klines_data = await binance_call(binance_client.get_klines, symbol, interval, limit)
+        if not klines_data:
+            raise HTTPException(status_code=404, detail=f"Could not fetch data for {symbol}")
+
+        prices = extract_close_prices(klines_data)
+        volumes = [float(k['volume']) for k in klines_data]
+        timestamps = [k['timestamp'] for k in klines_data]
+        wyckoff = await run_cpu(analyze_wyckoff, prices, volumes, timestamps)
+        if "error" in wyckoff:
+            raise HTTPException(status_code=400, detail=wyckoff["error"])
+
+        wyckoff["symbol"] = symbol.upper()
+        wyckoff["interval"] = interval
+        wyckoff["current_price"] = prices[-1]
+        return FastJSONResponse(wyckoff)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Wyckoff analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -503,112 +1115,326 @@ async def get_ultimate_analysis(
 ):
     """التحليل الشامل النهائي مع جميع طبقات الذكاء الاصطناعي"""
     try:
+        model_version = get_model_version(simple_ai, advanced_ai)
+        cached = ai_cache.get_prediction("ultimate", symbol, interval, model_version)
+        if cached:
+            return cached
+
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
 
-        klines_data = safe_binance_call(binance_client.get_klines, symbol, interval, 200)
+        klines_data = closed_klines(await binance_call(binance_client.get_klines, symbol, interval, 201), 200)
         if not klines_data:
             raise HTTPException(status_code=404, detail=f"Could not fetch data for {symbol}")
 
         close_prices = extract_close_prices(klines_data)
         volumes = [item['volume'] for item in klines_data]
-        latest_candle = klines_data[-1]
 
-        # التحليل الفني التقليدي
-        try:
-            technical_analysis = comprehensive_analysis(close_prices)
-
-            # إضافة القيم المفقودة للتوافق مع الفرونت-إند
-            if "error" not in technical_analysis:
-                # إصلاح MACD
-                if "macd" in technical_analysis and technical_analysis["macd"]:
-                    macd_data = technical_analysis["macd"]
-                    # التأكد من وجود القيم المطلوبة
-                    if "macd" in macd_data:
-                        macd_data["macd_line"] = macd_data["macd"]
-                    if "signal" in macd_data:
-                        macd_data["signal_line"] = macd_data["signal"]
-
-                # إصلاح RSI
-                if "rsi" in technical_analysis and technical_analysis["rsi"]:
-                    rsi_data = technical_analysis["rsi"]
-                    # التأكد من وجود القيمة المطلوبة
-                    if "rsi" in rsi_data:
-                        rsi_data["value"] = rsi_data["rsi"]
+        # الطبقات مستقلة بعد جلب الشموع: تعمل معاً في المجمعات وكل منها بمهلة،
+        # فزمن الطلب = أبطأ طبقة، والطبقة المتأخرة تُرجع خطأ بدلاً من إيقاف الباقي
+        async def technical_layer():
+            return add_frontend_aliases(await run_cpu(comprehensive_analysis, close_prices))
+
+        async def sentiment_layer():
+            if not (SENTIMENT_AVAILABLE and sentiment_analyzer):
+                return {}
+            return await run_io(sentiment_analyzer.get_quick_sentiment, symbol)
+
+        analysis_start = time.perf_counter()
+        layer_outputs = await asyncio.gather(
+            run_analysis_layer("technical", technical_layer()),
+            run_analysis_layer("simple_ai", simple_ai_layer(close_prices)),
+            run_analysis_layer("advanced_ai", advanced_ai_layer(close_prices, volumes)),
+            run_analysis_layer("sentiment", sentiment_layer())
+        )
+        technical_analysis, simple_ai_result, advanced_ai_result, sentiment_result = [
+            output for output, _ in layer_outputs
+        ]
+        layer_timings = {name: timing for name, (_, timing) in zip(ULTIMATE_LAYER_TIMEOUTS, layer_outputs)}
+
+        result = build_ultimate_result(
+            symbol, interval, klines_data, technical_analysis, simple_ai_result, advanced_ai_result,
+            sentiment_result, layer_timings, round((time.perf_counter() - analysis_start) * 1000, 2)
+        )
+        # نتيجة جزئية (طبقة تجاوزت مهلتها) لا تُخزن حتى إغلاق الشمعة - لا في Redis ولا عند العميل
+        if any(timing["status"] == "timeout" for timing in layer_timings.values()):
+            return FastJSONResponse(result, headers=NO_STORE_HEADERS)
+        ai_cache.set_prediction("ultimate", symbol, interval, model_version, klines_data, result)
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Ultimate analysis error: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
 
+class BatchAnalysisRequest(BaseModel):
+    symbols: List[str]
+    interval: str = "1h"
+    limit: int = 200
+
+
+@app.post("/analysis/batch")
+async def get_batch_analysis(request: BatchAnalysisRequest):
+    """
+    التحليل الفني لقائمة عملات - بث NDJSON: سطر لكل عملة فور جاهزيته ثم سطر الملخص
+    كل سطر بنفس شكل /analysis/{symbol} (مع السعر الحالي)، والمؤشرات تُحسب لكل دفعة معاً
+    """
+    symbols = normalize_batch_symbols(request.symbols, request.limit)
+    interval = request.interval
+
+    async def analyze_chunk(chunk: Dict[str, List[Dict]]) -> List[Dict]:
+        prices_by_symbol = {symbol: extract_close_prices(klines) for symbol, klines in chunk.items()}
+        try:
+            analyses = await run_cpu(comprehensive_analysis_batch, prices_by_symbol)
         except Exception as e:
-            print(f"Technical analysis error: {e}")
-            technical_analysis = {"error": f"Technical analysis failed: {str(e)}"}
+            analyses = {symbol: {"error": f"Analysis failed: {getattr(e, 'detail', None) or str(e)}"}
+                        for symbol in chunk}
+        return [build_analysis_response(symbol, interval, klines, analyses[symbol]) for symbol, klines in chunk.items()]
 
-        # AI البسيط
-        simple_ai_result = {"error": "Simple AI not available"}
-        if simple_ai:
-            try:
-                if hasattr(simple_ai, 'is_trained') and (
-                        simple_ai.is_trained or (hasattr(simple_ai, 'load_model') and simple_ai.load_model())):
-                    simple_ai_result = simple_ai.predict(close_prices)
-                else:
-                    simple_ai_result = {"error": "Model not trained"}
-            except Exception as e:
-                simple_ai_result = {"error": f"Simple AI error: {str(e)}"}
+    results = stream_chunk_results(iter_klines_chunks(symbols, interval, request.limit), analyze_chunk)
+    return StreamingResponse(ndjson_stream(results, time.perf_counter()), media_type="application/x-ndjson")
 
-        # AI المتقدم
-        advanced_ai_result = {"error": "Advanced AI not available"}
-        if advanced_ai:
-            try:
-                if hasattr(advanced_ai, 'is_trained') and (advanced_ai.is_trained or (
-                        hasattr(advanced_ai, 'load_ensemble') and advanced_ai.load_ensemble())):
-                    advanced_ai_result = advanced_ai.predict_ensemble(close_prices, volumes)
-                else:
-                    advanced_ai_result = {"error": "Models not trained"}
-            except Exception as e:
-                advanced_ai_result = {"error": f"Advanced AI error: {str(e)}"}
 
-        # تحليل المشاعر
-        sentiment_result = {}
-        if SENTIMENT_AVAILABLE and sentiment_analyzer:
+@app.post("/ai/ultimate-analysis/batch")
+async def get_batch_ultimate_analysis(request: BatchAnalysisRequest):
+    """
+    التحليل الشامل لقائمة عملات - بث NDJSON بنفس شكل /ai/ultimate-analysis/{symbol} لكل سطر
+    لكل دفعة: المؤشرات دفعة واحدة، وكل نموذج يُستدعى مرة (predict_batch)، والمشاعر متزامنة -
+    والطبقات الأربع تعمل معاً بمهلها
+    """
+    symbols = normalize_batch_symbols(request.symbols, request.limit)
+    interval = request.interval
+
+    # تحميل النماذج المحفوظة مرة واحدة قبل البث
+    if simple_ai and not simple_ai.is_trained:
+        await run_training(simple_ai, simple_ai.load_model)
+    if advanced_ai and not advanced_ai.is_trained:
+        await run_training(advanced_ai, advanced_ai.load_ensemble)
+    model_version = get_model_version(simple_ai, advanced_ai)
+
+    async def technical_layer(prices_by_symbol):
+        analyses = await run_cpu(comprehensive_analysis_batch, prices_by_symbol)
+        return {symbol: add_frontend_aliases(analysis) for symbol, analysis in analyses.items()}
+
+    async def model_layer(engine, name, chunk):
+        if not engine:
+            return {symbol: {"error": f"{name} not available"} for symbol in chunk}
+        return await run_model(engine, engine.predict_batch, chunk)
+
+    async def sentiment_layer(chunk):
+        if not (SENTIMENT_AVAILABLE and sentiment_analyzer):
+            return {symbol: {} for symbol in chunk}
+
+        async def one(symbol):
             try:
-                sentiment_result = sentiment_analyzer.get_quick_sentiment(symbol)
+                return await run_io(sentiment_analyzer.get_quick_sentiment, symbol)
             except Exception as e:
-                sentiment_result = {"error": f"Sentiment analysis error: {str(e)}"}
+                return {"error": f"Sentiment analysis error: {getattr(e, 'detail', None) or str(e)}"}
+
+        return dict(zip(chunk, await asyncio.gather(*(one(symbol) for symbol in chunk))))
+
+    async def analyze_chunk(chunk: Dict[str, List[Dict]]) -> List[Dict]:
+        prices_by_symbol = {symbol: extract_close_prices(klines) for symbol, klines in chunk.items()}
+        chunk_start = time.perf_counter()
+        layer_outputs = await asyncio.gather(
+            run_analysis_layer("technical", technical_layer(prices_by_symbol)),
+            run_analysis_layer("simple_ai", model_layer(simple_ai, "Simple AI", chunk)),
+            run_analysis_layer("advanced_ai", model_layer(advanced_ai, "Advanced AI", chunk)),
+            run_analysis_layer("sentiment", sentiment_layer(chunk))
+        )
+        analysis_time_ms = round((time.perf_counter() - chunk_start) * 1000, 2)
+        layer_timings = {name: timing for name, (_, timing) in zip(ULTIMATE_LAYER_TIMEOUTS, layer_outputs)}
+
+        results = []
+        for symbol, klines in chunk.items():
+            # طبقة فشلت للدفعة كلها تُرجع نفس الخطأ لكل عملة
+            layers = [output if timing["status"] != "ok" else output.get(symbol, {"error": "no result"})
+                      for output, timing in layer_outputs]
+            result = build_ultimate_result(symbol, interval, klines, *layers, layer_timings, analysis_time_ms)
+            result["batch_size"] = len(chunk)
+            if all(timing["status"] != "timeout" for timing in layer_timings.values()):
+                ai_cache.set_prediction("ultimate", symbol, interval, model_version, klines, result)
+            results.append(result)
+        return results
+
+    async def results():
+        # المخزن مؤقتاً يُبث أولاً
+        to_analyze = []
+        for symbol in symbols:
+            cached = ai_cache.get_prediction("ultimate", symbol, interval, model_version)
+            if cached:
+                yield cached
+            else:
+                to_analyze.append(symbol)
+        if to_analyze:
+            async for item in stream_chunk_results(iter_klines_chunks(to_analyze, interval, request.limit,
+                                                                      closed=True),
+                                                   analyze_chunk):
+                yield item
 
-        # القرار النهائي المدمج
-        ultimate_decision = combine_recommendations_with_sentiment(
-            technical_analysis, simple_ai_result, advanced_ai_result, sentiment_result
+    return StreamingResponse(ndjson_stream(results(), time.perf_counter()), media_type="application/x-ndjson")
+
+
+# ============ Streaming Endpoints ============
+MAX_STREAM_SYMBOLS = 50
+STREAM_KLINES = 200
+STREAM_HEARTBEAT_SECONDS = 15  # تعليق SSE دوري حتى لا تغلق البروكسيات الاتصال الصامت
+STREAM_PATTERNS_TIMEOUT = float(os.getenv("STREAM_PATTERNS_TIMEOUT", 5))
+
+
+async def compute_stream_analysis(symbol: str, interval: str, closed_at: Optional[int] = None) -> Dict:
+    """
+    تحليل البث لعملة: فني + AI + أنماط (المشاعر لا تتبع الشموع فتبقى في /ai/ultimate-analysis)
+    closed_at: وقت إغلاق الشمعة - التحليل على الشموع المغلقة فقط، None = الشموع الحالية
+    """
+    if not binance_client:
+        return {"error": "Binance client not available"}
+    klines_data = await binance_call(binance_client.get_klines, symbol, interval, STREAM_KLINES + 1)
+    if closed_at:
+        klines_data = [k for k in klines_data or [] if k["close_time"] <= closed_at]
+    klines_data = (klines_data or [])[-STREAM_KLINES:]
+    if not klines_data:
+        return {"error": f"Could not fetch data for {symbol}"}
+
+    close_prices = extract_close_prices(klines_data)
+    volumes = [float(k['volume']) for k in klines_data]
+
+    async def technical_layer():
+        return add_frontend_aliases(await run_cpu(comprehensive_analysis, close_prices))
+
+    analysis_start = time.perf_counter()
+    layer_outputs = await asyncio.gather(
+        run_analysis_layer("technical", technical_layer()),
+        run_analysis_layer("simple_ai", simple_ai_layer(close_prices)),
+        run_analysis_layer("advanced_ai", advanced_ai_layer(close_prices, volumes)),
+        run_analysis_layer("patterns", run_cpu(detect_patterns, close_prices, volumes), STREAM_PATTERNS_TIMEOUT)
+    )
+    technical_analysis, simple_ai_result, advanced_ai_result, patterns = [output for output, _ in layer_outputs]
+
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "candle_close_time": klines_data[-1]["close_time"],
+        "candle_closed": closed_at is not None,
+        "current_price": close_prices[-1],
+        "data_points": len(klines_data),
+        "technical_analysis": technical_analysis,
+        "simple_ai": simple_ai_result,
+        "advanced_ai": advanced_ai_result,
+        "patterns": patterns,
+        "decision": combine_recommendations_with_sentiment(
+            technical_analysis, simple_ai_result, advanced_ai_result, {}
+        ),
+        "layer_timings": {
+            name: timing for name, (_, timing) in
+            zip(("technical", "simple_ai", "advanced_ai", "patterns"), layer_outputs)
+        },
+        "analysis_time_ms": round((time.perf_counter() - analysis_start) * 1000, 2),
+        "last_update": datetime.now().isoformat()
+    }
+
+
+async def fetch_stream_price(symbol: str) -> Optional[float]:
+    """سعر العملة لمصدر الاستطلاع"""
+    if not binance_client:
+        return None
+    return await binance_call(binance_client.get_symbol_price, symbol)
+
+
+# قناة واحدة لكل (عملة، فترة) مهما كان عدد المشتركين
+analysis_hub = AnalysisHub(compute_stream_analysis, fetch_stream_price, current_candle_close_time)
+
+
+def parse_stream_symbols(symbols: str, interval: str) -> List[str]:
+    """عملات البث من "BTCUSDT,ETHUSDT" والتحقق من الفترة والحدود"""
+    symbol_list = list(dict.fromkeys(s.upper().strip() for s in symbols.split(",") if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="قائمة العملات فارغة")
+    if len(symbol_list) > MAX_STREAM_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"عدد العملات {len(symbol_list)} يتجاوز الحد الأقصى ({MAX_STREAM_SYMBOLS})"
         )
+    if interval not in INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    return symbol_list
 
-        # بناء النتيجة النهائية
-        result = {
-            "symbol": symbol.upper(),
-            "current_price": float(latest_candle["close"]),
-            "timestamp": pd.Timestamp.fromtimestamp(latest_candle["timestamp"] / 1000).isoformat(),
-            "interval": interval,
-            "data_points": len(close_prices),
-            "analysis_layers": {
-                "1_technical_analysis": technical_analysis,
-                "2_simple_ai": simple_ai_result,
-                "3_advanced_ai": advanced_ai_result,
-                "4_sentiment_analysis": sentiment_result
-            },
-            "ultimate_decision": ultimate_decision,
-            "last_update": datetime.now().isoformat()
-        }
 
-        return clean_response_data(result)
+@app.get("/stream/analysis")
+async def stream_analysis(
+        request: Request,
+        symbols: str = Query(..., description="العملات مفصولة بفواصل: BTCUSDT,ETHUSDT"),
+        interval: str = Query(default="1h", description="Timeframe: 1m, 5m, 15m, 1h, 4h, 1d")
+):
+    """
+    بث Server-Sent Events: حدث price مع كل تحديث سعر وحدث analysis عند إغلاق كل شمعة
+    (التحليل الحالي يُرسل فور الاشتراك)
+    """
+    symbol_list = parse_stream_symbols(symbols, interval)
+    subscription = analysis_hub.subscribe(symbol_list, interval)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {fast_json.dumps(event).decode()}\n\n"
+        finally:
+            analysis_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/ws/analysis")
+async def websocket_analysis(
+        websocket: WebSocket,
+        symbols: str = Query(..., description="العملات مفصولة بفواصل: BTCUSDT,ETHUSDT"),
+        interval: str = Query(default="1h")
+):
+    """نفس أحداث /stream/analysis عبر WebSocket - رسالة JSON لكل حدث"""
+    try:
+        symbol_list = parse_stream_symbols(symbols, interval)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    subscription = analysis_hub.subscribe(symbol_list, interval)
+    try:
+        while True:
+            await websocket.send_text(fast_json.dumps(await subscription.get()).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        analysis_hub.unsubscribe(subscription)
+
+
+@app.get("/stream/stats")
+async def get_stream_stats():
+    """القنوات النشطة وعدد المشتركين والأحداث"""
+    return analysis_hub.stats()
+
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Ultimate analysis error: {e}")
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
 # ============ Enhanced AI Endpoints ============
-@app.post("/ai/enhanced/train/{symbol}")
+@app.post("/ai/enhanced/train/{symbol}", dependencies=[Depends(training_claim("enhanced_ai"))])
 async def train_enhanced_ai(
         symbol: str,
         days: int = Query(90, description="عدد أيام البيانات التاريخية"),
         optimize: bool = Query(False, description="تحسين المعاملات تلقائياً"),
-        use_cache: bool = Query(True, description="استخدام التخزين المؤقت")
+        use_cache: bool = Query(True, description="استخدام التخزين المؤقت"),
+        cv_folds: int = Query(0, ge=0, le=10, description="عدد طيات التحقق الزمني المتقاطع (0 = بدون)"),
+        snapshot: Optional[str] = Query(None, description="إعادة التدريب من لقطة محفوظة (latest أو رقم الإصدار)"),
+        deploy: str = Query("live", description="live: استبدال النماذج الحية - shadow: مرشح يعمل في الظل حتى ترقيته")
 ):
     """تدريب النظام المحسن للذكاء الاصطناعي"""
     if not ENHANCED_AI_AVAILABLE:
@@ -618,6 +1444,9 @@ async def train_enhanced_ai(
     if not enhanced_advanced_ai:
         raise HTTPException(status_code=503, detail="Enhanced AI not properly initialized")
 
+    if deploy not in ("live", "shadow"):
+        raise HTTPException(status_code=400, detail="deploy must be 'live' or 'shadow'")
+
     try:
         # التحقق من التخزين المؤقت
         if use_cache:
@@ -626,21 +1455,32 @@ async def train_enhanced_ai(
                 cached_result["from_cache"] = True
                 return cached_result
 
-        if not binance_client:
-            raise HTTPException(status_code=503, detail="Binance client not available")
+        if snapshot:
+            # لقطة محفوظة: بدون جلب بيانات أو هندسة ميزات
+            prices = []
+            dataset = load_training_snapshot("enhanced", symbol, "1h", snapshot)
+        else:
+            if not binance_client:
+                raise HTTPException(status_code=503, detail="Binance client not available")
 
-        # جلب البيانات
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", days * 24)
-        if not klines:
-            raise HTTPException(status_code=404, detail="No data available")
+            # جلب البيانات
+            klines = await binance_call(binance_client.get_klines, symbol, "1h", days * 24)
+            if not klines:
+                raise HTTPException(status_code=404, detail="No data available")
 
-        prices = extract_close_prices(klines)
-        volumes = [float(k['volume']) for k in klines]
+            prices = extract_close_prices(klines)
+            volumes = [float(k['volume']) for k in klines]
+            dataset = await run_training(enhanced_advanced_ai, snapshot_training_dataset,
+                                         "enhanced", enhanced_advanced_ai, symbol, "1h", klines, prices, volumes)
+            if "error" in dataset:
+                raise HTTPException(status_code=400, detail=dataset["error"])
 
         # التدريب مع قياس الوقت
         start_time = datetime.now()
-        result = enhanced_advanced_ai.train_enhanced_ensemble(
-            prices, volumes, optimize_hyperparameters=optimize
+        result = await run_training(
+            enhanced_advanced_ai, enhanced_advanced_ai.train_enhanced_ensemble,
+            prices, optimize_hyperparameters=optimize, symbol=symbol, interval="1h",
+            cv_folds=cv_folds, dataset=dataset, deploy=deploy
         )
 
         # تنظيف الذاكرة
@@ -649,13 +1489,14 @@ async def train_enhanced_ai(
         # إضافة معلومات إضافية
         result["symbol"] = symbol
         result["training_date"] = datetime.now().isoformat()
-        result["data_points"] = len(prices)
+        result["data_points"] = len(prices) or len(dataset["X"])
+        result["snapshot_version"] = dataset.get("snapshot_version")
 
         # حفظ في التخزين المؤقت
         if use_cache and "error" not in result:
             ai_cache.set_training_result(symbol, result)
 
-        return clean_response_data(result)
+        return FastJSONResponse(result)
 
     except HTTPException:
         raise
@@ -669,7 +1510,8 @@ async def train_enhanced_ai(
 async def predict_enhanced(
         symbol: str,
         use_cache: bool = Query(True, description="استخدام التخزين المؤقت"),
-        force_refresh: bool = Query(False, description="تجديد قسري")
+        force_refresh: bool = Query(False, description="تجديد قسري"),
+        mode: str = Query("full", description="full: المجموعة كاملة - fast: النموذج الطالب المقطّر وحده")
 ):
     """التنبؤ المحسن باستخدام النظام المطور"""
     if not ENHANCED_AI_AVAILABLE:
@@ -679,43 +1521,49 @@ async def predict_enhanced(
     if not enhanced_advanced_ai:
         raise HTTPException(status_code=503, detail="Enhanced AI not properly initialized")
 
+    if mode not in ("full", "fast"):
+        raise HTTPException(status_code=400, detail="mode must be 'full' or 'fast'")
+    cache_engine = "enhanced" if mode == "full" else "enhanced-fast"
+
     try:
         # التحقق من التخزين المؤقت
+        model_version = get_model_version(enhanced_advanced_ai)
         if use_cache and not force_refresh:
-            cached = ai_cache.get_prediction(symbol)
+            cached = ai_cache.get_prediction(cache_engine, symbol, "1h", model_version)
             if cached:
-                cached["from_cache"] = True
-                if redis_client:
-                    try:
-                        cached["cache_age_seconds"] = 300 - redis_client.ttl(f"prediction:enhanced:{symbol}")
-                    except:
-                        cached["cache_age_seconds"] = 0
                 return cached
 
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
 
-        # جلب البيانات الحديثة
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", 200)
+        # جلب البيانات الحديثة - الشموع المغلقة فقط
+        klines = closed_klines(await binance_call(binance_client.get_klines, symbol, "1h", 201), 200)
         if not klines:
             raise HTTPException(status_code=404, detail="No data available")
 
         prices = extract_close_prices(klines)
         volumes = [float(k['volume']) for k in klines]
 
-        # التنبؤ
-        prediction = enhanced_advanced_ai.predict_enhanced_ensemble(prices, volumes)
+        # حل التنبؤات السابقة التي أُغلقت شمعة أفقها
+        await run_model(enhanced_advanced_ai, enhanced_advanced_ai.resolve_predictions, symbol, "1h", klines)
+
+        # التنبؤ - يُسجل مع تنبؤ المرشح في الظل إن وجد
+        prediction = await run_model(
+            enhanced_advanced_ai, enhanced_advanced_ai.predict_enhanced_ensemble, prices, volumes, mode=mode, symbol=symbol, interval="1h", candle_time=int(klines[-1]['timestamp'])
+        )
 
-        # إضافة معلومات السعر الحالي
-        current_price = safe_binance_call(binance_client.get_symbol_price, symbol)
-        prediction["current_price"] = current_price
+        # سعر إغلاق آخر شمعة مغلقة - السعر الذي بُني عليه التنبؤ المخزن حتى إغلاق الشمعة الحالية
+        prediction["current_price"] = prices[-1]
         prediction["symbol"] = symbol
 
-        # حفظ في التخزين المؤقت
-        if use_cache and "error" not in prediction:
-            ai_cache.set_prediction(symbol, prediction)
+        # حفظ في التخزين المؤقت حتى إغلاق الشمعة
+        if "error" in prediction:
+            return FastJSONResponse(prediction, headers=NO_STORE_HEADERS)
+        if use_cache:
+            # الإصدار بعد التنبؤ - قد تُحمَّل النماذج عند أول طلب
+            ai_cache.set_prediction(cache_engine, symbol, "1h", get_model_version(enhanced_advanced_ai), klines, prediction)
 
-        return clean_response_data(prediction)
+        return FastJSONResponse(prediction)
 
     except HTTPException:
         raise
@@ -747,6 +1595,159 @@ async def get_enhanced_ai_info():
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/ai/enhanced/shadow")
+async def get_enhanced_shadow_report(
+        window: int = Query(500, ge=10, le=10000, description="عدد آخر التنبؤات المحلولة لكل إصدار"),
+        symbol: Optional[str] = Query(None, description="تقرير عملة واحدة"),
+        resolve: bool = Query(True, description="جلب الشموع وحل التنبؤات المعلقة أولاً")
+):
+    """الأداء الحي للنماذج الحية والمرشح في الظل: الدقة و Brier score والزمن"""
+    if not ENHANCED_AI_AVAILABLE or not enhanced_advanced_ai:
+        raise HTTPException(status_code=503, detail="Enhanced AI not available")
+
+    try:
+        resolved = 0
+        if resolve and binance_client:
+            # السجل تحت قفل ملف وقد يُعاد تحميله - خارج حلقة الأحداث
+            pending = await run_io(enhanced_advanced_ai.prediction_ledger.pending_symbols)
+            for pending_symbol, interval in pending:
+                klines = await binance_call(binance_client.get_klines, pending_symbol, interval, 500)
+                if klines:
+                    resolved += await run_model(enhanced_advanced_ai, enhanced_advanced_ai.resolve_predictions,
+                                                pending_symbol, interval, klines)
+
+        # قد يحمل نماذج المرشح - مثل resolve_predictions
+        report = await run_model(enhanced_advanced_ai, enhanced_advanced_ai.get_shadow_report, window, symbol)
+        report["resolved_now"] = resolved
+        return FastJSONResponse(report)
+
+    except Exception as e:
+        print(f"Shadow report error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ai/enhanced/shadow/promote", dependencies=[Depends(training_claim("enhanced_ai"))])
+async def promote_enhanced_shadow():
+    """ترقية المرشح إلى النماذج الحية"""
+    if not ENHANCED_AI_AVAILABLE or not enhanced_advanced_ai:
+        raise HTTPException(status_code=503, detail="Enhanced AI not available")
+
+    result = await run_training(enhanced_advanced_ai, enhanced_advanced_ai.promote_shadow)
+    if result["status"] != "success":
+        raise HTTPException(status_code=404, detail=result.get("error", "Promotion failed"))
+    return FastJSONResponse(result)
+
+
+@app.post("/ai/enhanced/shadow/reject", dependencies=[Depends(training_claim("enhanced_ai"))])
+async def reject_enhanced_shadow():
+    """إلغاء المرشح مع إبقاء النماذج الحية"""
+    if not ENHANCED_AI_AVAILABLE or not enhanced_advanced_ai:
+        raise HTTPException(status_code=503, detail="Enhanced AI not available")
+
+    result = await run_training(enhanced_advanced_ai, enhanced_advanced_ai.reject_shadow)
+    if result["status"] != "success":
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+
+@app.post("/ai/enhanced/benchmark/{symbol}")
+async def benchmark_enhanced_profiles(
+        symbol: str,
+        days: int = Query(90, ge=7, le=365, description="عدد أيام البيانات التاريخية"),
+        snapshot: Optional[str] = Query(None, description="استخدام لقطة محفوظة (latest أو رقم الإصدار)")
+):
+    """مقارنة إعداد النماذج الافتراضي بالسريع (histogram): زمن التدريب والتنبؤ والدقة على نفس التقسيم"""
+    if not ENHANCED_AI_AVAILABLE or not enhanced_advanced_ai:
+        raise HTTPException(status_code=503, detail="Enhanced AI not available")
+
+    try:
+        if snapshot:
+            prices, volumes = [], None
+            dataset = load_training_snapshot("enhanced", symbol, "1h", snapshot)
+        else:
+            if not binance_client:
+                raise HTTPException(status_code=503, detail="Binance client not available")
+
+            klines = await binance_call(binance_client.get_klines, symbol, "1h", days * 24)
+            if not klines:
+                raise HTTPException(status_code=404, detail="No data available")
+            prices = extract_close_prices(klines)
+            volumes = [float(k['volume']) for k in klines]
+            dataset = None
+
+        # محرك مؤقت - لا يغير النماذج الحية فلا حاجة لقفل المحرك
+        result = await run_training(None, enhanced_advanced_ai.benchmark_model_profiles, prices, volumes, dataset)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+
+        result["symbol"] = symbol
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Benchmark error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============ Quantile Forecast Endpoints ============
+@app.post("/ai/forecast/train/{symbol}", dependencies=[Depends(training_claim("price_forecaster"))])
+async def train_price_forecaster(
+        symbol: str,
+        days: int = Query(120, ge=30, le=365, description="عدد أيام البيانات التاريخية")
+):
+    """تدريب نماذج توقع العائد (P10/P50/P90) لكل الآفاق"""
+    if not FORECASTER_AVAILABLE or not price_forecaster:
+        raise HTTPException(status_code=501, detail="Price forecaster not available")
+
+    try:
+        klines = await binance_call(binance_client.get_klines, symbol, "1h", days * 24)
+        if not klines:
+            raise HTTPException(status_code=404, detail="No data available")
+
+        prices = extract_close_prices(klines)
+        volumes = [float(k['volume']) for k in klines]
+        result = await run_training(price_forecaster, price_forecaster.train, prices, volumes)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+
+        result["symbol"] = symbol
+        result["data_points"] = len(prices)
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Forecaster training error: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/ai/forecast/{symbol}")
+async def get_price_forecast(symbol: str):
+    """توقع العائد والسعر بالنسب P10/P50/P90 لكل أفق"""
+    if not FORECASTER_AVAILABLE or not price_forecaster:
+        raise HTTPException(status_code=501, detail="Price forecaster not available")
+
+    try:
+        klines = await binance_call(binance_client.get_klines, symbol, "1h", 200)
+        if not klines:
+            raise HTTPException(status_code=404, detail="No data available")
+
+        forecast = (await run_model(price_forecaster, price_forecaster.predict_batch, {symbol: klines}))[symbol]
+        if "error" in forecast:
+            raise HTTPException(status_code=400, detail=forecast["error"])
+
+        forecast["symbol"] = symbol
+        return FastJSONResponse(forecast)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Forecast error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============ Basic Market Data Endpoints ============
 @app.get("/price/{symbol}")
 async def get_symbol_price(symbol: str):
@@ -754,7 +1755,7 @@ async def get_symbol_price(symbol: str):
     try:
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        price = safe_binance_call(binance_client.get_symbol_price, symbol.upper())
+        price = await binance_call(binance_client.get_symbol_price, symbol.upper())
         return {
             "symbol": symbol.upper(),
             "price": price,
@@ -776,7 +1777,7 @@ async def get_market_data(
     try:
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        klines = safe_binance_call(binance_client.get_klines, symbol.upper(), interval, limit)
+        klines = await binance_call(binance_client.get_klines, symbol.upper(), interval, limit)
         if not klines:
             raise HTTPException(status_code=404, detail="No data available")
         return {
@@ -793,22 +1794,33 @@ async def get_market_data(
 
 
 # ============ Additional AI Endpoints ============
-@app.get("/ai/simple/train/{symbol}")
-async def train_simple_ai(symbol: str, days: int = Query(30, description="عدد أيام البيانات التاريخية")):
+@app.get("/ai/simple/train/{symbol}", dependencies=[Depends(training_claim("simple_ai"))])
+async def train_simple_ai(symbol: str, days: int = Query(30, description="عدد أيام البيانات التاريخية"),
+                          cv_folds: int = Query(0, ge=0, le=10, description="عدد طيات التحقق الزمني المتقاطع (0 = بدون)"),
+                          snapshot: Optional[str] = Query(None, description="إعادة التدريب من لقطة محفوظة (latest أو رقم الإصدار)")):
     """تدريب AI البسيط"""
     if not simple_ai:
         raise HTTPException(status_code=501, detail="Simple AI not available")
     try:
-        if not binance_client:
-            raise HTTPException(status_code=503, detail="Binance client not available")
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", days * 24)
-        if not klines:
-            raise HTTPException(status_code=404, detail="No data available")
-        prices = extract_close_prices(klines)
-        result = simple_ai.train(prices)
+        if snapshot:
+            prices = []
+            dataset = load_training_snapshot("simple", symbol, "1h", snapshot)
+        else:
+            if not binance_client:
+                raise HTTPException(status_code=503, detail="Binance client not available")
+            klines = await binance_call(binance_client.get_klines, symbol, "1h", days * 24)
+            if not klines:
+                raise HTTPException(status_code=404, detail="No data available")
+            prices = extract_close_prices(klines)
+            dataset = await run_training(simple_ai, snapshot_training_dataset,
+                                         "simple", simple_ai, symbol, "1h", klines, prices)
+            if "error" in dataset:
+                raise HTTPException(status_code=400, detail=dataset["error"])
+        result = await run_training(simple_ai, simple_ai.train, prices, cv_folds=cv_folds, dataset=dataset)
         result["symbol"] = symbol
         result["training_date"] = datetime.now().isoformat()
-        return clean_response_data(result)
+        result["snapshot_version"] = dataset.get("snapshot_version")
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -821,40 +1833,59 @@ async def predict_simple(symbol: str):
     if not simple_ai:
         raise HTTPException(status_code=501, detail="Simple AI not available")
     try:
+        model_version = get_model_version(simple_ai)
+        cached = ai_cache.get_prediction("simple", symbol, "1h", model_version)
+        if cached:
+            return cached
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", 100)
+        klines = closed_klines(await binance_call(binance_client.get_klines, symbol, "1h", 101), 100)
         if not klines:
             raise HTTPException(status_code=404, detail="No data available")
         prices = extract_close_prices(klines)
-        prediction = simple_ai.predict(prices)
+        prediction = await run_model(simple_ai, simple_ai.predict, prices)
         prediction["symbol"] = symbol
         prediction["current_price"] = prices[-1]
         prediction["timestamp"] = datetime.now().isoformat()
-        return clean_response_data(prediction)
+        if "error" in prediction:
+            return FastJSONResponse(prediction, headers=NO_STORE_HEADERS)
+        ai_cache.set_prediction("simple", symbol, "1h", model_version, klines, prediction)
+        return FastJSONResponse(prediction)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/ai/advanced/train/{symbol}")
-async def train_advanced_ai(symbol: str, days: int = Query(60, description="عدد أيام البيانات التاريخية")):
+@app.get("/ai/advanced/train/{symbol}", dependencies=[Depends(training_claim("advanced_ai"))])
+async def train_advanced_ai(symbol: str, days: int = Query(60, description="عدد أيام البيانات التاريخية"),
+                            cv_folds: int = Query(0, ge=0, le=10, description="عدد طيات التحقق الزمني المتقاطع (0 = بدون)"),
+                            snapshot: Optional[str] = Query(None, description="إعادة التدريب من لقطة محفوظة (latest أو رقم الإصدار)")):
     """تدريب AI المتقدم"""
     if not advanced_ai:
         raise HTTPException(status_code=501, detail="Advanced AI not available")
     try:
-        if not binance_client:
-            raise HTTPException(status_code=503, detail="Binance client not available")
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", days * 24)
-        if not klines:
-            raise HTTPException(status_code=404, detail="No data available")
-        prices = extract_close_prices(klines)
-        volumes = [float(k['volume']) for k in klines]
-        result = advanced_ai.train_ensemble(prices, volumes)
+        if snapshot:
+            prices = []
+            dataset = load_training_snapshot("advanced", symbol, "1h", snapshot)
+        else:
+            if not binance_client:
+                raise HTTPException(status_code=503, detail="Binance client not available")
+            klines = await binance_call(binance_client.get_klines, symbol, "1h", days * 24)
+            if not klines:
+                raise HTTPException(status_code=404, detail="No data available")
+            prices = extract_close_prices(klines)
+            volumes = [float(k['volume']) for k in klines]
+            dataset = await run_training(advanced_ai, snapshot_training_dataset,
+                                         "advanced", advanced_ai, symbol, "1h", klines, prices, volumes)
+            if "error" in dataset:
+                raise HTTPException(status_code=400, detail=dataset["error"])
+        result = await run_training(advanced_ai, advanced_ai.train_ensemble, prices, cv_folds=cv_folds,
+                                    dataset=dataset)
         result["symbol"] = symbol
         result["training_date"] = datetime.now().isoformat()
-        return clean_response_data(result)
+        result["snapshot_version"] = dataset.get("snapshot_version")
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -867,18 +1898,25 @@ async def predict_advanced(symbol: str):
     if not advanced_ai:
         raise HTTPException(status_code=501, detail="Advanced AI not available")
     try:
+        model_version = get_model_version(advanced_ai)
+        cached = ai_cache.get_prediction("advanced", symbol, "1h", model_version)
+        if cached:
+            return cached
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", 200)
+        klines = closed_klines(await binance_call(binance_client.get_klines, symbol, "1h", 201), 200)
         if not klines:
             raise HTTPException(status_code=404, detail="No data available")
         prices = extract_close_prices(klines)
         volumes = [float(k['volume']) for k in klines]
-        prediction = advanced_ai.predict_ensemble(prices, volumes)
+        prediction = await run_model(advanced_ai, advanced_ai.predict_ensemble, prices, volumes)
         prediction["symbol"] = symbol
         prediction["current_price"] = prices[-1]
         prediction["timestamp"] = datetime.now().isoformat()
-        return clean_response_data(prediction)
+        if "error" in prediction:
+            return FastJSONResponse(prediction, headers=NO_STORE_HEADERS)
+        ai_cache.set_prediction("advanced", symbol, "1h", model_version, klines, prediction)
+        return FastJSONResponse(prediction)
     except HTTPException:
         raise
     except Exception as e:
@@ -926,12 +1964,12 @@ async def get_api_sentiment_analysis(
     try:
         symbol = symbol.upper()
         if analysis_type == "quick":
-            result = sentiment_analyzer.get_quick_sentiment(symbol)
+            result = await run_io(sentiment_analyzer.get_quick_sentiment, symbol)
         elif analysis_type == "enhanced":
-            result = sentiment_analyzer.get_enhanced_analysis(symbol)
+            result = await run_io(sentiment_analyzer.get_enhanced_analysis, symbol)
         else:
-            result = sentiment_analyzer.get_complete_analysis(symbol)
-        return clean_response_data(result)
+            result = await run_io(sentiment_analyzer.get_complete_analysis, symbol)
+        return FastJSONResponse(result)
     except Exception as e:
         return {
             "symbol": symbol.upper(), "overall_score": 50, "trend": "neutral", "confidence": 30,
@@ -990,16 +2028,16 @@ async def get_models_status():
     """حالة جميع النماذج"""
     status = {
         "simple_ai": {
-            "available": simple_ai is not None,
+            "available": bool(simple_ai),
             "trained": getattr(simple_ai, 'is_trained', False) if simple_ai else False
         },
         "advanced_ai": {
-            "available": advanced_ai is not None,
+            "available": bool(advanced_ai),
             "trained": getattr(advanced_ai, 'is_trained', False) if advanced_ai else False
         },
         "enhanced_ai": {
-            "available": ENHANCED_AI_AVAILABLE,
-            "instance": enhanced_advanced_ai is not None,
+            "available": bool(ENHANCED_AI_AVAILABLE),
+            "instance": bool(enhanced_advanced_ai),
             "trained": getattr(enhanced_advanced_ai, 'is_trained', False) if enhanced_advanced_ai else False
         },
         "timestamp": datetime.now().isoformat()
@@ -1015,27 +2053,40 @@ async def load_all_models():
     # Simple AI
     if simple_ai and hasattr(simple_ai, 'load_model'):
         try:
-            results["simple_ai"] = simple_ai.load_model()
+            results["simple_ai"] = await run_training(simple_ai, simple_ai.load_model)
         except Exception as e:
             results["simple_ai"] = {"error": str(e)}
 
     # Advanced AI
     if advanced_ai and hasattr(advanced_ai, 'load_ensemble'):
         try:
-            results["advanced_ai"] = advanced_ai.load_ensemble()
+            results["advanced_ai"] = await run_training(advanced_ai, advanced_ai.load_ensemble)
         except Exception as e:
             results["advanced_ai"] = {"error": str(e)}
 
     # Enhanced AI
     if enhanced_advanced_ai and hasattr(enhanced_advanced_ai, 'load_enhanced_models'):
         try:
-            results["enhanced_ai"] = enhanced_advanced_ai.load_enhanced_models()
+            results["enhanced_ai"] = await run_training(enhanced_advanced_ai, enhanced_advanced_ai.load_enhanced_models)
         except Exception as e:
             results["enhanced_ai"] = {"error": str(e)}
 
     return {"results": results, "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/models/snapshots/{symbol}")
+async def list_training_snapshots(
+        symbol: str,
+        interval: Optional[str] = Query(None, description="الفترة الزمنية"),
+        engine_name: Optional[str] = Query(None, alias="engine", description="simple / advanced / enhanced / backtest")
+):
+    """إصدارات لقطات التدريب المحفوظة للعملة"""
+    if not training_snapshots:
+        raise HTTPException(status_code=501, detail="Training snapshots not available")
+    snapshots = training_snapshots.list_snapshots(symbol, interval, engine_name)
+    return {"symbol": symbol.upper(), "count": len(snapshots), "snapshots": snapshots}
+
+
 # ============ Utility Endpoints ============
 @app.get("/utils/validate-symbol/{symbol}")
 async def validate_symbol(symbol: str):
@@ -1043,7 +2094,7 @@ async def validate_symbol(symbol: str):
     try:
         if not binance_client:
             raise HTTPException(status_code=503, detail="Binance client not available")
-        price = safe_binance_call(binance_client.get_symbol_price, symbol.upper())
+        price = await binance_call(binance_client.get_symbol_price, symbol.upper())
         if price:
             return {"symbol": symbol.upper(), "valid": True, "current_price": price,
                     "timestamp": datetime.now().isoformat()}
@@ -1073,20 +2124,53 @@ async def get_supported_intervals():
 
 
 # ============ Debug and Development Endpoints ============
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """توكن المدير (ADMIN_TOKEN) لنقاط التصحيح الحساسة"""
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(status_code=403, detail="Valid X-Admin-Token required")
+
+
+@app.get("/debug/profiles", dependencies=[Depends(require_admin_token)])
+async def list_profiles():
+    """تحليلات الأداء المحفوظة - الأحدث أولاً"""
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_admin_token)])
+async def get_profile(
+        profile_id: str,
+        format: str = Query("speedscope", description="speedscope: ملف JSON لـ speedscope.app - collapsed: لـ flamegraph.pl")
+):
+    """تحليل أداء طلب واحد"""
+    entry = profile_store.get(profile_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(entry["stacks"]))
+    if format != "speedscope":
+        raise HTTPException(status_code=400, detail="format must be 'speedscope' or 'collapsed'")
+    return FastJSONResponse(
+        to_speedscope(entry),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'}
+    )
+
+
 @app.get("/debug/modules")
 async def debug_modules():
     """نقطة نهاية للتطوير - فحص حالة الوحدات"""
     return {
         "binance_client": {"available": binance_client is not None,
                            "type": str(type(binance_client)) if binance_client else None},
-        "simple_ai": {"available": simple_ai is not None,
-                      "trained": getattr(simple_ai, 'is_trained', False) if simple_ai else False},
-        "advanced_ai": {"available": advanced_ai is not None,
-                        "trained": getattr(advanced_ai, 'is_trained', False) if advanced_ai else False},
-        "enhanced_ai": {"available": ENHANCED_AI_AVAILABLE, "instance": enhanced_advanced_ai is not None,
-                        "trained": getattr(enhanced_advanced_ai, 'is_trained',
-                                           False) if enhanced_advanced_ai else False},
-        "sentiment_analyzer": {"available": SENTIMENT_AVAILABLE, "instance": sentiment_analyzer is not None},
+        # الخدمات الكسولة لا تُستورد هنا - state: pending/ready/warm/failed
+        "simple_ai": {"available": services["simple_ai"].available, "state": services["simple_ai"].state,
+                      "trained": getattr(services["simple_ai"].peek(), 'is_trained', False)},
+        "advanced_ai": {"available": services["advanced_ai"].available, "state": services["advanced_ai"].state,
+                        "trained": getattr(services["advanced_ai"].peek(), 'is_trained', False)},
+        "enhanced_ai": {"available": services["enhanced_ai"].available, "state": services["enhanced_ai"].state,
+                        "instance": services["enhanced_ai"].peek() is not None,
+                        "trained": getattr(services["enhanced_ai"].peek(), 'is_trained', False)},
+        "sentiment_analyzer": {"available": services["sentiment"].available, "state": services["sentiment"].state,
+                               "instance": services["sentiment"].peek() is not None},
         "redis": {"available": redis_client is not None, "cache_enabled": ai_cache.enabled},
         "database": {"available": engine is not None}
     }
@@ -1100,14 +2184,14 @@ async def debug_test_enhanced(symbol: str):
     if not enhanced_advanced_ai:
         return {"error": "Enhanced AI not initialized"}
     try:
-        load_result = enhanced_advanced_ai.load_enhanced_models()
+        load_result = await run_training(enhanced_advanced_ai, enhanced_advanced_ai.load_enhanced_models)
         if not binance_client:
             return {"error": "Binance client not available"}
-        klines = safe_binance_call(binance_client.get_klines, symbol, "1h", 50)
+        klines = await binance_call(binance_client.get_klines, symbol, "1h", 50)
         if not klines:
             return {"error": "No data available"}
         prices = extract_close_prices(klines)
-        features_df = enhanced_advanced_ai.engineer_advanced_features(prices)
+        features_df = await run_model(enhanced_advanced_ai, enhanced_advanced_ai.engineer_advanced_features, prices)
         return {
             "load_result": load_result, "data_points": len(prices), "features_count": len(features_df.columns),
             "features_sample": list(features_df.columns)[:10], "is_trained": enhanced_advanced_ai.is_trained,
@@ -1176,6 +2260,41 @@ async def service_unavailable_handler(request, exc):
 
 
 # ============ Startup and Shutdown Events ============
+event_loop_lag_task: Optional[asyncio.Task] = None
+warm_up_task: Optional[asyncio.Task] = None
+STARTUP_TIMINGS: Dict[str, Any] = {}
+
+
+async def warm_up_services():
+    """بعد بدء الخادم: مجمع cpu ثم استيراد كل خدمة وتحميل نماذجها المحفوظة بالترتيب"""
+    started = time.perf_counter()
+    try:
+        await executors.warm_up()
+        print("✅ CPU worker pool ready")
+    except Exception as e:
+        print(f"⚠️ CPU worker pool warm-up failed: {e}")
+    STARTUP_TIMINGS["cpu_pool_seconds"] = round(time.perf_counter() - started, 3)
+
+    for service in services:
+        instance = await asyncio.to_thread(service.get)
+        if instance is None or not service.warm_up:
+            continue
+        load_started = time.perf_counter()
+        try:
+            load_result = await run_training(service.proxy, getattr(instance, service.warm_up))
+            # load_model يُرجع True/False و load_ensemble {"model_loaded"} والباقي {"status": "success"}
+            loaded = load_result is True or isinstance(load_result, dict) and (
+                load_result.get("status") == "success" or load_result.get("model_loaded") is True)
+            print(f"{'✅' if loaded else 'ℹ️'} {service.name}: "
+                  f"{'models loaded' if loaded else 'no saved models - train on demand'}")
+        except Exception as e:
+            print(f"⚠️ {service.name} model loading failed: {e}")
+        service.record_warm_up(time.perf_counter() - load_started)
+
+    STARTUP_TIMINGS["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"🔥 Warm-up finished in {STARTUP_TIMINGS['warm_up_seconds']:.1f}s")
+
+
 @app.on_event("startup")
 async def startup_event():
     """أحداث بدء التشغيل"""
@@ -1186,46 +2305,28 @@ async def startup_event():
 
     modules_status = {
         "Binance Client": binance_client is not None,
-        "Simple AI": simple_ai is not None,
-        "Advanced AI": advanced_ai is not None,
-        "Enhanced AI": ENHANCED_AI_AVAILABLE,
-        "Sentiment Analysis": SENTIMENT_AVAILABLE,
         "Redis Cache": redis_client is not None,
         "Database": engine is not None,
-        "Alert Service": alert_service is not None
+        "Alert Service": alert_service is not None,
+        f"Shared State ({shared_state.backend_name})": shared_state.ping()
     }
 
     for module, status in modules_status.items():
         status_icon = "✅" if status else "❌"
         print(f"{status_icon} {module}: {'Available' if status else 'Not Available'}")
 
-    print("=" * 50)
-
-    # محاولة تحميل النماذج المحفوظة
-    if ENHANCED_AI_AVAILABLE and enhanced_advanced_ai:
-        try:
-            load_result = enhanced_advanced_ai.load_enhanced_models()
-            if load_result.get("status") == "success":
-                print(f"✅ تم تحميل {load_result.get('models_loaded', 0)} نماذج محفوظة")
-            else:
-                print("ℹ️ لا توجد نماذج محفوظة - سيتم التدريب عند الطلب")
-        except Exception as e:
-            print(f"⚠️ فشل تحميل النماذج المحفوظة: {e}")
+    if int(os.getenv("WEB_CONCURRENCY", 1)) > 1 and not shared_state.shared:
+        print("⚠️ WEB_CONCURRENCY > 1 with STATE_BACKEND=memory - workers will not share caches, locks or models")
 
-    # تحميل النماذج الأخرى
-    if simple_ai and hasattr(simple_ai, 'load_model'):
-        try:
-            simple_ai.load_model()
-            print("✅ تم تحميل Simple AI")
-        except:
-            print("ℹ️ Simple AI غير مدرب")
+    STARTUP_TIMINGS["ready_seconds"] = round(time.perf_counter() - MAIN_IMPORT_STARTED, 3)
+    print(f"⏱️ Ready in {STARTUP_TIMINGS['ready_seconds']:.2f}s (import {STARTUP_TIMINGS['main_import_seconds']:.2f}s)"
+          f" - AI engines load in the background")
+    print("=" * 50)
 
-    if advanced_ai and hasattr(advanced_ai, 'load_ensemble'):
-        try:
-            advanced_ai.load_ensemble()
-            print("✅ تم تحميل Advanced AI")
-        except:
-            print("ℹ️ Advanced AI غير مدرب")
+    global event_loop_lag_task, warm_up_task
+    event_loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # المحركات والنماذج في الخلفية - الطلب الذي يسبق الإحماء يستورد المحرك الذي يحتاجه فقط
+    warm_up_task = asyncio.create_task(warm_up_services())
 
 
 @app.on_event("shutdown")
@@ -1233,13 +2334,21 @@ async def shutdown_event():
     """أحداث إيقاف التشغيل"""
     print("🛑 Shutting down Trading AI Platform")
 
-    if ENHANCED_AI_AVAILABLE and enhanced_advanced_ai:
+    # لا يُستورد المحرك عند الإيقاف إن لم يُستخدم
+    if services["enhanced_ai"].peek() is not None:
         try:
             enhanced_advanced_ai.cleanup()
             print("✅ Enhanced AI resources cleaned up")
         except Exception as e:
             print(f"⚠️ Enhanced AI cleanup error: {e}")
 
+    if event_loop_lag_task:
+        event_loop_lag_task.cancel()
+    if warm_up_task:
+        warm_up_task.cancel()
+    analysis_hub.close()
+    executors.shutdown()
+
     if engine:
         try:
             engine.dispose()
@@ -1251,7 +2360,8 @@ async def shutdown_event():
 
 
 # Enhanced training endpoint with better error handling
-@app.post("/ai/train/{symbol}")
+@app.post("/ai/train/{symbol}",
+          dependencies=[Depends(training_claim("simple_ai", "advanced_ai", "enhanced_ai"))])
 async def train_ai_models_enhanced(
         symbol: str,
         interval: str = Query(default="1h", description="Timeframe for training data"),
@@ -1307,7 +2417,7 @@ async def train_ai_models_enhanced(
         # التحقق من صحة الرمز عبر Binance
         try:
             print(f"🔍 Validating symbol {symbol} with Binance...")
-            test_price = safe_binance_call(binance_client.get_symbol_price, symbol)
+            test_price = await binance_call(binance_client.get_symbol_price, symbol)
             if not test_price or float(test_price) <= 0:
                 raise HTTPException(
                     status_code=404,
@@ -1336,7 +2446,7 @@ async def train_ai_models_enhanced(
         # جلب البيانات التاريخية
         try:
             print(f"📊 Fetching {limit} candles for {symbol} with interval {interval}...")
-            historical_data = safe_binance_call(binance_client.get_klines, symbol, interval, limit)
+            historical_data = await binance_call(binance_client.get_klines, symbol, interval, limit)
 
             if not historical_data:
                 raise HTTPException(
@@ -1435,7 +2545,10 @@ async def train_ai_models_enhanced(
             try:
                 print("🔵 Training Simple AI model...")
                 if not getattr(simple_ai, 'is_trained', False) or force_retrain:
-                    simple_result = simple_ai.train(prices)
+                    simple_dataset = await run_training(
+                        simple_ai, snapshot_training_dataset, "simple", simple_ai, symbol, interval, historical_data, prices
+                    )
+                    simple_result = await run_training(simple_ai, simple_ai.train, prices, dataset=simple_dataset)
                     if isinstance(simple_result, dict) and 'error' not in simple_result:
                         training_results['simple_ai'] = {
                             'status': 'success',
@@ -1481,9 +2594,14 @@ async def train_ai_models_enhanced(
                     # جرب طرق التدريب المختلفة
                     advanced_result = None
                     if hasattr(advanced_ai, 'train_models'):
-                        advanced_result = advanced_ai.train_models(prices, volumes)
+                        advanced_result = await run_training(advanced_ai, advanced_ai.train_models, prices, volumes)
                     elif hasattr(advanced_ai, 'train_ensemble'):
-                        advanced_result = advanced_ai.train_ensemble(prices, volumes)
+                        advanced_dataset = await run_training(
+                            advanced_ai, snapshot_training_dataset,
+                            "advanced", advanced_ai, symbol, interval, historical_data, prices, volumes
+                        )
+                        advanced_result = await run_training(advanced_ai, advanced_ai.train_ensemble,
+                                                             prices, volumes, dataset=advanced_dataset)
                     else:
                         raise Exception("No suitable training method found")
 
@@ -1535,7 +2653,13 @@ async def train_ai_models_enhanced(
             total_models += 1
             try:
                 print("🟢 Training Enhanced AI model...")
-                enhanced_result = enhanced_advanced_ai.train_enhanced_ensemble(prices, volumes)
+                enhanced_dataset = await run_training(
+                    enhanced_advanced_ai, snapshot_training_dataset,
+                    "enhanced", enhanced_advanced_ai, symbol, interval, historical_data, prices, volumes
+                )
+                enhanced_result = await run_training(
+                    enhanced_advanced_ai, enhanced_advanced_ai.train_enhanced_ensemble, prices, volumes, symbol=symbol, interval=interval, dataset=enhanced_dataset
+                )
                 if isinstance(enhanced_result, dict) and 'error' not in enhanced_result:
                     training_results['enhanced_ai'] = {
                         'status': 'success',
@@ -1592,7 +2716,7 @@ async def train_ai_models_enhanced(
                     'overall_status': overall_status,
                     'success_rate': success_rate
                 }
-                redis_client.setex(f"training:{symbol}:{interval}", 3600, json.dumps(cache_data))
+                redis_client.setex(f"training:{symbol}:{interval}", 3600, fast_json.dumps(cache_data))
                 print("✅ Results cached successfully")
             except Exception as e:
                 print(f"⚠️ Caching failed: {e}")
@@ -1622,7 +2746,7 @@ async def train_ai_models_enhanced(
             }
         }
 
-        return clean_response_data(result)
+        return FastJSONResponse(result)
 
     except HTTPException as http_exc:
         # إعادة رفع HTTP exceptions كما هي
@@ -1662,6 +2786,11 @@ async def predict_enhanced_safe(symbol: str):
     try:
         symbol = symbol.upper().strip()
 
+        model_version = get_model_version(simple_ai, advanced_ai)
+        cached = ai_cache.get_prediction("combined", symbol, "1h", model_version)
+        if cached:
+            return cached
+
         if not binance_client:
             raise HTTPException(
                 status_code=503,
@@ -1674,7 +2803,7 @@ async def predict_enhanced_safe(symbol: str):
 
         # جلب بيانات حديثة للتنبؤ
         try:
-            klines = safe_binance_call(binance_client.get_klines, symbol, "1h", 100)
+            klines = closed_klines(await binance_call(binance_client.get_klines, symbol, "1h", 101), 100)
             if not klines:
                 raise HTTPException(
                     status_code=404,
@@ -1703,7 +2832,7 @@ async def predict_enhanced_safe(symbol: str):
         # محاولة التنبؤ بالنماذج المختلفة
         if simple_ai and getattr(simple_ai, 'is_trained', False):
             try:
-                simple_pred = simple_ai.predict(prices)
+                simple_pred = await run_model(simple_ai, simple_ai.predict, prices)
                 if 'error' not in simple_pred:
                     predictions['simple_ai'] = simple_pred
             except Exception as e:
@@ -1713,7 +2842,7 @@ async def predict_enhanced_safe(symbol: str):
             try:
                 volumes = [float(k.get('volume', 0)) for k in klines]
                 if hasattr(advanced_ai, 'predict_ensemble'):
-                    adv_pred = advanced_ai.predict_ensemble(prices, volumes)
+                    adv_pred = await run_model(advanced_ai, advanced_ai.predict_ensemble, prices, volumes)
                 else:
                     adv_pred = {'error': 'Prediction method not available'}
 
@@ -1731,8 +2860,10 @@ async def predict_enhanced_safe(symbol: str):
             "prediction_available": len(predictions) > 0,
             "message": "تم الحصول على التنبؤات بنجاح" if predictions else "لا توجد نماذج مدربة للتنبؤ"
         }
-
-        return clean_response_data(result)
+        if not predictions:
+            return FastJSONResponse(result, headers=NO_STORE_HEADERS)
+        ai_cache.set_prediction("combined", symbol, "1h", model_version, klines, result)
+        return FastJSONResponse(result)
 
     except HTTPException:
         raise
@@ -1746,6 +2877,91 @@ async def predict_enhanced_safe(symbol: str):
             }
         )
     
+class BatchPredictionRequest(BaseModel):
+    symbols: List[str]
+    interval: str = "1h"
+    limit: int = 200
+    engines: List[str] = ["simple", "advanced", "enhanced"]
+
+
+@app.post("/ai/predict/batch")
+async def predict_batch(request: BatchPredictionRequest):
+    """
+    التنبؤ لقائمة عملات دفعة واحدة - كل نموذج يُستدعى مرة واحدة لجميع العملات
+    """
+    start_time = datetime.now()
+    symbols = normalize_batch_symbols(request.symbols, request.limit)
+
+    try:
+        klines_by_symbol = await fetch_klines_batch(symbols, request.interval, request.limit)
+        candles_by_symbol = {symbol: klines for symbol, klines in klines_by_symbol.items() if klines}
+        failed_symbols = [symbol for symbol in symbols if symbol not in candles_by_symbol]
+
+        # تحميل النماذج المحفوظة عند الحاجة
+        if simple_ai and not simple_ai.is_trained:
+            await run_training(simple_ai, simple_ai.load_model)
+        if advanced_ai and not advanced_ai.is_trained:
+            await run_training(advanced_ai, advanced_ai.load_ensemble)
+
+        engines = {
+            "simple": simple_ai,
+            "advanced": advanced_ai,
+            "enhanced": enhanced_advanced_ai if ENHANCED_AI_AVAILABLE else None,
+            "forecast": price_forecaster if FORECASTER_AVAILABLE else None
+        }
+
+        engine_predictions = {}
+        engine_times = {}
+        for engine_name in dict.fromkeys(request.engines):
+            engine = engines.get(engine_name)
+            if engine is None or not hasattr(engine, 'predict_batch'):
+                engine_predictions[engine_name] = None
+                continue
+
+            engine_start = datetime.now()
+            try:
+                engine_predictions[engine_name] = await run_model(engine, engine.predict_batch, candles_by_symbol)
+            except HTTPException:
+                raise
+            except Exception as e:
+                print(f"Batch prediction error ({engine_name}): {e}")
+                engine_predictions[engine_name] = {symbol: {"error": str(e)} for symbol in candles_by_symbol}
+            engine_times[engine_name] = round((datetime.now() - engine_start).total_seconds() * 1000, 2)
+
+        results = {}
+        for symbol, candles in candles_by_symbol.items():
+            predictions = {}
+            for engine_name, engine_results in engine_predictions.items():
+                if engine_results is None:
+                    predictions[engine_name] = {"error": f"{engine_name} AI not available"}
+                else:
+                    predictions[engine_name] = engine_results.get(symbol, {"error": "no prediction"})
+
+            results[symbol] = {
+                "current_price": candles[-1]["close"],
+                "data_points": len(candles),
+                "predictions": predictions
+            }
+
+        return FastJSONResponse({
+            "interval": request.interval,
+            "symbols_requested": len(symbols),
+            "symbols_predicted": len(results),
+            "failed_symbols": failed_symbols,
+            "results": results,
+            "engine_times_ms": engine_times,
+            "processing_time_seconds": round((datetime.now() - start_time).total_seconds(), 3),
+            "timestamp": datetime.now().isoformat()
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/ai/training-status/{symbol}")
 async def get_training_status(
         symbol: str,
@@ -1763,9 +2979,9 @@ async def get_training_status(
             try:
                 cached_result = redis_client.get(training_cache_key)
                 if cached_result:
-                    cached_data = json.loads(cached_result)
+                    cached_data = fast_json.loads(cached_result)
                     cache_age = (datetime.now() - datetime.fromisoformat(cached_data['timestamp'])).total_seconds() / 60
-                    return clean_response_data({
+                    return FastJSONResponse({
                         "symbol": symbol,
                         "interval": interval,
                         "is_cached": True,
@@ -1796,7 +3012,7 @@ async def get_training_status(
                 'trained': getattr(enhanced_advanced_ai, 'is_trained', False)
             }
 
-        return clean_response_data({
+        return FastJSONResponse({
             "symbol": symbol,
             "interval": interval,
             "is_cached": False,
@@ -1819,7 +3035,7 @@ async def validate_symbol_endpoint(symbol: str):
         symbol = symbol.upper().strip()
 
         if not binance_client:
-            return clean_response_data({
+            return FastJSONResponse({
                 "symbol": symbol,
                 "is_valid": False,
                 "error": "Binance client not available",
@@ -1828,13 +3044,13 @@ async def validate_symbol_endpoint(symbol: str):
 
         # اختبار الاتصال والحصول على السعر
         try:
-            price = safe_binance_call(binance_client.get_symbol_price, symbol)
+            price = await binance_call(binance_client.get_symbol_price, symbol)
 
             if price and float(price) > 0:
                 # اختبار جلب بيانات تاريخية بسيطة
-                test_data = safe_binance_call(binance_client.get_klines, symbol, "1h", 10)
+                test_data = await binance_call(binance_client.get_klines, symbol, "1h", 10)
 
-                return clean_response_data({
+                return FastJSONResponse({
                     "symbol": symbol,
                     "is_valid": True,
                     "current_price": float(price),
@@ -1843,7 +3059,7 @@ async def validate_symbol_endpoint(symbol: str):
                     "timestamp": datetime.now().isoformat()
                 })
             else:
-                return clean_response_data({
+                return FastJSONResponse({
                     "symbol": symbol,
                     "is_valid": False,
                     "message": "Symbol found but no valid price data",
@@ -1851,7 +3067,7 @@ async def validate_symbol_endpoint(symbol: str):
                 })
 
         except Exception as api_error:
-            return clean_response_data({
+            return FastJSONResponse({
                 "symbol": symbol,
                 "is_valid": False,
                 "error": str(api_error),
@@ -1861,7 +3077,7 @@ async def validate_symbol_endpoint(symbol: str):
 
     except Exception as e:
         print(f"Symbol validation error: {e}")
-        return clean_response_data({
+        return FastJSONResponse({
             "symbol": symbol,
             "is_valid": False,
             "error": str(e),
@@ -1884,7 +3100,7 @@ async def test_ai_connection():
     # اختبار Binance
     try:
         if binance_client:
-            test_price = safe_binance_call(binance_client.get_symbol_price, "BTCUSDT")
+            test_price = await binance_call(binance_client.get_symbol_price, "BTCUSDT")
             results["binance"] = {
                 "status": "connected",
                 "test_price": test_price,
@@ -1926,25 +3142,27 @@ async def test_ai_connection():
     # اختبار AI modules
     results["ai_modules"] = {
         "simple_ai": {
-            "available": simple_ai is not None,
+            "available": bool(simple_ai),
             "trained": getattr(simple_ai, 'is_trained', False) if simple_ai else False
         },
         "advanced_ai": {
-            "available": advanced_ai is not None,
+            "available": bool(advanced_ai),
             "trained": getattr(advanced_ai, 'is_trained', False) if advanced_ai else False
         },
         "enhanced_ai": {
-            "available": ENHANCED_AI_AVAILABLE,
-            "instance": enhanced_advanced_ai is not None,
+            "available": bool(ENHANCED_AI_AVAILABLE),
+            "instance": bool(enhanced_advanced_ai),
             "trained": getattr(enhanced_advanced_ai, 'is_trained', False) if enhanced_advanced_ai else False
         },
         "sentiment_analysis": {
-            "available": SENTIMENT_AVAILABLE,
-            "instance": sentiment_analyzer is not None
+            "available": bool(SENTIMENT_AVAILABLE),
+            "instance": bool(sentiment_analyzer)
         }
     }
 
-    return clean_response_data(results)
+    return FastJSONResponse(results)
+
+STARTUP_TIMINGS["main_import_seconds"] = round(time.perf_counter() - MAIN_IMPORT_STARTED, 3)
 
 # ============ Main Entry Point ============
 if __name__ == "__main__":
@@ -1959,4 +3177,7 @@ if __name__ == "__main__":
     print("💾 Cache Stats: http://localhost:8000/cache/stats")
     print("=" * 50)
 
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=False, log_level="info", access_log=True)
\ No newline at end of file
+    # أكثر من عامل: uvicorn يستورد التطبيق في كل عامل من مساره النصي - مع STATE_BACKEND=redis
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=8000, reload=False, workers=workers,
+                log_level="info", access_log=True)
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Market Stream
+بث التحليل والأسعار للوحات التحكم بدل الاستطلاع الدوري
+
+قناة واحدة لكل (عملة، فترة) تعمل ما دام لها مشترك:
+    - مصدر الأسعار: بث شموع Binance عبر WebSocket (تحديث كل ثانيتين تقريباً مع علامة إغلاق الشمعة)،
+      أو استطلاع السعر إن لم تتوفر aiohttp
+    - كل تحديث سعر يُرسل لكل المشتركين فوراً
+    - عند إغلاق الشمعة يُحسب التحليل مرة واحدة ويُوزع على كل المشتركين
+
+المشترك الجديد يستلم آخر تحليل وآخر سعر للقناة فوراً. طابور كل مشترك محدود: المشترك البطيء
+يفقد أقدم الأحداث بدلاً من أن يحجز الباقين أو يملأ الذاكرة.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+SUBSCRIBER_QUEUE_SIZE = 256
+PRICE_POLL_SECONDS = 2.0
+MAX_RECONNECT_DELAY = 60
+
+
+class Subscription:
+    """اشتراك عميل واحد (SSE أو WebSocket) في عدة قنوات"""
+
+    def __init__(self, channels: List[Tuple[str, str]]):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class _Channel:
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.subscribers: set = set()
+        self.task: Optional[asyncio.Task] = None
+        self.analysis_task: Optional[asyncio.Task] = None
+        self.last_price: Optional[Dict[str, Any]] = None
+        self.last_analysis: Optional[Dict[str, Any]] = None
+        self.last_closed: Optional[int] = None
+        self.analyses = 0
+        self.ticks = 0
+
+
+class AnalysisHub:
+    """
+    توزيع الأسعار والتحليل على المشتركين - حساب واحد لكل عملة لكل شمعة مهما كان عدد المشتركين
+    analyze(symbol, interval, closed_at): coroutine يُرجع التحليل على الشموع المغلقة حتى closed_at (None = الآن)
+    fetch_price(symbol): coroutine يُرجع السعر الحالي (مصدر الاستطلاع)
+    candle_close_time(interval): وقت إغلاق الشمعة الحالية بالمللي ثانية (مصدر الاستطلاع)
+    """
+
+    def __init__(self, analyze: Callable[..., Awaitable[Dict[str, Any]]],
+                 fetch_price: Callable[[str], Awaitable[Optional[float]]],
+                 candle_close_time: Callable[[str], Optional[int]],
+                 source: str = None):
+        self.analyze = analyze
+        self.fetch_price = fetch_price
+        self.candle_close_time = candle_close_time
+        self.source = source or os.getenv("STREAM_SOURCE", "binance_ws" if AIOHTTP_AVAILABLE else "poll")
+        if self.source == "binance_ws" and not AIOHTTP_AVAILABLE:
+            print("⚠️ aiohttp غير متاح - استخدام استطلاع الأسعار للبث")
+            self.source = "poll"
+        self._channels: Dict[Tuple[str, str], _Channel] = {}
+
+    def subscribe(self, symbols: List[str], interval: str) -> Subscription:
+        subscription = Subscription([(symbol, interval) for symbol in symbols])
+        for key in subscription.channels:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel(*key)
+                channel.task = asyncio.create_task(self._run_channel(channel))
+            channel.subscribers.add(subscription)
+
+            # لقطة فورية للمشترك الجديد
+            if channel.last_analysis:
+                subscription.put(channel.last_analysis)
+            if channel.last_price:
+                subscription.put(channel.last_price)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for key in subscription.channels:
+            channel = self._channels.get(key)
+            if channel is None:
+                continue
+            channel.subscribers.discard(subscription)
+            if not channel.subscribers:
+                # آخر مشترك غادر - إيقاف مصدر القناة
+                for task in (channel.task, channel.analysis_task):
+                    if task:
+                        task.cancel()
+                del self._channels[key]
+
+    def _broadcast(self, channel: _Channel, event: Dict[str, Any]):
+        for subscription in list(channel.subscribers):
+            subscription.put(event)
+
+    async def _publish_analysis(self, channel: _Channel, closed_at: Optional[int]):
+        try:
+            data = await self.analyze(channel.symbol, channel.interval, closed_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            data = {"error": getattr(e, "detail", None) or str(e)}
+        channel.analyses += 1
+        channel.last_analysis = {
+            "event": "analysis", "symbol": channel.symbol, "interval": channel.interval, "data": data
+        }
+        self._broadcast(channel, channel.last_analysis)
+
+    def _schedule_analysis(self, channel: _Channel, closed_at: Optional[int]):
+        if channel.analysis_task and not channel.analysis_task.done():
+            channel.analysis_task.cancel()
+        channel.analysis_task = asyncio.create_task(self._publish_analysis(channel, closed_at))
+
+    async def _run_channel(self, channel: _Channel):
+        """حلقة القناة: تحليل أولي ثم أسعار حتى آخر مشترك - إعادة الاتصال بتأخير متزايد"""
+        self._schedule_analysis(channel, None)
+        ticks = self._binance_ticks if self.source == "binance_ws" else self._polled_ticks
+        delay = 1
+        while True:
+            try:
+                async for price, closed, close_time in ticks(channel.symbol, channel.interval):
+                    delay = 1
+                    channel.ticks += 1
+                    channel.last_price = {
+                        "event": "price", "symbol": channel.symbol, "interval": channel.interval,
+                        "data": {"price": price, "candle_close_time": close_time, "timestamp": datetime.now().isoformat()}
+                    }
+                    self._broadcast(channel, channel.last_price)
+
+                    if closed and close_time != channel.last_closed:
+                        channel.last_closed = close_time
+                        self._schedule_analysis(channel, close_time)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Stream {channel.symbol} {channel.interval} error: {e} - retry in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _binance_ticks(self, symbol: str, interval: str):
+        """(السعر، أُغلقت الشمعة؟، وقت إغلاقها) من بث شموع Binance"""
+        url = f"{BINANCE_WS_URL}/ws/{symbol.lower()}@kline_{interval}"
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(url, heartbeat=30) as ws:
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.TEXT:
+                        kline = json.loads(message.data)["k"]
+                        yield float(kline["c"]), bool(kline["x"]), int(kline["T"])
+                    elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+
+    async def _polled_ticks(self, symbol: str, interval: str):
+        """نفس المخرجات باستطلاع السعر - الإغلاق يُستنتج من وقت إغلاق الشمعة الحالية"""
+        close_time = self.candle_close_time(interval)
+        while True:
+            price = await self.fetch_price(symbol)
+            closed = close_time is not None and time.time() * 1000 > close_time
+            if price is not None:
+                yield price, closed, close_time
+            if closed:
+                close_time = self.candle_close_time(interval)
+            await asyncio.sleep(PRICE_POLL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "channels": [
+                {
+                    "symbol": channel.symbol,
+                    "interval": channel.interval,
+                    "subscribers": len(channel.subscribers),
+                    "price_ticks": channel.ticks,
+                    "analyses": channel.analyses,
+                    "last_closed_candle": channel.last_closed,
+                    "dropped_events": sum(subscription.dropped for subscription in channel.subscribers)
+                }
+                for channel in self._channels.values()
+            ],
+            "subscribers": len({s for channel in self._channels.values() for s in channel.subscribers})
+        }
+
+    def close(self):
+        for channel in list(self._channels.values()):
+            for task in (channel.task, channel.analysis_task):
+                if task:
+                    task.cancel()
+        self._channels.clear()
@@ -0,0 +1,180 @@
+"""
+Model Bundle
+حزمة النموذج: ملف واحد ذري بدلاً من عشرة ملفات pickle منفصلة
+
+    {name}-{stamp}.joblib : النماذج + المطبّع + أعمدة الميزات + المحرك المُجمّع + الطالب
+    {name}.json           : الـ manifest (اسم ملف الحزمة، البصمة، المخطط، بيانات التدريب)
+    {name}.{channel}.json : manifest قناة أخرى (مثل candidate للنموذج المرشح في الظل)
+
+الكتابة: ملف مؤقت ← fsync ← إعادة تسمية، ثم الـ manifest بنفس الطريقة.
+إعادة تسمية الـ manifest هي لحظة الالتزام: أي تعطل قبلها يترك الحزمة السابقة كما هي،
+فلا يمكن تحميل نماذج من إصدارات مختلفة معاً. ترقية المرشح = استبدال manifest الحي بـ manifest القناة.
+
+الحزمة بدون ضغط، فمصفوفات numpy بداخلها (المطبّع، مصفوفات الأشجار المُجمّعة، أوزان
+الشبكات) تُقرأ بـ mmap من الملف نفسه.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+BUNDLE_FORMAT_VERSION = 1
+LIVE_CHANNEL = "live"
+
+
+def file_sha256(path: str) -> str:
+    """بصمة محتوى الملف"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(directory: str, name: str, channel: str = LIVE_CHANNEL) -> str:
+    if channel == LIVE_CHANNEL:
+        return os.path.join(directory, f"{name}.json")
+    return os.path.join(directory, f"{name}.{channel}.json")
+
+
+def read_manifest(directory: str, name: str, channel: str = LIVE_CHANNEL) -> Optional[Dict[str, Any]]:
+    """الـ manifest الحالي للقناة - None إن لم توجد حزمة"""
+    try:
+        with open(manifest_path(directory, name, channel)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]):
+    tmp_manifest = f"{os.path.join(os.path.dirname(path), '.' + os.path.basename(path))}.tmp-{os.getpid()}"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_manifest, path)
+
+
+def write_bundle(directory: str, name: str, payload: Dict[str, Any],
+                 metadata: Dict[str, Any] = None, keep: int = 2,
+                 channel: str = LIVE_CHANNEL) -> Dict[str, Any]:
+    """
+    كتابة حزمة جديدة ذرياً وإرجاع الـ manifest
+    keep: عدد ملفات الحزم المحتفظ بها (الحالية + السابقة للتراجع) - عدا ما تشير إليه manifests القنوات
+    """
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.joblib"
+    bundle_path = os.path.join(directory, filename)
+    tmp_path = os.path.join(directory, f".{filename}.tmp")
+
+    try:
+        # بدون ضغط ليبقى mmap ممكناً
+        joblib.dump(payload, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        content_hash = file_sha256(tmp_path)
+        os.replace(tmp_path, bundle_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "name": name,
+        "channel": channel,
+        "file": filename,
+        "content_hash": content_hash,
+        "size_bytes": os.path.getsize(bundle_path),
+        "model_version": str(int(os.path.getmtime(bundle_path))),
+        "created_at": datetime.now().isoformat(),
+        "components": sorted(payload.keys()),
+        **(metadata or {})
+    }
+
+    # لحظة الالتزام
+    _write_manifest(manifest_path(directory, name, channel), manifest)
+
+    _prune_bundles(directory, name, filename, keep)
+    return manifest
+
+
+def promote_bundle(directory: str, name: str, channel: str) -> Optional[Dict[str, Any]]:
+    """ترقية حزمة القناة إلى الحية ذرياً - None إذا لم يوجد مرشح"""
+    manifest = read_manifest(directory, name, channel)
+    if not manifest:
+        return None
+
+    previous = read_manifest(directory, name)
+    manifest["channel"] = LIVE_CHANNEL
+    manifest["promoted_from"] = channel
+    manifest["promoted_at"] = datetime.now().isoformat()
+    manifest["previous_version"] = previous.get("model_version") if previous else None
+    _write_manifest(manifest_path(directory, name), manifest)
+    os.remove(manifest_path(directory, name, channel))
+    return manifest
+
+
+def discard_channel(directory: str, name: str, channel: str) -> bool:
+    """حذف manifest القناة وملف حزمتها إن لم تشر إليه قناة أخرى"""
+    manifest = read_manifest(directory, name, channel)
+    if not manifest:
+        return False
+    os.remove(manifest_path(directory, name, channel))
+    if manifest["file"] not in _referenced_bundles(directory, name):
+        try:
+            os.remove(os.path.join(directory, os.path.basename(manifest["file"])))
+        except OSError:
+            pass
+    return True
+
+
+def read_bundle(directory: str, name: str, mmap: bool = True, verify: bool = True,
+                channel: str = LIVE_CHANNEL) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    تحميل الحزمة الحالية للقناة: (المحتوى، الـ manifest) أو None إن لم توجد
+    يرفع ValueError إذا لم تطابق البصمة (ملف تالف أو معدّل)
+    """
+    manifest = read_manifest(directory, name, channel)
+    if not manifest:
+        return None
+
+    bundle_path = os.path.join(directory, os.path.basename(manifest["file"]))
+    if not os.path.exists(bundle_path):
+        raise ValueError(f"ملف الحزمة غير موجود: {manifest['file']}")
+    if verify and file_sha256(bundle_path) != manifest["content_hash"]:
+        raise ValueError(f"بصمة الحزمة لا تطابق الـ manifest: {manifest['file']}")
+
+    payload = joblib.load(bundle_path, mmap_mode="r" if mmap else None)
+    return payload, manifest
+
+
+def _referenced_bundles(directory: str, name: str) -> set:
+    """ملفات الحزم التي تشير إليها manifests كل القنوات"""
+    referenced = set()
+    for f in os.listdir(directory):
+        if f == f"{name}.json" or (f.startswith(f"{name}.") and f.endswith(".json")):
+            try:
+                with open(os.path.join(directory, f)) as manifest_file:
+                    referenced.add(json.load(manifest_file).get("file"))
+            except (OSError, ValueError):
+                pass
+    return referenced
+
+
+def _prune_bundles(directory: str, name: str, current: str, keep: int):
+    """حذف ملفات الحزم الأقدم - الحذف آمن حتى لو كانت مفتوحة بـ mmap"""
+    referenced = _referenced_bundles(directory, name)
+    bundles = sorted(
+        f for f in os.listdir(directory)
+        if f.startswith(f"{name}-") and f.endswith(".joblib") and f != current and f not in referenced
+    )
+    for old in bundles[:max(0, len(bundles) - (keep - 1))]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
@@ -1,23 +1,135 @@
 import numpy as np
-from typing import Dict, List, Any
-from sklearn.model_selection import GridSearchCV
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
+from walk_forward import PurgedWalkForwardSplit, single_threaded
+
+# فضاءات البحث لنماذج النظام المحسن
+# resource: المعامل الذي يكبر مع كل جولة (عدد الأشجار أو حجم البيانات)
+SEARCH_SPACES = {
+    'enhanced_rf': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'max_depth': [8, 12, 15, 20, None],
+            'min_samples_split': [2, 5, 10],
+            'min_samples_leaf': [1, 2, 4],
+            'max_features': ['sqrt', 'log2']
+        }
+    },
+    'extra_trees': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'max_depth': [8, 12, 15, 25, None],
+            'min_samples_split': [2, 3, 5, 10],
+            'min_samples_leaf': [1, 2, 4],
+            'max_features': ['sqrt', 'log2']
+        }
+    },
+    'enhanced_gb': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'learning_rate': [0.03, 0.05, 0.1, 0.2],
+            'max_depth': [3, 4, 6, 8],
+            'min_samples_leaf': [1, 3, 5],
+            'subsample': [0.7, 0.8, 1.0]
+        }
+    },
+    'xgboost': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'learning_rate': [0.03, 0.05, 0.1, 0.2],
+            'max_depth': [3, 5, 8, 10],
+            'min_child_weight': [1, 3, 5],
+            'subsample': [0.7, 0.8, 1.0],
+            'colsample_bytree': [0.6, 0.8, 1.0]
+        }
+    },
+    'lightgbm': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'learning_rate': [0.03, 0.05, 0.1, 0.2],
+            'num_leaves': [15, 31, 63],
+            'max_depth': [5, 10, -1],
+            'min_child_samples': [10, 20, 40],
+            'colsample_bytree': [0.6, 0.8, 1.0]
+        }
+    },
+    'catboost': {
+        'resource': 'iterations', 'max_resources': 300,
+        'params': {
+            'learning_rate': [0.03, 0.05, 0.1, 0.2],
+            'depth': [4, 6, 8],
+            'l2_leaf_reg': [1, 3, 5, 9]
+        }
+    },
+    'adaboost': {
+        'resource': 'n_estimators', 'max_resources': 200,
+        'params': {
+            'learning_rate': [0.1, 0.3, 0.5, 1.0]
+        }
+    },
+    # نماذج الإعداد السريع (histogram)
+    'lgbm_rf': {
+        'resource': 'n_estimators', 'max_resources': 300,
+        'params': {
+            'max_depth': [8, 12, 15, -1],
+            'min_child_samples': [2, 5, 10],
+            'feature_fraction_bynode': [0.2, 0.3, 0.5]
+        }
+    },
+    'hist_gb': {
+        'resource': 'max_iter', 'max_resources': 300,
+        'params': {
+            'learning_rate': [0.03, 0.05, 0.1, 0.2],
+            'max_depth': [3, 4, 6, 8],
+            'min_samples_leaf': [3, 10, 20],
+            'l2_regularization': [0.0, 0.1, 1.0]
+        }
+    },
+    'hist_stumps': {
+        'resource': 'max_iter', 'max_resources': 200,
+        'params': {
+            'learning_rate': [0.1, 0.3, 0.5, 1.0]
+        }
+    },
+    'neural_net': {
+        'resource': 'n_samples', 'max_resources': 'auto',
+        'params': {
+            'hidden_layer_sizes': [(32,), (50, 25), (100, 50)],
+            'alpha': [0.0001, 0.001, 0.01],
+            'learning_rate_init': [0.001, 0.003, 0.01]
+        }
+    },
+    'logistic_l2': {
+        'resource': 'n_samples', 'max_resources': 'auto',
+        'params': {
+            'C': [0.01, 0.1, 0.3, 1.0, 3.0, 10.0]
+        }
+    }
+}
+
 
 class ModelOptimizer:
     def __init__(self):
         self.best_params = {}
+        self.tuning_path = "/app/models/tuning/"
+        self.halving_factor = 3
+        self.n_candidates = 27
         
+
     def optimize_random_forest(self, X_train, y_train, X_test, y_test) -> Dict[str, Any]:
         """
         تحسين معاملات Random Forest
         """
         print("بدء تحسين Random Forest...")
         
-        # معاملات للاختبار
+        # معاملات للاختبار - عدد الأشجار هو المورد الذي يكبر مع كل جولة
         param_grid = {
-            'n_estimators': [50, 100, 200],
             'max_depth': [10, 15, 20, None],
             'min_samples_split': [2, 5, 10],
             'min_samples_leaf': [1, 2, 4]
@@ -26,35 +138,142 @@ class ModelOptimizer:
         # نموذج أساسي
         rf = RandomForestClassifier(random_state=42)
         
-        # البحث عن أفضل معاملات
-        grid_search = GridSearchCV(
-            rf, param_grid, 
-            cv=3, 
-            scoring='accuracy',
-            n_jobs=-1,
-            verbose=1
+        # البحث المتدرج بدلاً من الشبكة الكاملة
+        search = self.successive_halving_search(
+            rf, param_grid, X_train, y_train,
+            resource='n_estimators', max_resources=200
         )
         
-        grid_search.fit(X_train, y_train)
-        
         # أفضل نموذج
-        best_model = grid_search.best_estimator_
+        best_model = search['model']
         
         # اختبار الأداء
         train_accuracy = best_model.score(X_train, y_train)
         test_accuracy = best_model.score(X_test, y_test)
         
         # حفظ أفضل معاملات
-        self.best_params['random_forest'] = grid_search.best_params_
+        self.best_params['random_forest'] = search['best_params']
         
         return {
-            'best_params': grid_search.best_params_,
+            'best_params': search['best_params'],
             'train_accuracy': round(train_accuracy * 100, 2),
             'test_accuracy': round(test_accuracy * 100, 2),
             'improvement': round((test_accuracy - 0.5) * 100, 2),  # تحسن عن العشوائية
+            'search': {k: v for k, v in search.items() if k != 'model'},
             'model': best_model
         }
     
+    def successive_halving_search(self, estimator, param_space: Dict[str, List], X, y,
+                                  resource: str = 'n_estimators', max_resources='auto',
+                                  cv_folds: int = 3, purge: int = 1, n_jobs: int = -1) -> Dict[str, Any]:
+        """
+        بحث متدرج (Successive Halving): كل الإعدادات تبدأ بمورد صغير
+        ويكبر المورد للثلث الأفضل فقط في كل جولة - الجولات تعمل في عمليات متوازية
+        التقييم بتحقق زمني متقاطع مع تطهير (بدون تسريب المستقبل)
+        """
+        start_time = datetime.now()
+        
+        # الأنوية للعمليات المتوازية، وخيط واحد داخل كل نموذج
+        estimator, thread_params = single_threaded(estimator)
+        
+        if resource == 'n_samples':
+            min_resources = 'smallest'
+        else:
+            # ثلاث جولات على الأقل: max / factor^2 ثم max / factor ثم max
+            min_resources = max(10, int(max_resources // (self.halving_factor ** 2)))
+        
+        search = HalvingRandomSearchCV(
+            estimator, param_space,
+            n_candidates=self.n_candidates,
+            factor=self.halving_factor,
+            resource=resource,
+            max_resources=max_resources,
+            min_resources=min_resources,
+            cv=PurgedWalkForwardSplit(n_splits=cv_folds, purge=purge),
+            scoring='accuracy',
+            n_jobs=n_jobs,
+            random_state=42,
+            refit=True
+        )
+        search.fit(X, y)
+        
+        best_params = dict(search.best_params_)
+        best_model = search.best_estimator_
+        if thread_params:
+            # إعادة الخيوط الأصلية للنموذج النهائي
+            best_model.set_params(**thread_params)
+        
+        return {
+            'best_params': best_params,
+            'best_score': round(float(search.best_score_), 4),
+            'iterations': int(search.n_iterations_),
+            'candidates_per_iteration': [int(n) for n in search.n_candidates_],
+            'resources_per_iteration': [int(r) for r in search.n_resources_],
+            'total_fits': int(sum(search.n_candidates_) * cv_folds),
+            'search_time_seconds': round((datetime.now() - start_time).total_seconds(), 2),
+            'model': best_model
+        }
+    
+    def tune_enhanced_models(self, models: Dict[str, Any], X_train, y_train,
+                             symbol: str = None, interval: str = "1h",
+                             feature_version: str = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        ضبط معاملات نماذج النظام المحسن بالبحث المتدرج
+        النتائج تُحفظ لكل (عملة، فترة، إصدار الميزات) ولا يعاد البحث إلا عند تغيرها
+        """
+        cache_file = None
+        if symbol and feature_version:
+            cache_file = os.path.join(self.tuning_path, f"{symbol.upper()}_{interval}_{feature_version}.pkl")
+        
+        cached = {}
+        if use_cache and cache_file and os.path.exists(cache_file):
+            try:
+                cached = joblib.load(cache_file)
+            except Exception as e:
+                print(f"⚠️ فشل تحميل نتائج الضبط المحفوظة: {e}")
+        
+        results = {}
+        for name, model in models.items():
+            space = SEARCH_SPACES.get(name)
+            if space is None:
+                continue
+            
+            if name in cached:
+                results[name] = dict(cached[name], from_cache=True)
+                continue
+            
+            try:
+                print(f"🔍 بحث متدرج لمعاملات {name}...")
+                search = self.successive_halving_search(
+                    model, space['params'], X_train, y_train,
+                    resource=space['resource'], max_resources=space['max_resources']
+                )
+                best_params = search['best_params']
+                if space['resource'] != 'n_samples':
+                    best_params[space['resource']] = search['resources_per_iteration'][-1]
+                
+                results[name] = {k: v for k, v in search.items() if k != 'model'}
+                results[name]['best_params'] = best_params
+                print(f"✅ {name}: دقة {search['best_score']:.3f} في {search['search_time_seconds']} ثانية")
+            except Exception as e:
+                print(f"⚠️ فشل ضبط {name}: {e}")
+                results[name] = {'error': str(e)}
+        
+        # حفظ النتائج الناجحة
+        successful = {k: {kk: vv for kk, vv in v.items() if kk != 'from_cache'}
+                      for k, v in results.items() if 'error' not in v}
+        if cache_file and successful:
+            try:
+                os.makedirs(self.tuning_path, exist_ok=True)
+                joblib.dump(successful, cache_file)
+            except Exception as e:
+                print(f"⚠️ فشل حفظ نتائج الضبط: {e}")
+        
+        for name, result in successful.items():
+            self.best_params[name] = result['best_params']
+        
+        return results
+    
     def feature_importance_analysis(self, model, feature_names: List[str]) -> Dict[str, Any]:
         """
         تحليل أهمية الميزات
@@ -0,0 +1,388 @@
+"""
+Prediction Ledger
+سجل التنبؤات الحية لمقارنة إصدارات النماذج (الحي والمرشح في الظل)
+
+كل تنبؤ صف ثابت الحجم في ملف ثنائي واحد (إضافة فقط)، ويُحل الصف عند إغلاق
+شمعة الأفق بنفس طريقة الأهداف المستخدمة في تدريب ذلك الإصدار (labeling.make_labels).
+التقرير لكل إصدار: الدقة الحية، Brier score، وزمن التنبؤ على آخر window صف محلول -
+فقرار الترقية مبني على بيانات حية لا على فترة الاختبار.
+
+الملفات:
+    {path}               : الصفوف (LEDGER_DTYPE)
+    {path}.targets.json  : إعدادات الأهداف لكل إصدار
+    {path}.lock          : قفل flock بين العمليات
+
+عدة عمال يشتركون في نفس الملف: كل عملية تأخذ القفل ثم تقرأ ما أضافه غيرها قبل أي تسجيل
+أو حل أو ضغط، فيبقى موقع الصف في الذاكرة هو موقعه في الملف والضغط يرى كل الصفوف.
+الحل والضغط يغيران صفوفاً موجودة فيرفعان رقم الجيل في ملف القفل، ومن يرى جيلاً آخر يعيد التحميل.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import numpy as np
+
+from labeling import make_labels
+
+ROLE_LIVE = 0
+ROLE_SHADOW = 1
+ROLE_NAMES = {ROLE_LIVE: "live", ROLE_SHADOW: "shadow"}
+
+# حالة الصف قبل/بدون نتيجة - النتائج المحلولة: 1 صعود، 0 هبوط، -1 محايد
+OUTCOME_PENDING = -2
+OUTCOME_EXPIRED = -3  # الشمعة المرجعية خرجت من نافذة البيانات قبل الحل
+
+LEDGER_DTYPE = np.dtype([
+    ("predicted_at", "i8"),
+    ("symbol", "S16"),
+    ("interval", "S4"),
+    ("model_version", "S32"),
+    ("role", "i1"),
+    ("candle_time", "i8"),   # وقت فتح الشمعة التي بُني عليها التنبؤ
+    ("horizon", "i2"),
+    ("price", "f8"),         # السعر المرجعي وقت التنبؤ
+    ("prob_up", "f4"),
+    ("prediction", "i1"),
+    ("latency_ms", "f4"),
+    ("outcome", "i1"),
+    ("resolved_at", "i8")
+])
+
+
+class PredictionLedger:
+    """سجل تنبؤات مضغوط - صف واحد لكل (إصدار، عملة، شمعة)"""
+
+    def __init__(self, path: str, max_records: int = 200_000):
+        self.path = path
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._records = None
+        self._size = 0
+        self._target_configs = {}
+        self._targets_mtime = None
+        self._file_id = None  # (الجهاز، inode) للملف الممثل في الذاكرة - يتغير بعد الضغط
+        self._generation = None
+        self._lock_file = None
+        self._last_keys = {}
+
+    # ---------- التخزين ----------
+
+    @contextmanager
+    def _locked(self):
+        """القفل بين الخيوط ثم بين العمليات، ومزامنة الذاكرة مع الملف"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            lock_path = f"{self.path}.lock"
+            open(lock_path, "a").close()
+            with open(lock_path, "r+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._sync(lock_file.read().strip() or "0")
+                    self._lock_file = lock_file
+                    yield
+                finally:
+                    self._lock_file = None
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _bump_generation(self):
+        """بعد تعديل صفوف موجودة - العمليات الأخرى تعيد التحميل الكامل في مزامنتها التالية"""
+        self._generation = str(int(self._generation or 0) + 1)
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        self._lock_file.write(self._generation)
+        self._lock_file.flush()
+
+    def _sync(self, generation: str):
+        """قراءة الصفوف التي أضافتها عمليات أخرى - أو تحميل كامل بعد حل أو ضغط عندها أو عند أول استخدام"""
+        try:
+            stat = os.stat(self.path)
+            file_id, file_size = (stat.st_dev, stat.st_ino), stat.st_size
+        except FileNotFoundError:
+            file_id, file_size = None, 0
+
+        row_size = LEDGER_DTYPE.itemsize
+        if (self._records is None or generation != self._generation or file_id != self._file_id
+                or file_size < self._size * row_size or file_size % row_size):
+            self._load(file_size)
+            self._generation = generation
+        elif file_size > self._size * row_size:
+            count = file_size // row_size - self._size
+            appended = np.fromfile(self.path, dtype=LEDGER_DTYPE, count=count, offset=self._size * row_size)
+            self._append(appended)
+        self._load_targets()
+
+    def _load(self, file_size: int):
+        records = np.zeros(0, dtype=LEDGER_DTYPE)
+        if file_size:
+            try:
+                # صف ناقص في النهاية (تعطل أثناء الكتابة) يُتجاهل
+                count = file_size // LEDGER_DTYPE.itemsize
+                records = np.fromfile(self.path, dtype=LEDGER_DTYPE, count=count)
+                if count * LEDGER_DTYPE.itemsize != file_size:
+                    self._rewrite(records)
+            except Exception as e:
+                print(f"⚠️ فشل قراءة سجل التنبؤات: {e}")
+                records = np.zeros(0, dtype=LEDGER_DTYPE)
+
+        self._records = np.zeros(max(1024, len(records) * 2), dtype=LEDGER_DTYPE)
+        self._size = 0
+        self._last_keys = {}
+        self._append(records)
+        self._file_id = self._current_file_id()
+
+    def _append(self, rows: np.ndarray):
+        """إضافة صفوف للذاكرة (بعد كتابتها في الملف) مع آخر تنبؤ لكل مفتاح لمنع التكرار بين العمال"""
+        if self._size + len(rows) > len(self._records):
+            grown = np.zeros(max(len(self._records) * 2, self._size + len(rows)), dtype=LEDGER_DTYPE)
+            grown[:self._size] = self._records[:self._size]
+            self._records = grown
+        self._records[self._size:self._size + len(rows)] = rows
+        self._size += len(rows)
+        for row in rows:
+            key = (row["symbol"].decode(), row["interval"].decode(), int(row["role"]))
+            self._last_keys[key] = (row["model_version"].decode(), int(row["candle_time"]))
+
+    def _load_targets(self):
+        path = f"{self.path}.targets.json"
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._target_configs, self._targets_mtime = {}, None
+            return
+        if mtime == self._targets_mtime:
+            return
+        try:
+            with open(path) as f:
+                self._target_configs = json.load(f)
+            self._targets_mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _current_file_id(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_dev, stat.st_ino
+        except FileNotFoundError:
+            return None
+
+    def _rewrite(self, records: np.ndarray):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        self._file_id = self._current_file_id()
+
+    def _write_rows(self, indices: np.ndarray):
+        """تحديث صفوف محلولة في مكانها"""
+        with open(self.path, "r+b") as f:
+            for i in indices:
+                f.seek(int(i) * LEDGER_DTYPE.itemsize)
+                f.write(self._records[i].tobytes())
+        self._bump_generation()
+
+    def _compact(self):
+        """إبقاء النصف الأحدث مع كل الصفوف المعلقة"""
+        records = self._records[:self._size]
+        keep = np.zeros(self._size, dtype=bool)
+        keep[-(self.max_records // 2):] = True
+        keep |= records["outcome"] == OUTCOME_PENDING
+        records = records[keep].copy()
+        self._rewrite(records)
+        self._records = np.zeros(max(1024, len(records) * 2), dtype=LEDGER_DTYPE)
+        self._size = 0
+        self._append(records)
+        self._bump_generation()
+
+    # ---------- التسجيل والحل ----------
+
+    def record(self, symbol: str, interval: str, model_version: str, role: int, candle_time: int,
+               price: float, prob_up: float, prediction: int, latency_ms: float,
+               target_config: Dict[str, Any]) -> bool:
+        """تسجيل تنبؤ - تكرار نفس الإصدار على نفس الشمعة يُتجاهل"""
+        if not model_version:
+            return False
+        key = (symbol.upper(), interval, role)
+        try:
+            with self._locked():
+                if self._last_keys.get(key) == (model_version, candle_time):
+                    return False
+
+                if model_version not in self._target_configs:
+                    self._target_configs[model_version] = dict(target_config)
+                    tmp_file = f"{self.path}.targets.json.tmp-{os.getpid()}"
+                    with open(tmp_file, "w") as f:
+                        json.dump(self._target_configs, f)
+                    os.replace(tmp_file, f"{self.path}.targets.json")
+                    self._targets_mtime = os.stat(f"{self.path}.targets.json").st_mtime_ns
+
+                row = np.zeros(1, dtype=LEDGER_DTYPE)
+                row["predicted_at"] = int(time.time() * 1000)
+                row["symbol"] = symbol.upper()
+                row["interval"] = interval
+                row["model_version"] = model_version
+                row["role"] = role
+                row["candle_time"] = candle_time
+                row["horizon"] = int(target_config.get("horizon", 1))
+                row["price"] = price
+                row["prob_up"] = prob_up
+                row["prediction"] = prediction
+                row["latency_ms"] = latency_ms
+                row["outcome"] = OUTCOME_PENDING
+
+                with open(self.path, "ab") as f:
+                    f.write(row.tobytes())
+                self._append(row)
+                if self._file_id is None:
+                    self._file_id = self._current_file_id()
+
+                if self._size > self.max_records:
+                    self._compact()
+                return True
+
+        except Exception as e:
+            print(f"⚠️ فشل تسجيل التنبؤ: {e}")
+            return False
+
+    def resolve(self, symbol: str, interval: str, klines: List[Dict]) -> int:
+        """حل التنبؤات المعلقة التي أُغلقت شمعة أفقها ضمن الشموع المعطاة - يعيد عدد الصفوف المحلولة"""
+        if not klines:
+            return 0
+        try:
+            with self._locked():
+                records = self._records[:self._size]
+                pending = np.flatnonzero(
+                    (records["outcome"] == OUTCOME_PENDING)
+                    & (records["symbol"] == symbol.upper().encode())
+                    & (records["interval"] == interval.encode())
+                )
+                if not len(pending):
+                    return 0
+
+                now_ms = int(time.time() * 1000)
+                open_times = np.array([int(k["timestamp"]) for k in klines], dtype=np.int64)
+                closes = np.array([float(k["close"]) for k in klines])
+                closed = np.array([int(k["close_time"]) for k in klines], dtype=np.int64) < now_ms
+                positions = np.searchsorted(open_times, records["candle_time"][pending])
+
+                resolved = []
+                for i, pos in zip(pending, positions):
+                    row = records[i]
+                    horizon = int(row["horizon"])
+                    if pos >= len(open_times) or open_times[pos] != row["candle_time"]:
+                        if row["candle_time"] < open_times[0]:
+                            row["outcome"] = OUTCOME_EXPIRED
+                            row["resolved_at"] = now_ms
+                            resolved.append(i)
+                        continue
+                    if pos + horizon >= len(closes) or not closed[pos + horizon]:
+                        continue
+
+                    # مسار السعر من لحظة التنبؤ حتى شمعة الأفق بإعدادات أهداف الإصدار
+                    config = dict(self._target_configs.get(row["model_version"].decode(), {"method": "fixed"}))
+                    method = config.pop("method", "fixed")
+                    path = np.concatenate(([row["price"]], closes[pos + 1:pos + horizon + 1]))
+                    label = make_labels(path, method, **config)[0]
+                    row["outcome"] = int(label) if np.isfinite(label) else -1
+                    row["resolved_at"] = now_ms
+                    resolved.append(i)
+
+                if resolved:
+                    self._write_rows(np.asarray(resolved))
+                return len(resolved)
+
+        except Exception as e:
+            print(f"⚠️ فشل حل التنبؤات: {e}")
+            return 0
+
+    def pending_symbols(self) -> List[tuple]:
+        """(العملة، الفترة) التي لديها تنبؤات معلقة"""
+        with self._locked():
+            records = self._records[:self._size]
+            pending = records[records["outcome"] == OUTCOME_PENDING]
+            pairs = {(row["symbol"].decode(), row["interval"].decode()) for row in pending}
+        return sorted(pairs)
+
+    # ---------- التقرير ----------
+
+    def report(self, window: int = 500, symbol: str = None) -> Dict[str, Any]:
+        """الأداء الحي لكل إصدار على آخر window صف محلول، مع مقارنة الحي والظل على نفس الشموع"""
+        with self._locked():
+            records = self._records[:self._size].copy()
+        if symbol:
+            records = records[records["symbol"] == symbol.upper().encode()]
+
+        versions = {}
+        for version in np.unique(records["model_version"]):
+            rows = records[records["model_version"] == version]
+            scored = rows[rows["outcome"] >= 0][-window:]
+            latency = rows["latency_ms"][-window:]
+            stats = {
+                "role": ROLE_NAMES.get(int(rows["role"][-1]), "unknown"),
+                "predictions": int(len(rows)),
+                "pending": int((rows["outcome"] == OUTCOME_PENDING).sum()),
+                "neutral": int((rows["outcome"] == -1).sum()),
+                "expired": int((rows["outcome"] == OUTCOME_EXPIRED).sum()),
+                "scored": int(len(scored)),
+                "accuracy": None,
+                "brier_score": None,
+                "avg_prob_up": round(float(rows["prob_up"].mean()), 4),
+                "latency_ms": {
+                    "p50": round(float(np.percentile(latency, 50)), 2),
+                    "p95": round(float(np.percentile(latency, 95)), 2)
+                },
+                "first_prediction": int(rows["predicted_at"].min()),
+                "last_prediction": int(rows["predicted_at"].max())
+            }
+            if len(scored):
+                outcomes = scored["outcome"].astype(np.float64)
+                stats["accuracy"] = round(float((scored["prediction"] == scored["outcome"]).mean()), 4)
+                stats["brier_score"] = round(float(np.mean((scored["prob_up"] - outcomes) ** 2)), 4)
+            versions[version.decode()] = stats
+
+        return {
+            "window": window,
+            "records": int(len(records)),
+            "versions": versions,
+            "comparison": self._compare_roles(records, window)
+        }
+
+    def _compare_roles(self, records: np.ndarray, window: int) -> Dict[str, Any]:
+        """الحي مقابل الظل على نفس (العملة، الشمعة) المحلولة لكليهما"""
+        scored = records[records["outcome"] >= 0]
+        live = scored[scored["role"] == ROLE_LIVE]
+        shadow = scored[scored["role"] == ROLE_SHADOW]
+        if not len(live) or not len(shadow):
+            return {"paired": 0}
+
+        live_keys = {(row["symbol"], row["candle_time"]): row for row in live}
+        pairs = [(live_keys[key], row) for row in shadow
+                 for key in [(row["symbol"], row["candle_time"])] if key in live_keys][-window:]
+        if not pairs:
+            return {"paired": 0}
+
+        live_rows = np.array([p[0] for p in pairs], dtype=LEDGER_DTYPE)
+        shadow_rows = np.array([p[1] for p in pairs], dtype=LEDGER_DTYPE)
+
+        def summary(rows: np.ndarray) -> Dict[str, float]:
+            outcomes = rows["outcome"].astype(np.float64)
+            return {
+                "accuracy": round(float((rows["prediction"] == rows["outcome"]).mean()), 4),
+                "brier_score": round(float(np.mean((rows["prob_up"] - outcomes) ** 2)), 4),
+                "latency_p50_ms": round(float(np.median(rows["latency_ms"])), 2)
+            }
+
+        live_summary = summary(live_rows)
+        shadow_summary = summary(shadow_rows)
+        return {
+            "paired": len(pairs),
+            "live": live_summary,
+            "shadow": shadow_summary,
+            "agreement": round(float((live_rows["prediction"] == shadow_rows["prediction"]).mean()), 4),
+            "shadow_better": (shadow_summary["brier_score"] < live_summary["brier_score"]
+                              and shadow_summary["accuracy"] >= live_summary["accuracy"])
+        }
@@ -0,0 +1,313 @@
+"""
+Quantile Price Forecaster
+توقع العائد بالتوزيع (P10 / P50 / P90) لعدة آفاق بدلاً من تصنيف صعود/هبوط
+
+- الميزات من نفس خط ميزات المحرك المحسن (engineer_advanced_features)
+- أهداف كل الآفاق في تمريرة واحدة: مصفوفة عوائد (صف × أفق) من labeling.forward_returns
+- LightGBM: تُبنى مصفوفة الـ bins مرة واحدة ويُدرب عليها نموذج quantile لكل (أفق، نسبة مئوية)
+  مع تبديل الهدف فقط - وإلا HistGradientBoostingRegressor(loss="quantile")
+- التنبؤ دفعة واحدة لكل العملات: مصفوفة ميزات واحدة واستدعاء واحد لكل نموذج
+- النسب المئوية تُرتب لكل صف فلا تتقاطع (P10 ≤ P50 ≤ P90)
+- الحفظ في حزمة ذرية واحدة (model_bundle)
+"""
+
+import numpy as np
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+try:
+    import lightgbm as lgb
+
+    LGBM_AVAILABLE = True
+except ImportError:
+    LGBM_AVAILABLE = False
+
+from feature_selection import prune_features
+from labeling import forward_returns
+from model_bundle import read_bundle, write_bundle
+from walk_forward import chronological_train_test_split
+
+HORIZONS = (1, 4, 12, 24)
+QUANTILES = (0.1, 0.5, 0.9)
+BUNDLE_NAME = "forecaster_bundle"
+
+
+def pinball_loss(y_true: np.ndarray, y_pred: np.ndarray, quantile: float) -> float:
+    """خسارة الـ quantile - أقل أفضل"""
+    diff = y_true - y_pred
+    return float(np.mean(np.maximum(quantile * diff, (quantile - 1) * diff)))
+
+
+class PriceForecaster:
+    def __init__(self, model_path: str = "/app/models/forecaster/", horizons: Sequence[int] = HORIZONS,
+                 quantiles: Sequence[float] = QUANTILES, feature_engine=None):
+        """feature_engine: محرك يوفر engineer_advanced_features (المحرك المحسن افتراضياً)"""
+        self.model_path = model_path
+        self.horizons = tuple(horizons)
+        self.quantiles = tuple(quantiles)
+        self._feature_engine = feature_engine
+
+        self.models = {}  # {(الأفق، النسبة): نموذج}
+        self.feature_columns = None
+        self.is_trained = False
+        self.model_version = None
+        self.training_summary = {}
+        self.params = {
+            "n_estimators": 300,
+            "learning_rate": 0.05,
+            "num_leaves": 31,
+            "min_samples_leaf": 40,
+            "max_features": 30
+        }
+
+    @property
+    def feature_engine(self):
+        if self._feature_engine is None:
+            from enhanced_advanced_ai import enhanced_advanced_ai
+            self._feature_engine = enhanced_advanced_ai
+        return self._feature_engine
+
+    def build_training_dataset(self, prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+        """الميزات ومصفوفة عوائد كل الآفاق - الصفوف الأخيرة بلا مستقبل معروف تُحذف"""
+        if len(prices) < max(self.horizons) + 100:
+            return {"error": f"يحتاج {max(self.horizons) + 100} نقطة على الأقل لتدريب التوقع"}
+
+        features_df = self.feature_engine.engineer_advanced_features(prices, volumes)
+        feature_columns = [col for col in features_df.select_dtypes(include=[np.number]).columns if col != 'price']
+        X = features_df[feature_columns].to_numpy(dtype=float)
+        Y = np.column_stack([forward_returns(prices, horizon) for horizon in self.horizons])
+
+        valid = np.isfinite(X).all(axis=1) & np.isfinite(Y).all(axis=1)
+        return {
+            "X": X[valid],
+            "Y": Y[valid],
+            "row_index": np.flatnonzero(valid),
+            "feature_columns": feature_columns
+        }
+
+    def train(self, prices: List[float], volumes: List[float] = None,
+              dataset: Dict[str, Any] = None, test_size: float = 0.2) -> Dict[str, Any]:
+        """تدريب نماذج الـ quantile لكل الآفاق مع تقييم على آخر test_size من البيانات"""
+        try:
+            start_time = datetime.now()
+            if dataset is None:
+                dataset = self.build_training_dataset(prices, volumes)
+            if "error" in dataset:
+                return dataset
+
+            X, Y = dataset["X"], dataset["Y"]
+            if len(X) < 200:
+                return {"error": "بيانات صالحة غير كافية لتدريب التوقع"}
+
+            # تطهير بطول أطول أفق: عوائد آخر صفوف التدريب لا تتداخل مع فترة الاختبار
+            X_train, X_test, Y_train, Y_test = chronological_train_test_split(
+                X, Y, test_size=test_size, purge=max(self.horizons)
+            )
+
+            # تقليم الميزات على التدريب فقط - الترتيب بالمعلومات المتبادلة مع اتجاه الأفق الأوسط
+            primary = Y_train[:, len(self.horizons) // 2]
+            selection = prune_features(X_train, (primary > 0).astype(int), dataset["feature_columns"],
+                                       max_features=self.params["max_features"])
+            columns = selection["selected_columns"]
+            column_index = [dataset["feature_columns"].index(col) for col in columns]
+            X_train, X_test = X_train[:, column_index], X_test[:, column_index]
+
+            print(f"📈 تدريب التوقع: {len(self.horizons)} آفاق × {len(self.quantiles)} نسب على "
+                  f"{len(X_train)} صف و {len(columns)} ميزة")
+            self.models = self._fit_quantile_models(X_train, Y_train)
+            self.feature_columns = columns
+
+            evaluation = self._evaluate(X_test, Y_test)
+            self.training_summary = {
+                "trained_at": datetime.now().isoformat(),
+                "training_samples": len(X_train),
+                "test_samples": len(X_test),
+                "feature_count": len(columns),
+                "backend": "lightgbm" if LGBM_AVAILABLE else "sklearn",
+                "evaluation": evaluation,
+                "training_time_seconds": round((datetime.now() - start_time).total_seconds(), 2)
+            }
+
+            manifest = write_bundle(self.model_path, BUNDLE_NAME, {
+                "models": self.models,
+                "feature_columns": self.feature_columns,
+                "horizons": self.horizons,
+                "quantiles": self.quantiles,
+                "training_summary": self.training_summary
+            }, {
+                "horizons": list(self.horizons),
+                "quantiles": list(self.quantiles),
+                "feature_columns": self.feature_columns,
+                "training": self.training_summary
+            })
+            self.model_version = manifest["model_version"]
+            self.is_trained = True
+
+            return {
+                **self.training_summary,
+                "model_version": self.model_version,
+                "horizons": list(self.horizons),
+                "quantiles": list(self.quantiles),
+                "feature_selection": {k: v for k, v in selection.items() if k != "mutual_information"}
+            }
+
+        except Exception as e:
+            print(f"❌ خطأ في تدريب التوقع: {e}")
+            return {"error": f"فشل تدريب التوقع: {str(e)}"}
+
+    def _fit_quantile_models(self, X: np.ndarray, Y: np.ndarray) -> Dict[tuple, Any]:
+        models = {}
+        if LGBM_AVAILABLE:
+            # الـ bins تُحسب مرة واحدة لكل النماذج - يتغير الهدف فقط
+            train_set = lgb.Dataset(X, label=Y[:, 0], free_raw_data=False,
+                                    params={"min_data_in_leaf": self.params["min_samples_leaf"], "verbose": -1})
+            train_set.construct()
+            for j, horizon in enumerate(self.horizons):
+                train_set.set_label(Y[:, j])
+                for quantile in self.quantiles:
+                    models[(horizon, quantile)] = lgb.train({
+                        "objective": "quantile",
+                        "alpha": quantile,
+                        "learning_rate": self.params["learning_rate"],
+                        "num_leaves": self.params["num_leaves"],
+                        "min_data_in_leaf": self.params["min_samples_leaf"],
+                        "feature_fraction": 0.9,
+                        "seed": 42,
+                        "verbose": -1
+                    }, train_set, num_boost_round=self.params["n_estimators"])
+            return models
+
+        for j, horizon in enumerate(self.horizons):
+            for quantile in self.quantiles:
+                model = HistGradientBoostingRegressor(
+                    loss="quantile", quantile=quantile, max_iter=self.params["n_estimators"],
+                    learning_rate=self.params["learning_rate"], max_leaf_nodes=self.params["num_leaves"],
+                    min_samples_leaf=self.params["min_samples_leaf"], random_state=42
+                )
+                models[(horizon, quantile)] = model.fit(X, Y[:, j])
+        return models
+
+    def predict_quantiles(self, X: np.ndarray) -> np.ndarray:
+        """العوائد المتوقعة (صف × أفق × نسبة) - مرتبة على محور النسب"""
+        X = np.asarray(X, dtype=float)
+        output = np.empty((len(X), len(self.horizons), len(self.quantiles)))
+        for j, horizon in enumerate(self.horizons):
+            for k, quantile in enumerate(self.quantiles):
+                output[:, j, k] = self.models[(horizon, quantile)].predict(X)
+        return np.sort(output, axis=2)
+
+    def _evaluate(self, X_test: np.ndarray, Y_test: np.ndarray) -> Dict[str, Any]:
+        """لكل أفق: خسارة كل نسبة، تغطية المدى P10-P90، خطأ P50 ودقة اتجاهه"""
+        predicted = self.predict_quantiles(X_test)
+        evaluation = {}
+        for j, horizon in enumerate(self.horizons):
+            actual = Y_test[:, j]
+            low, median, high = predicted[:, j, 0], predicted[:, j, len(self.quantiles) // 2], predicted[:, j, -1]
+            evaluation[str(horizon)] = {
+                "pinball_loss": {f"p{int(q * 100)}": round(pinball_loss(actual, predicted[:, j, k], q), 6)
+                                 for k, q in enumerate(self.quantiles)},
+                "coverage": round(float(np.mean((actual >= low) & (actual <= high))), 3),
+                "expected_coverage": round(self.quantiles[-1] - self.quantiles[0], 3),
+                "median_mae": round(float(np.mean(np.abs(actual - median))), 6),
+                "direction_accuracy": round(float(np.mean(np.sign(median) == np.sign(actual))), 3),
+                "avg_dispersion": round(float(np.mean(high - low)), 6)
+            }
+        return evaluation
+
+    def forecast(self, prices: List[float], volumes: List[float] = None) -> Dict[str, Any]:
+        """توقع عملة واحدة"""
+        candles = [{"close": p, "volume": v} for p, v in zip(prices, volumes or [0] * len(prices))]
+        return self.predict_batch({"_": candles})["_"]
+
+    def predict_batch(self, candles_by_symbol: Dict[str, List[Dict]]) -> Dict[str, Dict[str, Any]]:
+        """توقع عدة عملات دفعة واحدة - استدعاء واحد لكل نموذج لكل الصفوف"""
+        if not self.is_trained:
+            load_result = self.load_models()
+            if not self.is_trained:
+                return {symbol: {"error": "نموذج التوقع غير مدرب", "load_attempt": load_result}
+                        for symbol in candles_by_symbol}
+
+        results = {}
+        rows = []
+        for symbol, candles in candles_by_symbol.items():
+            try:
+                prices = [float(candle['close']) for candle in candles or []]
+                volumes = [float(candle.get('volume', 0)) for candle in candles or []]
+                if len(prices) < 60:
+                    results[symbol] = {"error": "يحتاج 60 نقطة على الأقل للتوقع"}
+                    continue
+
+                features_df = self.feature_engine.engineer_advanced_features(prices, volumes, columns=self.feature_columns)
+                X = features_df[self.feature_columns].iloc[-1].to_numpy(dtype=float)
+                if not np.isfinite(X).all():
+                    results[symbol] = {"error": "بيانات غير صالحة للتوقع"}
+                    continue
+                rows.append((symbol, X, prices[-1]))
+            except Exception as e:
+                results[symbol] = {"error": f"فشل التوقع: {str(e)}"}
+
+        if not rows:
+            return results
+
+        try:
+            predicted = self.predict_quantiles(np.vstack([row[1] for row in rows]))
+        except Exception as e:
+            for symbol, *_ in rows:
+                results[symbol] = {"error": f"فشل التوقع: {str(e)}"}
+            return results
+
+        labels = [f"p{int(q * 100)}" for q in self.quantiles]
+        for i, (symbol, _, price) in enumerate(rows):
+            horizons = {}
+            for j, horizon in enumerate(self.horizons):
+                returns = predicted[i, j]
+                horizons[str(horizon)] = {
+                    **{label: round(float(r), 6) for label, r in zip(labels, returns)},
+                    **{f"price_{label}": round(float(price * (1 + r)), 8) for label, r in zip(labels, returns)},
+                    "dispersion": round(float(returns[-1] - returns[0]), 6)
+                }
+            results[symbol] = {
+                "horizons": horizons,
+                "current_price": float(price),
+                "model_version": self.model_version,
+                "timestamp": datetime.now().isoformat()
+            }
+        return results
+
+    def load_models(self) -> Dict[str, Any]:
+        """تحميل الحزمة المحفوظة"""
+        try:
+            bundle = read_bundle(self.model_path, BUNDLE_NAME)
+            if bundle is None:
+                return {"status": "error", "error": "لا يوجد نموذج توقع محفوظ"}
+
+            payload, manifest = bundle
+            self.models = payload["models"]
+            self.feature_columns = payload["feature_columns"]
+            self.horizons = tuple(payload["horizons"])
+            self.quantiles = tuple(payload["quantiles"])
+            self.training_summary = payload.get("training_summary", {})
+            self.model_version = manifest["model_version"]
+            self.is_trained = True
+            return {"status": "success", "model_version": self.model_version, "models_loaded": len(self.models)}
+
+        except Exception as e:
+            print(f"❌ خطأ في تحميل نموذج التوقع: {e}")
+            return {"status": "error", "error": str(e)}
+
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            "is_trained": self.is_trained,
+            "model_version": self.model_version,
+            "horizons": list(self.horizons),
+            "quantiles": list(self.quantiles),
+            "feature_columns": self.feature_columns or [],
+            "lightgbm_available": LGBM_AVAILABLE,
+            "training": self.training_summary
+        }
+
+
+# إنشاء مثيل عام
+price_forecaster = PriceForecaster()
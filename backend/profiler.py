@@ -0,0 +1,259 @@
+"""
+Profiler
+تحليل أداء طلب واحد عند الطلب - عينات مكدس دورية بدل تتبع كل استدعاء
+
+يُفعل لأي مسار بالترويسة X-Profile: 1 أو المعامل ?profile=1 مع X-Admin-Token مطابق لـ ADMIN_TOKEN
+(بدون ADMIN_TOKEN التحليل معطل). العينات تُجمع من:
+    - خيط حلقة الأحداث طوال الطلب (يشمل ما تنفذه الطلبات الأخرى المتزامنة على نفس الحلقة)
+    - خيوط المجمعات أثناء تنفيذها مهام هذا الطلب فقط
+    - عمال مجمع العمليات: يأخذ العامل عيناته بنفسه ويُرجعها مع النتيجة
+
+النتيجة تُحفظ في الذاكرة (آخر PROFILE_HISTORY طلباً) ومعرّفها في ترويسة X-Profile-Id،
+وتُقرأ كمكدسات مطوية (flamegraph.pl / speedscope) أو JSON بصيغة speedscope.
+"""
+
+import contextvars
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import JSONResponse
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_HISTORY = 50
+MAX_STACK_DEPTH = 128
+
+_active_profile: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+
+
+def current_profile() -> Optional["SamplingProfiler"]:
+    """تحليل الطلب الحالي إن كان مفعلاً (ينتقل مع السياق إلى المهام الفرعية)"""
+    return _active_profile.get()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """خيط يأخذ مكدس الخيوط المسجلة كل interval ثانية"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            samples = [
+                f"{label};{_collapse(frames[ident])}" for ident, label in threads.items() if ident in frames
+            ]
+            with self._lock:
+                self.stacks.update(samples)
+
+    def track(self, ident: int, label: str):
+        with self._lock:
+            self._threads[ident] = label
+
+    def untrack(self, ident: int):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def run_tracked(self, label: str, func: Callable, /, *args, **kwargs) -> Any:
+        """تنفيذ func في خيط عامل مع أخذ عيناته طوال التنفيذ"""
+        ident = threading.get_ident()
+        self.track(ident, label)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.untrack(ident)
+
+    def merge(self, label: str, stacks: Dict[str, int]):
+        with self._lock:
+            self.stacks.update({f"{label};{stack}": count for stack, count in stacks.items()})
+
+    def wrap(self, pool: str, kind: str, func: Callable, args: tuple):
+        """(الدالة، المعاملات) لإرسالها للمجمع بدلاً من func - عمال العمليات يُرجعون (النتيجة، العينات)"""
+        if kind == "process":
+            return profiled_call, (func, self.interval) + args
+        return self.run_tracked, (f"{pool}-pool", func) + args
+
+    def unwrap(self, pool: str, kind: str, result: Any) -> Any:
+        if kind == "process":
+            result, stacks = result
+            self.merge(f"{pool}-worker", stacks)
+        return result
+
+
+def profiled_call(func: Callable, interval: float, /, *args, **kwargs):
+    """يُنفذ داخل عامل مجمع العمليات: النتيجة مع عينات العامل"""
+    profile = SamplingProfiler(interval)
+    profile.start()
+    try:
+        result = profile.run_tracked("", func, *args, **kwargs)
+    finally:
+        profile.stop()
+    return result, {stack.lstrip(";"): count for stack, count in profile.stacks.items()}
+
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    """صيغة المكدسات المطوية: "إطار;إطار;... عدد" لكل سطر"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def to_speedscope(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """ملف speedscope - ملف تعريف لكل خيط (حلقة الأحداث وكل مجمع)"""
+    frames: List[Dict[str, str]] = []
+    frame_index: Dict[str, int] = {}
+    by_thread: Dict[str, List[tuple]] = {}
+    for stack, count in entry["stacks"].items():
+        thread, _, rest = stack.partition(";")
+        indices = []
+        for name in rest.split(";") if rest else []:
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indices.append(frame_index[name])
+        by_thread.setdefault(thread, []).append((indices, count * entry["interval"]))
+
+    profiles = []
+    for thread, samples in sorted(by_thread.items()):
+        total = sum(weight for _, weight in samples)
+        profiles.append({
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": total,
+            "samples": [indices for indices, _ in samples],
+            "weights": [weight for _, weight in samples]
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{entry['method']} {entry['path']}",
+        "exporter": "profiler.py",
+        "shared": {"frames": frames},
+        "profiles": profiles
+    }
+
+
+class ProfileStore:
+    """آخر التحليلات في الذاكرة"""
+
+    def __init__(self, history: int = PROFILE_HISTORY):
+        self._entries = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries.append(entry)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((entry for entry in self._entries if entry["id"] == profile_id), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._entries)
+        return [{key: value for key, value in entry.items() if key != "stacks"} for entry in reversed(entries)]
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected and token and hmac.compare_digest(token, expected))
+
+
+class ProfilingMiddleware:
+    """تفعيل التحليل للطلبات التي تطلبه بتوكن المدير"""
+
+    def __init__(self, app, store: ProfileStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        flag = headers.get("x-profile") or QueryParams(scope.get("query_string", b"")).get("profile")
+        if flag not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+        if not admin_token_valid(headers.get("x-admin-token")):
+            await JSONResponse({"detail": "Profiling requires a valid X-Admin-Token"}, status_code=403)(
+                scope, receive, send)
+            return
+
+        profile = SamplingProfiler()
+        profile_id = uuid.uuid4().hex[:12]
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        token = _active_profile.set(profile)
+        profile.track(threading.get_ident(), "event-loop")
+        profile.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            self.store.add({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode(),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "samples": sum(profile.stacks.values()),
+                "interval": profile.interval,
+                "created_at": datetime.now().isoformat(),
+                "stacks": dict(profile.stacks)
+            })
+
+
+# إنشاء مثيل عام
+profile_store = ProfileStore()
@@ -3,6 +3,7 @@ import schedule
 import time
 from datetime import datetime
 from trading_simulator import trading_simulator
+from shared_state import shared_state
 import threading
 
 class TradingScheduler:
@@ -14,13 +15,13 @@ class TradingScheduler:
         self.is_running = True
         
         # جدولة التداول كل ساعة
-        schedule.every().hour.do(self.run_auto_trading_cycle)
+        schedule.every().hour.do(self.run_claimed, "auto_trading", 3600, self.run_auto_trading_cycle)
         
         # جدولة التداول كل 4 ساعات (للاستراتيجيات المحافظة)
-        schedule.every(4).hours.do(self.run_conservative_trading)
+        schedule.every(4).hours.do(self.run_claimed, "conservative_trading", 4 * 3600, self.run_conservative_trading)
         
         # جدولة يومية لحساب الأداء
-        schedule.every().day.at("00:00").do(self.daily_performance_update)
+        schedule.every().day.at("00:00").do(self.run_claimed, "daily_performance", 86400, self.daily_performance_update)
         
         # تشغيل المجدول في thread منفصل
         def run_scheduler():
@@ -33,6 +34,13 @@ class TradingScheduler:
         
         print("✅ تم بدء مجدول التداول التلقائي")
     
+    def run_claimed(self, job: str, period: float, func):
+        """مع عدة عمال أو نسخ: تنفذ المهمة مرة واحدة في الفترة - أول من يطالب بها"""
+        if not shared_state.claim_period(job, period):
+            print(f"⏭️ {job}: claimed by another worker")
+            return
+        func()
+    
     def run_auto_trading_cycle(self):
         """تشغيل دورة التداول التلقائي لجميع المحافظ النشطة"""
         try:
@@ -46,9 +54,21 @@ class TradingScheduler:
             
             print(f"🔄 بدء دورة التداول التلقائي لـ {len(active_portfolios)} محفظة")
             
+            # إشارات كل العملات دفعة واحدة لكل استراتيجية (شموع بالتوازي والنماذج مرة للدفعة)
+            symbols_by_strategy = {}
+            for portfolio in active_portfolios:
+                symbols_by_strategy.setdefault(portfolio.trading_strategy, []).append(portfolio.symbol)
+            signals = {
+                strategy: trading_simulator.get_trading_signals_batch(symbols, strategy)
+                for strategy, symbols in symbols_by_strategy.items()
+            }
+            
             for portfolio in active_portfolios:
                 try:
-                    result = trading_simulator.auto_trade_cycle(portfolio.id)
+                    signal = signals[portfolio.trading_strategy].get(
+                        portfolio.symbol, {"error": "لا توجد إشارة"}
+                    )
+                    result = trading_simulator.auto_trade_cycle(portfolio.id, signal)
                     if 'error' not in result:
                         cycle_result = result.get('cycle_result', {})
                         if cycle_result.get('action') in ['BUY', 'SELL']:
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 import json
 import asyncio
 from dotenv import load_dotenv
+from metrics import CACHE_REQUESTS
+from shared_state import shared_state
 
 # تحميل متغيرات البيئة
 load_dotenv()
@@ -24,9 +26,9 @@ class RealSentimentAnalyzer:
         self.telegram_client = None
         self.vader_analyzer = None
 
-        # إعداد الذاكرة المؤقتة
-        self.cache = {}
+        # إعداد الذاكرة المؤقتة - مشتركة بين العمال (shared_state) وتنتهي صلاحيتها في المخزن
         self.cache_duration = 300  # 5 دقائق
+        self.cache = shared_state.namespace("sentiment", ttl=self.cache_duration)
 
         # تهيئة جميع الخدمات
         self._initialize_services()
@@ -167,18 +169,12 @@ class RealSentimentAnalyzer:
             logger.error(f"❌ Telegram Bot initialization failed: {e}")
             self.telegram_client = None
 
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """فحص صلاحية الذاكرة المؤقتة"""
-        if cache_key in self.cache:
-            data, timestamp = self.cache[cache_key]
-            return time.time() - timestamp < self.cache_duration
-        return False
-
     def _get_cached_data(self, cache_key: str):
-        """استرداد البيانات من الذاكرة المؤقتة"""
-        if cache_key in self.cache:
-            return self.cache[cache_key][0]
-        return None
+        """استرداد البيانات الصالحة من الذاكرة المؤقتة أو None - قراءة واحدة من المخزن"""
+        entry = self.cache.get(cache_key)
+        valid = entry is not None and time.time() - entry[1] < self.cache_duration
+        CACHE_REQUESTS.inc(cache="sentiment", result="hit" if valid else "miss")
+        return entry[0] if valid else None
 
     def _cache_data(self, cache_key: str, data: Any):
         """حفظ البيانات في الذاكرة المؤقتة"""
@@ -367,9 +363,10 @@ class RealSentimentAnalyzer:
         cache_key = f"comprehensive_{symbol}"
 
         # فحص الذاكرة المؤقتة
-        if self._is_cache_valid(cache_key):
+        cached = self._get_cached_data(cache_key)
+        if cached is not None:
             logger.info(f"✅ Using cached comprehensive sentiment for {symbol}")
-            return self._get_cached_data(cache_key)
+            return cached
 
         logger.info(f"🔄 Fetching real sentiment data for {symbol}")
 
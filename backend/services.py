@@ -0,0 +1,189 @@
+"""
+Services
+حاوية خدمات كسولة: المحركات الثقيلة (sklearn وxgboost وlightgbm ومكتبات المشاعر) لا تُستورد
+عند تحميل main بل عند أول استخدام أو في الإحماء الخلفي بعد بدء الخادم
+
+    simple_ai = services.register("simple_ai", "simple_ai", "simple_ai", warm_up="load_model")
+
+يُرجع وكيلاً يحل محل الكائن في الكود القائم: أول وصول لأي خاصية يستورد الوحدة،
+و bool(الوكيل) = نجح الاستيراد. حالة الخدمة (state) تُقرأ دون استيراد لنقاط الصحة.
+
+الاستيراد يستغرق ثواني فلا يحدث على حلقة الأحداث: ServicesReadyMiddleware يستورد خدمات
+المسار المعلقة في خيط قبل تمرير الطلب، فالوكلاء وفحوص XXX_AVAILABLE في المعالجات لا تستورد بنفسها.
+"""
+
+import asyncio
+import importlib
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class LazyService:
+    """خدمة واحدة: وحدة وكائن عام فيها ودالة تحميل النماذج (اختيارية)"""
+
+    def __init__(self, name: str, module: str, attribute: str, warm_up: str = None):
+        self.name = name
+        self.module = module
+        self.attribute = attribute
+        self.warm_up = warm_up
+        self.state = "pending"  # pending -> ready | failed، ثم warm بعد تحميل النماذج
+        self.error: Optional[str] = None
+        self.import_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+        self.proxy = ServiceProxy(self)
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """الكائن (يستورد الوحدة عند أول طلب) - None إذا فشل الاستيراد"""
+        if self.state == "pending":
+            with self._lock:
+                if self.state == "pending":
+                    self._import()
+        return self._instance
+
+    def _import(self):
+        start = time.perf_counter()
+        try:
+            self._instance = getattr(importlib.import_module(self.module), self.attribute)
+            self.state = "ready"
+            print(f"✅ {self.name} loaded ({time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"❌ {self.name} failed to load: {e}")
+        self.import_seconds = round(time.perf_counter() - start, 3)
+
+    async def get_async(self) -> Any:
+        """مثل get لكن الاستيراد في خيط - لا يحجز حلقة الأحداث"""
+        if self.state == "pending":
+            await asyncio.to_thread(self.get)
+        return self._instance
+
+    def peek(self) -> Any:
+        """الكائن إن كان مستورداً - لا يستورد"""
+        return self._instance
+
+    def record_warm_up(self, seconds: float):
+        self.warm_up_seconds = round(seconds, 3)
+        self.state = "warm"
+
+    @property
+    def available(self) -> bool:
+        """لم يفشل الاستيراد (الخدمة التي لم تُستورد بعد تُعد متاحة) - لا يستورد"""
+        return self.state != "failed"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "import_seconds": self.import_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "error": self.error
+        }
+
+
+class ServiceProxy:
+    """وكيل الخدمة في الكود القائم - يمرر الخصائص للكائن الحقيقي"""
+
+    def __init__(self, service: LazyService):
+        object.__setattr__(self, "_service", service)
+
+    def _require(self):
+        instance = self._service.get()
+        if instance is None:
+            raise AttributeError(f"service {self._service.name} is not available: {self._service.error}")
+        return instance
+
+    def __getattr__(self, name: str):
+        return getattr(self._require(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._require(), name, value)
+
+    def __bool__(self) -> bool:
+        return self._service.get() is not None
+
+    @property
+    def __class__(self):
+        # اسم المحرك في المقاييس وisinstance يريان صنف الكائن الحقيقي
+        instance = self._service.get()
+        return type(instance) if instance is not None else ServiceProxy
+
+    def __repr__(self) -> str:
+        return f"<ServiceProxy {self._service.name} ({self._service.state})>"
+
+
+class ServiceFlag:
+    """بديل XXX_AVAILABLE: صحيح إذا نجح استيراد الخدمة (يستورد عند أول فحص خارج طلبات HTTP)"""
+
+    def __init__(self, service: LazyService):
+        self._service = service
+
+    def __bool__(self) -> bool:
+        return self._service.get() is not None
+
+
+class ServiceContainer:
+    def __init__(self):
+        self._services: Dict[str, LazyService] = {}
+
+    def register(self, name: str, module: str, attribute: str, warm_up: str = None) -> ServiceProxy:
+        service = LazyService(name, module, attribute, warm_up)
+        self._services[name] = service
+        return service.proxy
+
+    def flag(self, name: str) -> ServiceFlag:
+        return ServiceFlag(self._services[name])
+
+    def __getitem__(self, name: str) -> LazyService:
+        return self._services[name]
+
+    def for_engine(self, engine) -> Optional[LazyService]:
+        """الخدمة التي يمثلها الوكيل - None لغير الخدمات"""
+        return next((service for service in self._services.values() if service.proxy is engine), None)
+
+    def __iter__(self) -> Iterator[LazyService]:
+        return iter(list(self._services.values()))
+
+    def pending(self) -> bool:
+        return any(service.state == "pending" for service in self._services.values())
+
+    async def load_pending(self, names: Tuple[str, ...] = None):
+        """استيراد الخدمات المعلقة (كلها أو names فقط) في خيوط - بالترتيب كما في الإحماء"""
+        for service in self:
+            if names is None or service.name in names:
+                await service.get_async()
+
+    def states(self) -> Dict[str, str]:
+        return {name: service.state for name, service in self._services.items()}
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: service.status() for name, service in self._services.items()}
+
+
+class ServicesReadyMiddleware:
+    """
+    ينتظر استيراد خدمات المسار المعلقة (في خيط) قبل الطلب - لا يؤخر شيئاً بعد انتهاء الإحماء
+    routes: (بادئة المسار، أسماء الخدمات) - أول بادئة مطابقة تحدد ما ينتظره الطلب،
+    والمسارات غير المدرجة (السعر والصحة والمقاييس) لا تنتظر المحركات
+    """
+
+    def __init__(self, app, container: ServiceContainer, routes: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()):
+        self.app = app
+        self.container = container
+        self.routes = routes
+
+    def services_for(self, path: str) -> Tuple[str, ...]:
+        return next((names for prefix, names in self.routes if path.startswith(prefix)), ())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self.container.pending():
+            names = self.services_for(scope["path"])
+            if names:
+                await self.container.load_pending(names)
+        await self.app(scope, receive, send)
+
+
+# إنشاء مثيل عام
+services = ServiceContainer()
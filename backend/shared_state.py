@@ -0,0 +1,332 @@
+"""
+Shared State
+الحالة المتغيرة المشتركة بين العمال (عدة عمال uvicorn أو عدة نسخ من الخادم)
+
+    STATE_BACKEND=memory : ذاكرة العملية (الافتراضي - عامل واحد والاختبارات)
+    STATE_BACKEND=redis  : Redis في REDIS_URL - مطلوب عند تشغيل أكثر من عامل
+
+    shared_state.namespace("sentiment", ttl=300)   : قاموس مشترك بانتهاء صلاحية
+    shared_state.lock("training:simple_ai", ttl)   : قفل بين العمال (يُحرر بتوكن صاحبه فقط)
+    shared_state.claim_period("auto_trading", 3600): أول عامل في الفترة ينفذ المهمة الدورية
+    model_registry                                 : إصدار النماذج الحية - من يدرب ينشر والباقون يعيدون التحميل
+
+القيم تُخزن JSON (fast_json) في كلا التنفيذين حتى يتطابق سلوك الاختبارات مع Redis.
+تعطل المخزن لا يوقف الخدمة: القراءة تُرجع القيمة الافتراضية والأقفال تُمنح محلياً مع تحذير.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import fast_json
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "state:")
+MODEL_SYNC_INTERVAL = float(os.getenv("MODEL_SYNC_INTERVAL", 5))
+
+# معرف هذا العامل في الأقفال وسجل النماذج
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_MISSING = object()
+
+
+class StateBackend:
+    """واجهة المخزن - المفاتيح نصوص والقيم bytes و ttl بالثواني"""
+
+    name = "base"
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        raise NotImplementedError
+
+    def ping(self) -> bool:
+        return True
+
+
+class MemoryStateBackend(StateBackend):
+    """مخزن داخل العملية - لا يُشارك بين العمال"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, self._expiry(ttl))
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, self._expiry(ttl))
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            del self._data[key]
+            return True
+
+
+class RedisStateBackend(StateBackend):
+    """مخزن Redis - الاتصال عند أول أمر لا عند الإنشاء"""
+
+    name = "redis"
+
+    # حذف القفل فقط إذا كان ما زال لصاحب التوكن (لم تنته صلاحيته ويأخذه عامل آخر)
+    _DELETE_IF_EQUALS = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._delete_if_equals = self.client.register_script(self._DELETE_IF_EQUALS)
+
+    @staticmethod
+    def _px(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self.client.set(key, value, px=self._px(ttl))
+
+    def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self.client.set(key, value, px=self._px(ttl), nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        return bool(self._delete_if_equals(keys=[key], args=[value]))
+
+    def ping(self) -> bool:
+        return bool(self.client.ping())
+
+
+def create_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    if kind == "redis":
+        return RedisStateBackend(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+    if kind != "memory":
+        print(f"⚠️ Unknown STATE_BACKEND {kind!r} - using memory")
+    return MemoryStateBackend()
+
+
+class StateNamespace:
+    """
+    قاموس مشترك تحت بادئة - بديل القواميس العامة في المحركات
+    كل عملية رحلة إلى المخزن: استخدم get() مرة واحدة بدل `in` ثم [] (قد تنتهي الصلاحية بينهما)،
+    ولا تقرأ بعد الكتابة - الكتابة تُهمل بصمت إذا تعطل المخزن
+    """
+
+    def __init__(self, state: "SharedState", prefix: str, ttl: Optional[float] = None):
+        self._state = state
+        self._prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key: Any) -> str:
+        return f"{self._prefix}:{key}"
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self._state.get(self._key(key), default)
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._state.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any):
+        self._state.set(self._key(key), value, self.ttl)
+
+    def __delitem__(self, key: Any):
+        self._state.delete(self._key(key))
+
+    def __contains__(self, key: Any) -> bool:
+        return self._state.get(self._key(key), _MISSING) is not _MISSING
+
+
+class SharedState:
+    """واجهة الحالة المشتركة فوق المخزن المختار"""
+
+    def __init__(self, backend: StateBackend):
+        self.backend = backend
+
+    def configure(self, backend: StateBackend):
+        """تبديل المخزن (الاختبارات أو الإعداد من main)"""
+        self.backend = backend
+
+    @property
+    def backend_name(self) -> str:
+        return self.backend.name
+
+    @property
+    def shared(self) -> bool:
+        """هل يرى العمال الآخرون هذه الحالة"""
+        return self.backend.name != "memory"
+
+    def _key(self, key: str) -> str:
+        return f"{STATE_KEY_PREFIX}{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            raw = self.backend.get(self._key(key))
+        except Exception as e:
+            print(f"⚠️ Shared state read failed ({key}): {e}")
+            return default
+        return default if raw is None else fast_json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self.backend.set(self._key(key), fast_json.dumps(value), ttl)
+        except Exception as e:
+            print(f"⚠️ Shared state write failed ({key}): {e}")
+
+    def delete(self, key: str):
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            print(f"⚠️ Shared state delete failed ({key}): {e}")
+
+    def namespace(self, prefix: str, ttl: Optional[float] = None) -> StateNamespace:
+        return StateNamespace(self, prefix, ttl)
+
+    @contextmanager
+    def lock(self, name: str, ttl: float) -> Iterator[bool]:
+        """
+        قفل بين العمال لا ينتظر: يُرجع False إذا كان عند عامل آخر
+        ttl حد أقصى لعمر القفل حتى لا يبقى محجوزاً إذا مات صاحبه
+        """
+        key = self._key(f"locks:{name}")
+        token = f"{WORKER_ID}:{uuid.uuid4().hex}".encode()
+        try:
+            acquired = self.backend.set_if_absent(key, token, ttl)
+        except Exception as e:
+            print(f"⚠️ Shared lock {name} unavailable, continuing without it: {e}")
+            yield True
+            return
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    self.backend.delete_if_equals(key, token)
+                except Exception as e:
+                    print(f"⚠️ Shared lock {name} release failed (expires in {ttl:.0f}s): {e}")
+
+    def lock_owner(self, name: str) -> Optional[str]:
+        """العامل الذي يحمل القفل حالياً"""
+        try:
+            raw = self.backend.get(self._key(f"locks:{name}"))
+        except Exception:
+            return None
+        return raw.decode().rsplit(":", 1)[0] if raw else None
+
+    def claim_period(self, job: str, period: float) -> bool:
+        """مهمة دورية: True لأول عامل يطالب بالفترة الحالية فقط - ولا يُحرر فتبقى الفترة مُنفذة"""
+        slot = int(time.time() // period)
+        try:
+            return self.backend.set_if_absent(self._key(f"jobs:{job}:{slot}"), WORKER_ID.encode(), period * 2)
+        except Exception as e:
+            print(f"⚠️ Job claim {job} unavailable, running locally: {e}")
+            return True
+
+    def ping(self) -> bool:
+        try:
+            return self.backend.ping()
+        except Exception as e:
+            print(f"⚠️ Shared state ping failed: {e}")
+            return False
+
+
+class ModelRegistry:
+    """
+    إصدار النماذج الحية لكل محرك - ملفات النماذج نفسها في مجلد النماذج المشترك
+    العامل الذي يدرب أو يرقي ينشر الإصدار، والعمال الآخرون يقارنونه بما حملوه قبل التنبؤ
+    """
+
+    def __init__(self, state: SharedState, check_interval: float = MODEL_SYNC_INTERVAL):
+        self.state = state
+        self.check_interval = check_interval
+        self._last_checked: Dict[str, float] = {}
+
+    def publish(self, name: str, version: Optional[str]):
+        if not version:
+            return
+        current = self.published(name)
+        if current and current.get("model_version") == version:
+            return
+        self.state.set(f"models:{name}", {
+            "model_version": version,
+            "worker": WORKER_ID,
+            "published_at": datetime.now().isoformat()
+        })
+
+    def published(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.state.get(f"models:{name}")
+
+    def newer_version(self, name: str, local_version: Optional[str]) -> Optional[str]:
+        """الإصدار المنشور إذا اختلف عن المحمل محلياً - يُسأل المخزن مرة كل check_interval ثانية"""
+        if not self.state.shared:
+            return None
+        now = time.monotonic()
+        if now - self._last_checked.get(name, float("-inf")) < self.check_interval:
+            return None
+        self._last_checked[name] = now
+
+        record = self.published(name)
+        version = record.get("model_version") if record else None
+        return version if version and version != local_version else None
+
+
+# إنشاء مثيل عام
+shared_state = SharedState(create_backend())
+model_registry = ModelRegistry(shared_state)
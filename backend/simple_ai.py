@@ -2,18 +2,27 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import joblib
 import os
+import time
+from walk_forward import PurgedWalkForwardSplit, chronological_train_test_split, walk_forward_cross_validate
+from labeling import fixed_threshold_labels
 
 class SimpleAI:
+    FEATURE_COLUMNS = [
+        'ma5', 'ma10', 'ma20', 'price_change_1', 'price_change_5', 'price_change_10',
+        'rsi', 'momentum_5', 'momentum_10', 'volatility_5', 'volatility_10',
+        'price_above_ma5', 'price_above_ma10', 'price_above_ma20'
+    ]
+
     def __init__(self):
         self.model = RandomForestClassifier(n_estimators=50, random_state=42, max_depth=10)
         self.scaler = StandardScaler()
         self.is_trained = False
         self.model_path = "/app/models/"
+        self.model_version = None  # توقيت ملف النموذج - يدخل في مفاتيح التخزين المؤقت
         
         # إنشاء مجلد النماذج
         if not os.path.exists(self.model_path):
@@ -72,48 +81,69 @@ class SimpleAI:
         """
         تحضير البيانات للتدريب
         """
-        if len(prices) < 50:
+        dataset = self.build_training_dataset(prices, prediction_hours)
+        if dataset is None:
             return None, None
+        return dataset["X"], dataset["y"]
+    
+    def build_training_dataset(self, prices: List[float], prediction_hours: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        الميزات والأهداف مع موقع كل صف في الأسعار - الصيغة المحفوظة في لقطات التدريب
+        """
+        if len(prices) < 50:
+            return None
         
         # إنشاء الميزات
         features_df = self.create_features(prices)
         
         # الميزات للتدريب
-        feature_columns = [
-            'ma5', 'ma10', 'ma20', 'price_change_1', 'price_change_5', 'price_change_10',
-            'rsi', 'momentum_5', 'momentum_10', 'volatility_5', 'volatility_10',
-            'price_above_ma5', 'price_above_ma10', 'price_above_ma20'
-        ]
-        
-        X = features_df[feature_columns].values
+        X = features_df[self.FEATURE_COLUMNS].values
         
         # الهدف: هل السعر سيرتفع أم ينخفض؟
-        future_prices = pd.Series(prices).shift(-prediction_hours)
-        current_prices = pd.Series(prices)
-        y = (future_prices > current_prices).astype(int).values
+        y = fixed_threshold_labels(prices, horizon=prediction_hours, up_threshold=0.0, pad=0)
         
         # إزالة القيم المفقودة
         valid_indices = ~(np.isnan(y) | np.isnan(X).any(axis=1))
-        X = X[valid_indices]
-        y = y[valid_indices]
         
-        return X, y
+        return {
+            "X": X[valid_indices],
+            "y": y[valid_indices],
+            "row_index": np.flatnonzero(valid_indices),
+            "feature_columns": list(self.FEATURE_COLUMNS)
+        }
     
-    def train(self, prices: List[float]) -> Dict[str, Any]:
+    def train(self, prices: List[float], cv_folds: int = 0, dataset: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         تدريب النموذج
+        cv_folds: طيات التحقق الزمني (0 = بدون) - كل تحقق يشغل مجمع عمليات spawn جديداً فهو اختياري
+        dataset: بيانات جاهزة (من build_training_dataset أو لقطة تدريب) بدلاً من حسابها من الأسعار
         """
         try:
-            X, y = self.prepare_training_data(prices)
+            prediction_hours = 1
+            if dataset is None:
+                dataset = self.build_training_dataset(prices, prediction_hours)
+            X, y = (dataset["X"], dataset["y"]) if dataset and "X" in dataset else (None, None)
             
             if X is None or len(X) < 30:
                 return {"error": "البيانات غير كافية للتدريب - يحتاج 50 نقطة على الأقل"}
             
-            # تقسيم البيانات
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=y
+            # تقسيم زمني: الاختبار هو الفترة الأخيرة مع حذف الصفوف المتداخلة مع أهدافها
+            X_train, X_test, y_train, y_test = chronological_train_test_split(
+                X, y, test_size=0.2, purge=prediction_hours
             )
             
+            # تحقق متقاطع زمني على بيانات التدريب
+            walk_forward_cv = {}
+            if cv_folds > 0:
+                try:
+                    walk_forward_cv = walk_forward_cross_validate(
+                        self.model, X_train, y_train,
+                        PurgedWalkForwardSplit(n_splits=cv_folds, purge=prediction_hours),
+                        scaler=StandardScaler()
+                    )
+                except ValueError as e:
+                    walk_forward_cv = {"error": str(e)}
+            
             # تطبيع البيانات
             X_train_scaled = self.scaler.fit_transform(X_train)
             X_test_scaled = self.scaler.transform(X_test)
@@ -139,7 +169,8 @@ class SimpleAI:
                 "train_accuracy": round(train_accuracy * 100, 2),
                 "test_accuracy": round(test_accuracy * 100, 2),
                 "model_performance": "جيد" if test_accuracy > 0.55 else "متوسط" if test_accuracy > 0.52 else "ضعيف",
-                "interpretation": self.interpret_performance(test_accuracy)
+                "interpretation": self.interpret_performance(test_accuracy),
+                "walk_forward_cv": walk_forward_cv
             }
             
         except Exception as e:
@@ -160,46 +191,88 @@ class SimpleAI:
             features_df = self.create_features(prices)
             
             # استخدام آخر نقطة للتنبؤ
-            feature_columns = [
-                'ma5', 'ma10', 'ma20', 'price_change_1', 'price_change_5', 'price_change_10',
-                'rsi', 'momentum_5', 'momentum_10', 'volatility_5', 'volatility_10',
-                'price_above_ma5', 'price_above_ma10', 'price_above_ma20'
-            ]
-            
-            X_current = features_df[feature_columns].iloc[-1:].values
+            X_current = features_df[self.FEATURE_COLUMNS].iloc[-1:].values
             X_current_scaled = self.scaler.transform(X_current)
             
-            # التنبؤ
-            prediction = self.model.predict(X_current_scaled)[0]
+            # التنبؤ - استدعاء واحد للاحتماليات والصنف من argmax
+            start = time.perf_counter()
             prediction_proba = self.model.predict_proba(X_current_scaled)[0]
+            prediction_time = (time.perf_counter() - start) * 1000
+            prediction = self.model.classes_[np.argmax(prediction_proba)]
             
-            up_probability = prediction_proba[1] * 100
-            down_probability = prediction_proba[0] * 100
-            confidence = max(up_probability, down_probability)
-            
-            # تحديد التوصية
-            if up_probability > 60:
-                recommendation = "BUY"
-            elif down_probability > 60:
-                recommendation = "SELL"
-            else:
-                recommendation = "HOLD"
-            
-            return {
-                "prediction": "UP" if prediction == 1 else "DOWN",
-                "probabilities": {
-                    "up": round(up_probability, 1),
-                    "down": round(down_probability, 1)
-                },
-                "confidence": round(confidence, 1),
-                "recommendation": recommendation,
-                "confidence_level": self.get_confidence_level(confidence),
-                "interpretation": self.interpret_prediction(recommendation, confidence)
-            }
+            result = self.format_prediction(prediction, prediction_proba)
+            result["prediction_times_ms"] = {"random_forest": round(prediction_time, 2)}
+            return result
             
         except Exception as e:
             return {"error": f"فشل التنبؤ: {str(e)}"}
     
+    def predict_batch(self, candles_by_symbol: Dict[str, List[Dict]]) -> Dict[str, Dict[str, Any]]:
+        """
+        التنبؤ لعدة عملات دفعة واحدة - مصفوفة ميزات واحدة واستدعاء واحد للنموذج
+        """
+        if not self.is_trained:
+            return {symbol: {"error": "النموذج غير مدرب"} for symbol in candles_by_symbol}
+        
+        results = {}
+        rows = []
+        row_symbols = []
+        
+        for symbol, candles in candles_by_symbol.items():
+            try:
+                prices = [float(candle['close']) for candle in candles or []]
+                if len(prices) < 30:
+                    results[symbol] = {"error": "يحتاج 30 نقطة على الأقل للتنبؤ"}
+                    continue
+                
+                features_df = self.create_features(prices)
+                rows.append(features_df[self.FEATURE_COLUMNS].iloc[-1].values)
+                row_symbols.append(symbol)
+            except Exception as e:
+                results[symbol] = {"error": f"فشل التنبؤ: {str(e)}"}
+        
+        if not rows:
+            return results
+        
+        try:
+            X_scaled = self.scaler.transform(np.vstack(rows))
+            probabilities = self.model.predict_proba(X_scaled)
+            predictions = self.model.classes_[np.argmax(probabilities, axis=1)]
+            
+            for i, symbol in enumerate(row_symbols):
+                results[symbol] = self.format_prediction(predictions[i], probabilities[i])
+        except Exception as e:
+            for symbol in row_symbols:
+                results[symbol] = {"error": f"فشل التنبؤ: {str(e)}"}
+        
+        return results
+    
+    def format_prediction(self, prediction: int, prediction_proba) -> Dict[str, Any]:
+        """بناء نتيجة التنبؤ من الصنف والاحتماليات"""
+        up_probability = prediction_proba[1] * 100
+        down_probability = prediction_proba[0] * 100
+        confidence = max(up_probability, down_probability)
+        
+        # تحديد التوصية
+        if up_probability > 60:
+            recommendation = "BUY"
+        elif down_probability > 60:
+            recommendation = "SELL"
+        else:
+            recommendation = "HOLD"
+        
+        return {
+            "prediction": "UP" if prediction == 1 else "DOWN",
+            "probabilities": {
+                "up": round(up_probability, 1),
+                "down": round(down_probability, 1)
+            },
+            "confidence": round(confidence, 1),
+            "recommendation": recommendation,
+            "confidence_level": self.get_confidence_level(confidence),
+            "interpretation": self.interpret_prediction(recommendation, confidence)
+        }
+    
     def interpret_performance(self, accuracy: float) -> str:
         """تفسير أداء النموذج"""
         if accuracy > 0.65:
@@ -240,6 +313,7 @@ class SimpleAI:
         try:
             joblib.dump(self.model, f"{self.model_path}simple_ai_model.pkl")
             joblib.dump(self.scaler, f"{self.model_path}simple_ai_scaler.pkl")
+            self.model_version = str(int(os.path.getmtime(f"{self.model_path}simple_ai_scaler.pkl")))
         except Exception as e:
             print(f"خطأ في حفظ النموذج: {e}")
     
@@ -249,6 +323,7 @@ class SimpleAI:
             if os.path.exists(f"{self.model_path}simple_ai_model.pkl"):
                 self.model = joblib.load(f"{self.model_path}simple_ai_model.pkl")
                 self.scaler = joblib.load(f"{self.model_path}simple_ai_scaler.pkl")
+                self.model_version = str(int(os.path.getmtime(f"{self.model_path}simple_ai_scaler.pkl")))
                 self.is_trained = True
                 return True
         except Exception as e:
@@ -0,0 +1,72 @@
+"""
+سجل التنبؤات مع عدة عمال: نسختان من PredictionLedger على نفس الملف تمثلان عاملين
+"""
+
+from prediction_ledger import OUTCOME_PENDING, ROLE_LIVE, PredictionLedger
+
+HOUR_MS = 3_600_000
+TARGET_CONFIG = {"method": "fixed", "horizon": 1}
+
+
+def make_klines(start_ms: int, closes):
+    return [
+        {"timestamp": start_ms + i * HOUR_MS, "close_time": start_ms + (i + 1) * HOUR_MS - 1, "close": close}
+        for i, close in enumerate(closes)
+    ]
+
+
+def record(ledger, symbol, candle_time, price=100.0, version="v1"):
+    return ledger.record(symbol, "1h", version, ROLE_LIVE, candle_time, price,
+                         prob_up=0.7, prediction=1, latency_ms=1.0, target_config=TARGET_CONFIG)
+
+
+def rows(ledger):
+    """صفوف العامل بعد مزامنته مع الملف"""
+    with ledger._locked():
+        return [(row["symbol"].decode(), int(row["outcome"])) for row in ledger._records[:ledger._size]]
+
+
+def test_resolve_keeps_rows_recorded_by_other_worker(tmp_path):
+    path = str(tmp_path / "ledger.bin")
+    worker_a, worker_b = PredictionLedger(path), PredictionLedger(path)
+    start = 1_600_000_000_000
+
+    assert record(worker_a, "BTCUSDT", start)
+    assert record(worker_b, "ETHUSDT", start)
+    assert worker_a.resolve("BTCUSDT", "1h", make_klines(start, [100.0, 105.0])) == 1
+
+    fresh = PredictionLedger(path)
+    assert fresh.pending_symbols() == [("ETHUSDT", "1h")]
+    assert rows(fresh) == [("BTCUSDT", 1), ("ETHUSDT", OUTCOME_PENDING)]
+    # العامل الآخر يرى الحل دون إعادة تشغيل
+    assert rows(worker_b) == [("BTCUSDT", 1), ("ETHUSDT", OUTCOME_PENDING)]
+    assert worker_b.report()["versions"]["v1"]["scored"] == 1
+
+
+def test_duplicate_from_other_worker_is_skipped(tmp_path):
+    path = str(tmp_path / "ledger.bin")
+    worker_a, worker_b = PredictionLedger(path), PredictionLedger(path)
+
+    assert record(worker_a, "BTCUSDT", 1_600_000_000_000)
+    assert not record(worker_b, "BTCUSDT", 1_600_000_000_000)
+    assert PredictionLedger(path).report()["versions"]["v1"]["predictions"] == 1
+
+
+def test_compaction_keeps_other_worker_rows(tmp_path):
+    path = str(tmp_path / "ledger.bin")
+    worker_a, worker_b = PredictionLedger(path, max_records=4), PredictionLedger(path, max_records=4)
+    start = 1_600_000_000_000
+
+    assert record(worker_b, "ETHUSDT", start)
+    for i in range(4):
+        assert record(worker_a, "BTCUSDT", start + i * HOUR_MS)
+    # الصف الخامس يتجاوز الحد فيضغط العامل A الملف
+    assert record(worker_a, "BTCUSDT", start + 4 * HOUR_MS)
+
+    for ledger in (worker_b, PredictionLedger(path)):
+        symbols = [symbol for symbol, _ in rows(ledger)]
+        assert symbols.count("ETHUSDT") == 1
+        assert symbols.count("BTCUSDT") == 5
+
+    assert record(worker_b, "ETHUSDT", start + HOUR_MS)
+    assert PredictionLedger(path).report()["versions"]["v1"]["predictions"] == 7
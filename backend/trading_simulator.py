@@ -5,14 +5,25 @@ from datetime import datetime, timedelta
 from enum import Enum
 import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine, Column, String, Float, DateTime, Boolean, Text, Integer
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from binance_client import BinanceClient, extract_close_prices
 from advanced_ai import advanced_ai
 from simple_ai import simple_ai
 from indicators import comprehensive_analysis
 
+try:
+    from price_forecaster import price_forecaster
+    FORECASTER_AVAILABLE = True
+except Exception:
+    price_forecaster = None
+    FORECASTER_AVAILABLE = False
+
+# طلبات الشموع المتزامنة عند جلب عدة عملات (طلبات HTTP تنتظر الشبكة)
+KLINES_FETCH_WORKERS = 8
+
 Base = declarative_base()
 
 class TradeType(Enum):
@@ -63,8 +74,8 @@ class TradingSimulator:
     def __init__(self, database_url: str):
         self.engine = create_engine(database_url)
         Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # جلسة لكل خيط - جلسة واحدة مشتركة بين خيوط المجمعات غير آمنة وتحتفظ بصفوف قديمة
+        self.session = scoped_session(sessionmaker(bind=self.engine))
         self.binance_client = BinanceClient()
         
         # إعدادات التداول
@@ -72,6 +83,10 @@ class TradingSimulator:
         self.min_trade_amount = 10.0  # أقل مبلغ تداول
         self.max_position_percentage = 0.95  # أقصى نسبة من الرصيد للاستثمار
         
+        # تحديد الحجم بتوقع العائد (P10/P50/P90) عند توفر نموذج التوقع
+        self.forecast_horizon = 24  # شموع ساعة
+        self.max_loss_per_trade = {"LOW": 0.01, "MEDIUM": 0.02, "HIGH": 0.03}  # خسارة P10 كنسبة من الرصيد
+        
     def create_portfolio(self, user_id: str, symbol: str, initial_balance: float, 
                         strategy: str = "AI_HYBRID", risk_level: str = "MEDIUM") -> Dict[str, Any]:
         """
@@ -166,11 +181,126 @@ class TradingSimulator:
             final_signal['current_price'] = current_price
             final_signal['timestamp'] = datetime.now().isoformat()
             
+            forecast = self.get_forecasts({symbol: klines_data}).get(symbol)
+            if forecast:
+                final_signal['forecast'] = forecast
+            
             return final_signal
             
         except Exception as e:
             return {"error": f"فشل في الحصول على الإشارة: {str(e)}"}
     
+    def get_trading_signals_batch(self, symbols: List[str], strategy: str = "AI_HYBRID") -> Dict[str, Dict[str, Any]]:
+        """
+        إشارات تداول لعدة عملات - نماذج الذكاء الصناعي تُستدعى مرة واحدة لجميع العملات
+        """
+        candles_by_symbol = {}
+        results = {}
+        
+        for symbol, klines_data in self.fetch_klines_batch(symbols).items():
+            if klines_data:
+                candles_by_symbol[symbol] = klines_data
+            else:
+                results[symbol] = {"error": "فشل في جلب البيانات"}
+        
+        if not candles_by_symbol:
+            return results
+        
+        simple_results = {}
+        if strategy in ["SIMPLE_AI", "AI_HYBRID"] and (simple_ai.is_trained or simple_ai.load_model()):
+            simple_results = simple_ai.predict_batch(candles_by_symbol)
+        
+        advanced_results = {}
+        if strategy in ["ADVANCED_AI", "AI_HYBRID"] and (advanced_ai.is_trained or advanced_ai.load_ensemble()):
+            advanced_results = advanced_ai.predict_batch(candles_by_symbol)
+        
+        forecasts = self.get_forecasts(candles_by_symbol)
+        
+        for symbol, klines_data in candles_by_symbol.items():
+            try:
+                signals = {}
+                
+                # التحليل الفني
+                if strategy in ["TECHNICAL", "AI_HYBRID"]:
+                    tech_analysis = comprehensive_analysis(extract_close_prices(klines_data))
+                    signals['technical'] = {
+                        'recommendation': tech_analysis.get('overall_recommendation', 'HOLD'),
+                        'confidence': tech_analysis.get('confidence', 50),
+                        'source': 'TECHNICAL'
+                    }
+                
+                simple_result = simple_results.get(symbol, {"error": "غير متاح"})
+                if 'error' not in simple_result:
+                    signals['simple_ai'] = {
+                        'recommendation': simple_result.get('recommendation', 'HOLD'),
+                        'confidence': simple_result.get('confidence', 50),
+                        'source': 'SIMPLE_AI'
+                    }
+                
+                advanced_result = advanced_results.get(symbol, {"error": "غير متاح"})
+                if 'error' not in advanced_result and 'ensemble_prediction' in advanced_result:
+                    ensemble = advanced_result['ensemble_prediction']
+                    signals['advanced_ai'] = {
+                        'recommendation': ensemble.get('recommendation', 'HOLD'),
+                        'confidence': ensemble.get('confidence', 50),
+                        'source': 'ADVANCED_AI'
+                    }
+                
+                final_signal = self.combine_trading_signals(signals, strategy)
+                final_signal['current_price'] = klines_data[-1]['close']
+                final_signal['timestamp'] = datetime.now().isoformat()
+                if symbol in forecasts:
+                    final_signal['forecast'] = forecasts[symbol]
+                results[symbol] = final_signal
+                
+            except Exception as e:
+                results[symbol] = {"error": f"فشل في الحصول على الإشارة: {str(e)}"}
+        
+        return results
+    
+    def fetch_klines_batch(self, symbols: List[str], interval: str = "1h", limit: int = 200) -> Dict[str, Optional[List[Dict]]]:
+        """
+        جلب شموع عدة عملات بالتوازي - None للعملة التي فشل جلبها
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        
+        def fetch(symbol: str) -> Optional[List[Dict]]:
+            try:
+                return self.binance_client.get_klines(symbol, interval, limit)
+            except Exception as e:
+                print(f"⚠️ فشل جلب شموع {symbol}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=min(KLINES_FETCH_WORKERS, len(symbols)),
+                                thread_name_prefix="klines") as pool:
+            return dict(zip(symbols, pool.map(fetch, symbols)))
+    
+    def get_forecasts(self, candles_by_symbol: Dict[str, List[Dict]]) -> Dict[str, Dict[str, Any]]:
+        """
+        توقع العائد عند أفق التداول لعدة عملات دفعة واحدة - فارغ إذا لم يكن نموذج التوقع مدرباً
+        """
+        if not FORECASTER_AVAILABLE:
+            return {}
+        try:
+            forecasts = {}
+            for symbol, result in price_forecaster.predict_batch(candles_by_symbol).items():
+                horizon = result.get('horizons', {}).get(str(self.forecast_horizon))
+                if horizon:
+                    forecasts[symbol] = {
+                        'horizon': self.forecast_horizon,
+                        'expected_return': horizon['p50'],
+                        'p10': horizon['p10'],
+                        'p90': horizon['p90'],
+                        'dispersion': horizon['dispersion'],
+                        'model_version': result.get('model_version')
+                    }
+            return forecasts
+        except Exception as e:
+            print(f"فشل توقع العائد: {e}")
+            return {}
+    
     def combine_trading_signals(self, signals: Dict, strategy: str) -> Dict[str, Any]:
         """
         دمج إشارات التداول المختلفة
@@ -242,7 +372,8 @@ class TradingSimulator:
         تنفيذ صفقة تداول
         """
         try:
-            portfolio = self.session.query(Portfolio).filter_by(id=portfolio_id).first()
+            # قفل صف المحفظة حتى نهاية الصفقة - عاملان لا يتداولان على نفس الرصيد معاً
+            portfolio = self.session.query(Portfolio).filter_by(id=portfolio_id).with_for_update().first()
             if not portfolio:
                 return {"error": "المحفظة غير موجودة"}
             
@@ -253,10 +384,17 @@ class TradingSimulator:
             current_price = signal['current_price']
             confidence = signal['confidence']
             
-            # تحديد حجم التداول بناءً على الثقة ومستوى المخاطر
-            trade_size_percentage = self.calculate_trade_size(confidence, portfolio.risk_level)
+            # تحديد حجم التداول بناءً على توقع العائد إن وجد، وإلا الثقة ومستوى المخاطر
+            trade_size_percentage = self.calculate_trade_size(confidence, portfolio.risk_level, signal.get('forecast'))
             
-            if action == 'BUY':
+            if action == 'BUY' and trade_size_percentage <= 0:
+                return {
+                    "action": "HOLD",
+                    "message": "لا توجد صفقة - العائد المتوقع لا يبرر المخاطرة",
+                    "reason": signal.get('reasoning', ''),
+                    "forecast": signal.get('forecast')
+                }
+            elif action == 'BUY':
                 return self.execute_buy_order(portfolio, current_price, trade_size_percentage, signal)
             elif action == 'SELL':
                 return self.execute_sell_order(portfolio, current_price, signal)
@@ -270,6 +408,9 @@ class TradingSimulator:
         except Exception as e:
             self.session.rollback()
             return {"error": f"فشل في تنفيذ الصفقة: {str(e)}"}
+        finally:
+            # مسارات الانتظار لا تنهي المعاملة - تحرير قفل الصف (بعد commit لا أثر له)
+            self.session.rollback()
     
     def execute_buy_order(self, portfolio: Portfolio, price: float, size_percentage: float, signal: Dict) -> Dict[str, Any]:
         """
@@ -393,10 +534,14 @@ class TradingSimulator:
             "profit_status": "ربح" if profit_loss > 0 else "خسارة" if profit_loss < 0 else "تعادل"
         }
     
-    def calculate_trade_size(self, confidence: float, risk_level: str) -> float:
+    def calculate_trade_size(self, confidence: float, risk_level: str, forecast: Dict = None) -> float:
         """
         حساب حجم التداول بناءً على الثقة ومستوى المخاطر
+        مع forecast: الحجم من العائد المتوقع وتشتته بدلاً من الثقة
         """
+        if forecast:
+            return self.calculate_forecast_trade_size(forecast, risk_level)
+        
         base_sizes = {
             "LOW": 0.1,    # 10% من الرصيد
             "MEDIUM": 0.2, # 20% من الرصيد
@@ -412,6 +557,27 @@ class TradingSimulator:
         # حدود الأمان
         return min(max(adjusted_size, 0.05), self.max_position_percentage)
     
+    def calculate_forecast_trade_size(self, forecast: Dict, risk_level: str) -> float:
+        """
+        حجم الصفقة من توقع العائد:
+        - العائد المتوقع (P50) مقسوماً على التشتت (P90 - P10) يحدد نسبة الحجم الأساسي حتى ضعفه
+        - خسارة P10 على المركز لا تتجاوز ميزانية الخسارة لمستوى المخاطر
+        - صفر إذا كان العائد المتوقع غير موجب
+        """
+        base_sizes = {"LOW": 0.1, "MEDIUM": 0.2, "HIGH": 0.3}
+        expected_return = forecast.get('expected_return', 0)
+        if expected_return <= 0:
+            return 0.0
+        
+        edge = min(expected_return / max(forecast.get('dispersion', 0), 1e-6), 1.0)
+        size = base_sizes.get(risk_level, 0.2) * 2 * edge
+        
+        downside = -forecast.get('p10', 0)
+        if downside > 0:
+            size = min(size, self.max_loss_per_trade.get(risk_level, 0.02) / downside)
+        
+        return min(size, self.max_position_percentage)
+    
     def get_average_buy_price(self, portfolio_id: str) -> Optional[float]:
         """
         حساب متوسط سعر الشراء
@@ -515,9 +681,10 @@ class TradingSimulator:
         except Exception as e:
             return {"error": f"فشل في جلب التاريخ: {str(e)}"}
     
-    def auto_trade_cycle(self, portfolio_id: str) -> Dict[str, Any]:
+    def auto_trade_cycle(self, portfolio_id: str, signal: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         دورة تداول تلقائية
+        signal: إشارة محسوبة مسبقاً (دفعة المجدول لكل المحافظ) بدلاً من حسابها لهذه المحفظة
         """
         try:
             portfolio = self.session.query(Portfolio).filter_by(id=portfolio_id).first()
@@ -525,7 +692,8 @@ class TradingSimulator:
                 return {"error": "المحفظة غير متاحة للتداول التلقائي"}
             
             # الحصول على إشارة تداول
-            signal = self.get_trading_signal(portfolio.symbol, portfolio.trading_strategy)
+            if signal is None:
+                signal = self.get_trading_signal(portfolio.symbol, portfolio.trading_strategy)
             if 'error' in signal:
                 return signal
             
@@ -555,9 +723,11 @@ class TradingSimulator:
             
             suggestions = []
             
-            for symbol in popular_coins[:count * 2]:  # تحليل ضعف العدد المطلوب للاختيار
+            # تحليل ضعف العدد المطلوب للاختيار - دفعة واحدة
+            signals = self.get_trading_signals_batch(popular_coins[:count * 2], "AI_HYBRID")
+            
+            for symbol, signal in signals.items():
                 try:
-                    signal = self.get_trading_signal(symbol, "AI_HYBRID")
                     if 'error' not in signal:
                         suggestions.append({
                             "symbol": symbol,
@@ -0,0 +1,249 @@
+"""
+Training Dataset Snapshots
+لقطات بيانات التدريب بإصدارات على القرص
+
+كل لقطة تحفظ الشموع الخام ومصفوفة الميزات والأهداف وتوقيت كل صف وقائمة الميزات
+لمحرك واحد (simple / advanced / enhanced / backtest) لكل (عملة، فترة).
+المصفوفات بصيغة .npy فتُقرأ بـ mmap في أجزاء من الثانية بدون جلب بيانات أو
+إعادة حساب الميزات، وإعادة التدريب على نفس الإصدار تعطي نتائج قابلة للمقارنة.
+
+البنية: {root}/{SYMBOL}/{interval}/{engine}/{version}/
+    candles.npy  X.npy  y.npy  timestamps.npy  manifest.json
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# أعمدة الشموع المحفوظة - نفس مفاتيح binance_client.get_klines
+CANDLE_FIELDS = ("timestamp", "open", "high", "low", "close", "volume", "close_time")
+CANDLE_DTYPE = np.dtype([
+    ("timestamp", "i8"), ("open", "f8"), ("high", "f8"), ("low", "f8"),
+    ("close", "f8"), ("volume", "f8"), ("close_time", "i8")
+])
+
+
+def candles_to_array(klines: List[Dict]) -> np.ndarray:
+    """تحويل الشموع إلى مصفوفة عمودية مهيكلة"""
+    return np.array([tuple(k[f] for f in CANDLE_FIELDS) for k in klines], dtype=CANDLE_DTYPE)
+
+
+def array_to_candles(candles: np.ndarray) -> List[Dict]:
+    """تحويل المصفوفة المهيكلة إلى قائمة شموع بصيغة binance_client"""
+    return [
+        {f: (int(row[f]) if CANDLE_DTYPE[f].kind == "i" else float(row[f])) for f in CANDLE_FIELDS}
+        for row in candles
+    ]
+
+
+def feature_version(feature_columns: List[str]) -> str:
+    """بصمة قائمة الميزات - تتغير عند تغيّر هندسة الميزات"""
+    return hashlib.sha1(",".join(feature_columns).encode()).hexdigest()[:12]
+
+
+class TrainingSnapshotStore:
+    """مخزن لقطات التدريب - الإصدار يُشتق من المحتوى فنفس البيانات لا تُكتب مرتين"""
+
+    def __init__(self, root: str = "/app/models/snapshots/", keep_versions: int = 10):
+        self.root = root
+        self.keep_versions = keep_versions
+
+    def snapshot_dir(self, symbol: str, interval: str, engine: str) -> str:
+        return os.path.join(self.root, symbol.upper(), interval, engine)
+
+    def save(self, symbol: str, interval: str, engine: str, klines: List[Dict],
+             X: np.ndarray = None, y: np.ndarray = None, row_index: np.ndarray = None,
+             feature_columns: List[str] = None, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        حفظ لقطة جديدة وإرجاع الـ manifest
+        row_index: موقع كل صف من X داخل الشموع (لحفظ توقيته)
+        X/y اختيارية - لقطة الباك تست تحفظ الشموع فقط
+        """
+        try:
+            candles = candles_to_array(klines)
+            arrays = {"candles": candles}
+            if X is not None:
+                arrays["X"] = np.ascontiguousarray(X, dtype=np.float64)
+                arrays["y"] = np.ascontiguousarray(y)
+                rows = np.arange(len(X)) if row_index is None else np.asarray(row_index)
+                arrays["timestamps"] = candles["timestamp"][rows]
+
+            digest = hashlib.sha1()
+            for name in sorted(arrays):
+                digest.update(name.encode())
+                digest.update(arrays[name].tobytes())
+            digest.update(",".join(feature_columns or []).encode())
+
+            last_time = datetime.fromtimestamp(int(candles["close_time"][-1]) / 1000, tz=timezone.utc)
+            version = f"{last_time.strftime('%Y%m%dT%H%M')}-{digest.hexdigest()[:8]}"
+
+            base = self.snapshot_dir(symbol, interval, engine)
+            path = os.path.join(base, version)
+            if os.path.exists(os.path.join(path, "manifest.json")):
+                self._set_latest(base, version)
+                return self._read_manifest(path)
+
+            manifest = {
+                "version": version,
+                "symbol": symbol.upper(),
+                "interval": interval,
+                "engine": engine,
+                "rows": int(len(arrays["X"])) if "X" in arrays else 0,
+                "candles": int(len(candles)),
+                "feature_count": len(feature_columns or []),
+                "feature_columns": list(feature_columns or []),
+                "feature_version": feature_version(feature_columns) if feature_columns else None,
+                "first_candle": int(candles["timestamp"][0]),
+                "last_candle": int(candles["timestamp"][-1]),
+                "content_hash": digest.hexdigest(),
+                "created_at": datetime.now().isoformat(),
+                "metadata": metadata or {}
+            }
+
+            # كتابة في مجلد مؤقت ثم إعادة تسمية - القارئ لا يرى لقطة ناقصة
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            os.makedirs(tmp_path, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), array, allow_pickle=False)
+            with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+            self._set_latest(base, version)
+            self._prune(base)
+            print(f"📦 لقطة تدريب {symbol.upper()}/{interval}/{engine}: {version} ({manifest['rows']} صف)")
+            return manifest
+
+        except Exception as e:
+            print(f"⚠️ فشل حفظ لقطة التدريب: {e}")
+            return {"error": str(e)}
+
+    def load(self, symbol: str, interval: str, engine: str, version: str = "latest",
+             mmap: bool = True) -> Optional[Dict[str, Any]]:
+        """تحميل لقطة (mmap افتراضياً) - None إن لم توجد"""
+        base = self.snapshot_dir(symbol, interval, engine)
+        if version == "latest":
+            version = self._get_latest(base)
+            if not version:
+                return None
+
+        if os.path.basename(version) != version:
+            return None
+
+        path = os.path.join(base, version)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            return None
+
+        mmap_mode = "r" if mmap else None
+        snapshot = {"manifest": self._read_manifest(path)}
+        for name in ("candles", "X", "y", "timestamps"):
+            array_path = os.path.join(path, f"{name}.npy")
+            if os.path.exists(array_path):
+                snapshot[name] = np.load(array_path, mmap_mode=mmap_mode, allow_pickle=False)
+        return snapshot
+
+    def load_dataset(self, symbol: str, interval: str, engine: str,
+                     version: str = "latest") -> Optional[Dict[str, Any]]:
+        """اللقطة بصيغة dataset التي تقبلها دوال التدريب في المحركات"""
+        snapshot = self.load(symbol, interval, engine, version)
+        if not snapshot or "X" not in snapshot:
+            return None
+        return {
+            "X": snapshot["X"],
+            "y": snapshot["y"],
+            "timestamps": snapshot["timestamps"],
+            "feature_columns": snapshot["manifest"]["feature_columns"],
+            "feature_time": 0.0,
+            "snapshot_version": snapshot["manifest"]["version"]
+        }
+
+    def save_artifact(self, symbol: str, interval: str, engine: str, version: str,
+                      name: str, data: Dict[str, Any]) -> bool:
+        """حفظ نتيجة مشتقة من اللقطة (مثل اختيار الميزات) بجانبها كـ JSON"""
+        path = os.path.join(self.snapshot_dir(symbol, interval, engine), version)
+        if os.path.basename(version) != version or not os.path.isdir(path):
+            return False
+        try:
+            tmp_file = os.path.join(path, f"{name}.json.tmp-{os.getpid()}")
+            with open(tmp_file, "w") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, os.path.join(path, f"{name}.json"))
+            return True
+        except Exception as e:
+            print(f"⚠️ فشل حفظ {name} للقطة {version}: {e}")
+            return False
+
+    def load_artifact(self, symbol: str, interval: str, engine: str, version: str,
+                      name: str) -> Optional[Dict[str, Any]]:
+        """قراءة نتيجة مشتقة محفوظة مع اللقطة - None إن لم توجد"""
+        if os.path.basename(version) != version:
+            return None
+        try:
+            with open(os.path.join(self.snapshot_dir(symbol, interval, engine), version, f"{name}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_snapshots(self, symbol: str, interval: str = None, engine: str = None) -> List[Dict[str, Any]]:
+        """قائمة الإصدارات (الأحدث أولاً) مع الـ manifest بدون المصفوفات"""
+        symbol_dir = os.path.join(self.root, symbol.upper())
+        if not os.path.isdir(symbol_dir):
+            return []
+
+        manifests = []
+        for interval_name in sorted(os.listdir(symbol_dir)):
+            if interval and interval_name != interval:
+                continue
+            interval_dir = os.path.join(symbol_dir, interval_name)
+            for engine_name in sorted(os.listdir(interval_dir)):
+                if engine and engine_name != engine:
+                    continue
+                for version in self._versions(os.path.join(interval_dir, engine_name)):
+                    manifest = self._read_manifest(os.path.join(interval_dir, engine_name, version))
+                    manifest.pop("feature_columns", None)
+                    manifests.append(manifest)
+
+        return sorted(manifests, key=lambda m: m.get("created_at", ""), reverse=True)
+
+    def _versions(self, base: str) -> List[str]:
+        if not os.path.isdir(base):
+            return []
+        return sorted(
+            name for name in os.listdir(base)
+            if os.path.exists(os.path.join(base, name, "manifest.json"))
+        )
+
+    def _read_manifest(self, path: str) -> Dict[str, Any]:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+
+    def _get_latest(self, base: str) -> Optional[str]:
+        try:
+            with open(os.path.join(base, "LATEST")) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _set_latest(self, base: str, version: str):
+        tmp_file = os.path.join(base, f"LATEST.tmp-{os.getpid()}")
+        with open(tmp_file, "w") as f:
+            f.write(version)
+        os.replace(tmp_file, os.path.join(base, "LATEST"))
+
+    def _prune(self, base: str):
+        """حذف الإصدارات الأقدم مع إبقاء آخر keep_versions"""
+        if not self.keep_versions:
+            return
+        latest = self._get_latest(base)
+        versions = [v for v in self._versions(base) if v != latest]
+        for version in versions[:max(0, len(versions) - (self.keep_versions - 1))]:
+            shutil.rmtree(os.path.join(base, version), ignore_errors=True)
+
+
+# إنشاء مثيل عام
+training_snapshots = TrainingSnapshotStore()
@@ -0,0 +1,455 @@
+"""
+Compiled Tree Ensemble Inference
+محرك استدلال مُجمّع لنماذج الأشجار
+
+يحوّل نماذج الأشجار المدربة (sklearn / XGBoost / LightGBM) إلى مصفوفات NumPy
+مسطحة (feature, threshold, left, right, value) ويقيّم جميع أشجار جميع النماذج
+في تمريرة واحدة بدلاً من استدعاء predict_proba لكل نموذج على حدة.
+"""
+
+import json
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+
+from sklearn.ensemble import (
+    RandomForestClassifier,
+    GradientBoostingClassifier,
+    ExtraTreesClassifier,
+    AdaBoostClassifier
+)
+
+try:
+    from xgboost import XGBClassifier
+
+    XGB_AVAILABLE = True
+except ImportError:
+    XGB_AVAILABLE = False
+
+try:
+    from lightgbm import LGBMClassifier
+
+    LGBM_AVAILABLE = True
+except ImportError:
+    LGBM_AVAILABLE = False
+
+
+class UnsupportedModelError(Exception):
+    """نموذج لا يمكن تحويله إلى مصفوفات أشجار"""
+
+
+class _TreeBuilder:
+    """تجميع عقد الأشجار في مصفوفات مسطحة مشتركة"""
+
+    def __init__(self):
+        self.feature = []
+        self.threshold = []
+        self.left = []
+        self.right = []
+        self.value = []
+        self.roots = []
+        self.depths = []
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def add_tree(self, feature, threshold, left, right, value, depth: int):
+        """إضافة شجرة واحدة (فهارس محلية) مع تحويلها لفهارس عامة"""
+        offset = sum(len(f) for f in self.feature)
+        feature = np.asarray(feature, dtype=np.int64)
+        threshold = np.asarray(threshold, dtype=np.float64)
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        value = np.asarray(value, dtype=np.float64).reshape(len(feature), 2)
+
+        # الأوراق تشير إلى نفسها وتمرر دائماً لليسار
+        local_ids = np.arange(len(feature), dtype=np.int64)
+        is_leaf = left < 0
+        feature = np.where(is_leaf, 0, feature)
+        threshold = np.where(is_leaf, np.inf, threshold)
+        left = np.where(is_leaf, local_ids, left) + offset
+        right = np.where(is_leaf, local_ids, right) + offset
+
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(left)
+        self.right.append(right)
+        self.value.append(value)
+        self.roots.append(offset)
+        self.depths.append(int(depth))
+
+    def build(self) -> Dict[str, np.ndarray]:
+        if not self.roots:
+            return {}
+        return {
+            'feature': np.concatenate(self.feature),
+            'threshold': np.concatenate(self.threshold),
+            'left': np.concatenate(self.left),
+            'right': np.concatenate(self.right),
+            'value': np.concatenate(self.value),
+            'roots': np.asarray(self.roots, dtype=np.int64),
+            'max_depth': max(self.depths)
+        }
+
+
+def _sklearn_tree_arrays(tree, feature_offset: int = 0) -> Tuple:
+    """استخراج مصفوفات شجرة sklearn"""
+    t = tree.tree_
+    left = t.children_left.astype(np.int64)
+    right = t.children_right.astype(np.int64)
+    feature = np.where(left < 0, 0, t.feature.astype(np.int64) + feature_offset)
+    return feature, t.threshold.astype(np.float64), left, right, int(t.max_depth)
+
+
+def _normalized_leaf_distribution(tree) -> np.ndarray:
+    """توزيع الأصناف في كل عقدة (مطبّع)"""
+    value = tree.tree_.value[:, 0, :].astype(np.float64)
+    totals = value.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    return value / totals
+
+
+def _raw_margin(model, X: np.ndarray) -> np.ndarray:
+    """الهامش الخام (قبل sigmoid) للنماذج التجميعية"""
+    if LGBM_AVAILABLE and isinstance(model, LGBMClassifier):
+        return np.asarray(model.predict(X, raw_score=True), dtype=np.float64).reshape(-1)
+    if XGB_AVAILABLE and isinstance(model, XGBClassifier):
+        return np.asarray(model.predict(X, output_margin=True), dtype=np.float64).reshape(-1)
+    if hasattr(model, 'decision_function'):
+        return np.asarray(model.decision_function(X), dtype=np.float64).reshape(-1)
+    proba = np.clip(model.predict_proba(X)[:, 1], 1e-12, 1 - 1e-12)
+    return np.log(proba / (1 - proba))
+
+
+class CompiledTreeEnsemble:
+    """
+    مجموعة أشجار مُجمّعة لعدة نماذج تُقيَّم في تمريرة واحدة
+
+    النماذج غير المدعومة (الشبكات العصبية، CatBoost، الانحدار اللوجستي) لا تُجمَّع
+    ويجب تقييمها بطريقتها الأصلية - انظر native_models.
+    """
+
+    def __init__(self, tolerance: float = 1e-6):
+        self.tolerance = tolerance
+        self.n_features = None
+        self.model_specs = {}
+        self.native_models = {}
+        self.compile_errors = {}
+        self.verification = {}
+        self._arrays = {}
+
+    # ============ التجميع ============
+    def compile(self, models: Dict[str, Any], n_features: int,
+                probe_X: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """تحويل النماذج المدربة إلى مصفوفات مسطحة والتحقق من تطابقها"""
+        self.n_features = int(n_features)
+        self.model_specs = {}
+        self.native_models = {}
+        self.compile_errors = {}
+        builder = _TreeBuilder()
+        pending_bias = {}
+
+        for name, model in models.items():
+            start_tree = builder.n_trees
+            try:
+                if not hasattr(model, 'classes_') or len(model.classes_) != 2:
+                    raise UnsupportedModelError("binary classifier required")
+
+                if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+                    spec = self._compile_forest(model, builder)
+                elif isinstance(model, GradientBoostingClassifier):
+                    spec = self._compile_sklearn_gb(model, builder)
+                    pending_bias[name] = model
+                elif isinstance(model, AdaBoostClassifier):
+                    spec = self._compile_adaboost(model, builder)
+                elif XGB_AVAILABLE and isinstance(model, XGBClassifier):
+                    spec = self._compile_xgboost(model, builder)
+                    pending_bias[name] = model
+                elif LGBM_AVAILABLE and isinstance(model, LGBMClassifier):
+                    spec = self._compile_lightgbm(model, builder)
+                    pending_bias[name] = model
+                else:
+                    raise UnsupportedModelError(type(model).__name__)
+
+                spec.update({'start': start_tree, 'end': builder.n_trees})
+                self.model_specs[name] = spec
+
+            except Exception as e:
+                # التراجع عن أي أشجار أُضيفت جزئياً
+                for attr in ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'depths'):
+                    del getattr(builder, attr)[start_tree:]
+                self.native_models[name] = model
+                self.compile_errors[name] = str(e)
+
+        self._arrays = builder.build()
+
+        # حساب الانحياز الأولي للنماذج التجميعية من مخرجات النموذج نفسه
+        if pending_bias:
+            zero_row = np.zeros((1, self.n_features))
+            leaf_values = self._leaf_values(zero_row)
+            for name, model in pending_bias.items():
+                if name not in self.model_specs:
+                    continue
+                spec = self.model_specs[name]
+                tree_sum = leaf_values[:, spec['start']:spec['end'], 1].sum(axis=1)
+                spec['bias'] = float(_raw_margin(model, zero_row)[0] - tree_sum[0])
+
+        if probe_X is None:
+            probe_X = np.random.default_rng(42).normal(size=(64, self.n_features))
+        self.verify(models, probe_X)
+
+        return self.get_info()
+
+    def _compile_forest(self, model, builder: _TreeBuilder) -> Dict:
+        for tree in model.estimators_:
+            feature, threshold, left, right, depth = _sklearn_tree_arrays(tree)
+            builder.add_tree(feature, threshold, left, right,
+                             _normalized_leaf_distribution(tree), depth)
+        return {'kind': 'mean', 'input': 'float32'}
+
+    def _compile_sklearn_gb(self, model, builder: _TreeBuilder) -> Dict:
+        if model.estimators_.shape[1] != 1:
+            raise UnsupportedModelError("multiclass gradient boosting")
+        for tree in model.estimators_[:, 0]:
+            feature, threshold, left, right, depth = _sklearn_tree_arrays(tree)
+            leaf = tree.tree_.value[:, 0, 0].astype(np.float64) * model.learning_rate
+            value = np.column_stack([np.zeros_like(leaf), leaf])
+            builder.add_tree(feature, threshold, left, right, value, depth)
+        return {'kind': 'additive', 'input': 'float32', 'bias': 0.0}
+
+    def _compile_adaboost(self, model, builder: _TreeBuilder) -> Dict:
+        n_estimators = len(model.estimators_)
+        weights = np.asarray(model.estimator_weights_[:n_estimators], dtype=np.float64)
+        total_weight = weights.sum()
+        if total_weight <= 0:
+            raise UnsupportedModelError("adaboost without positive weights")
+
+        algorithm = getattr(model, 'algorithm', 'SAMME')
+        n_classes = 2
+
+        for tree, weight in zip(model.estimators_, weights):
+            if not hasattr(tree, 'tree_'):
+                raise UnsupportedModelError("adaboost base estimator is not a tree")
+            feature, threshold, left, right, depth = _sklearn_tree_arrays(tree)
+            dist = _normalized_leaf_distribution(tree)
+
+            if algorithm == 'SAMME.R':
+                eps = np.finfo(dist.dtype).eps
+                log_proba = np.log(np.clip(dist, eps, None))
+                value = (n_classes - 1) * (log_proba - log_proba.mean(axis=1, keepdims=True))
+            else:
+                predicted = np.argmax(dist, axis=1)
+                value = np.full(dist.shape, -weight / (n_classes - 1))
+                value[np.arange(len(dist)), predicted] = weight
+
+            builder.add_tree(feature, threshold, left, right, value / total_weight, depth)
+
+        return {'kind': 'samme', 'input': 'float32', 'n_classes': n_classes}
+
+    def _compile_xgboost(self, model, builder: _TreeBuilder) -> Dict:
+        booster = model.get_booster()
+        feature_names = booster.feature_names or []
+        name_to_index = {n: i for i, n in enumerate(feature_names)}
+
+        for dump in booster.get_dump(dump_format='json'):
+            nodes = {}
+            stack = [(json.loads(dump), 0)]
+            max_depth = 0
+            while stack:
+                node, depth = stack.pop()
+                nodes[node['nodeid']] = node
+                max_depth = max(max_depth, depth)
+                for child in node.get('children', []):
+                    stack.append((child, depth + 1))
+
+            size = max(nodes) + 1
+            feature = np.zeros(size, dtype=np.int64)
+            threshold = np.zeros(size, dtype=np.float64)
+            left = np.full(size, -1, dtype=np.int64)
+            right = np.full(size, -1, dtype=np.int64)
+            value = np.zeros((size, 2), dtype=np.float64)
+
+            for node_id, node in nodes.items():
+                if 'leaf' in node:
+                    value[node_id, 1] = float(node['leaf'])
+                    continue
+                if 'split_condition' not in node or 'categories' in node:
+                    raise UnsupportedModelError("xgboost categorical split")
+                split = node['split']
+                feature[node_id] = name_to_index[split] if split in name_to_index else int(split[1:])
+                # XGBoost يستخدم x < t بدقة float32، أي x <= أكبر float32 أصغر من t
+                t = np.float32(node['split_condition'])
+                threshold[node_id] = float(np.nextafter(t, np.float32(-np.inf)))
+                left[node_id] = node['yes']
+                right[node_id] = node['no']
+
+            builder.add_tree(feature, threshold, left, right, value, max_depth)
+
+        return {'kind': 'additive', 'input': 'float32', 'bias': 0.0}
+
+    def _compile_lightgbm(self, model, builder: _TreeBuilder) -> Dict:
+        dump = model.booster_.dump_model()
+        if dump.get('average_output'):
+            raise UnsupportedModelError("lightgbm random forest mode")
+
+        for tree_info in dump['tree_info']:
+            features, thresholds, lefts, rights, values = [], [], [], [], []
+            max_depth = 0
+
+            def visit(node, depth):
+                nonlocal max_depth
+                node_id = len(features)
+                features.append(0)
+                thresholds.append(0.0)
+                lefts.append(-1)
+                rights.append(-1)
+                values.append(0.0)
+                max_depth = max(max_depth, depth)
+
+                if 'leaf_value' in node or 'split_feature' not in node:
+                    values[node_id] = float(node.get('leaf_value', 0.0))
+                    return node_id
+
+                if node.get('decision_type', '<=') != '<=':
+                    raise UnsupportedModelError("lightgbm categorical split")
+                if node.get('missing_type') == 'Zero':
+                    raise UnsupportedModelError("lightgbm zero-as-missing split")
+
+                # ميزات LightGBM تُقارن بدقة float64 - الإزاحة تختار العمود الثاني من X_aug
+                features[node_id] = int(node['split_feature']) + self.n_features
+                thresholds[node_id] = float(node['threshold'])
+                lefts[node_id] = visit(node['left_child'], depth + 1)
+                rights[node_id] = visit(node['right_child'], depth + 1)
+                return node_id
+
+            visit(tree_info['tree_structure'], 0)
+            value = np.column_stack([np.zeros(len(values)), np.asarray(values)])
+            builder.add_tree(features, thresholds, lefts, rights, value, max_depth)
+
+        return {'kind': 'additive', 'input': 'float64', 'bias': 0.0}
+
+    # ============ التقييم ============
+    @property
+    def is_ready(self) -> bool:
+        return bool(self.model_specs) and bool(self._arrays)
+
+    @property
+    def compiled_models(self) -> List[str]:
+        return list(self.model_specs.keys())
+
+    def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """تمرير جميع الصفوف عبر جميع الأشجار دفعة واحدة"""
+        X = np.asarray(X, dtype=np.float64)
+        # sklearn و XGBoost يقارنان بدقة float32 بينما LightGBM بدقة float64
+        X_aug = np.hstack([X.astype(np.float32).astype(np.float64), X])
+
+        arrays = self._arrays
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(arrays['roots'], (X.shape[0], len(arrays['roots']))).copy()
+
+        for _ in range(arrays['max_depth']):
+            go_left = X_aug[rows, arrays['feature'][node]] <= arrays['threshold'][node]
+            node = np.where(go_left, arrays['left'][node], arrays['right'][node])
+
+        return arrays['value'][node]
+
+    def predict_proba(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """احتماليات [down, up] لكل نموذج مُجمّع"""
+        if not self.is_ready:
+            return {}
+
+        leaf_values = self._leaf_values(X)
+        results = {}
+
+        for name, spec in self.model_specs.items():
+            values = leaf_values[:, spec['start']:spec['end'], :]
+
+            if spec['kind'] == 'mean':
+                proba = values.mean(axis=1)
+            elif spec['kind'] == 'additive':
+                raw = spec['bias'] + values[:, :, 1].sum(axis=1)
+                up = 1.0 / (1.0 + np.exp(-raw))
+                proba = np.column_stack([1.0 - up, up])
+            else:
+                scores = values.sum(axis=1) / (spec['n_classes'] - 1)
+                scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+                proba = scores / scores.sum(axis=1, keepdims=True)
+
+            results[name] = proba
+
+        return results
+
+    # ============ التحقق والقياس ============
+    def verify(self, models: Dict[str, Any], X: np.ndarray) -> Dict[str, Any]:
+        """مقارنة الاحتماليات المُجمّعة مع النماذج الأصلية وإلغاء غير المتطابق"""
+        self.verification = {}
+        if not self.is_ready:
+            return self.verification
+
+        compiled = self.predict_proba(X)
+        for name, proba in compiled.items():
+            try:
+                native = models[name].predict_proba(X)
+                max_diff = float(np.max(np.abs(native - proba)))
+            except Exception as e:
+                max_diff = float('inf')
+                self.compile_errors[name] = f"verification failed: {e}"
+
+            passed = max_diff <= self.tolerance
+            self.verification[name] = {
+                "max_abs_diff": max_diff if np.isfinite(max_diff) else None,
+                "passed": passed
+            }
+
+            if not passed:
+                del self.model_specs[name]
+                self.native_models[name] = models[name]
+                self.compile_errors.setdefault(name, f"mismatch {max_diff:.2e} > {self.tolerance:.0e}")
+
+        return self.verification
+
+    def benchmark(self, models: Dict[str, Any], X: np.ndarray, repeats: int = 20) -> Dict[str, Any]:
+        """مقارنة زمن التمريرة المُجمّعة مع predict_proba الأصلي لنفس النماذج"""
+        if not self.is_ready:
+            return {"error": "compiled ensemble not ready"}
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            self.predict_proba(X)
+        compiled_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for name in self.model_specs:
+                models[name].predict_proba(X)
+        native_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        return {
+            "rows": int(X.shape[0]),
+            "compiled_ms": round(compiled_ms, 3),
+            "native_ms": round(native_ms, 3),
+            "speedup": round(native_ms / compiled_ms, 1) if compiled_ms > 0 else None
+        }
+
+    def get_info(self) -> Dict[str, Any]:
+        """معلومات المحرك المُجمّع"""
+        return {
+            "ready": self.is_ready,
+            "compiled_models": self.compiled_models,
+            "native_models": list(self.native_models.keys()),
+            "total_trees": int(len(self._arrays.get('roots', []))),
+            "total_nodes": int(len(self._arrays.get('feature', []))),
+            "max_depth": int(self._arrays.get('max_depth', 0)),
+            "verification": self.verification,
+            "compile_errors": self.compile_errors
+        }
+
+
+def compile_tree_ensemble(models: Dict[str, Any], n_features: int,
+                          probe_X: Optional[np.ndarray] = None,
+                          tolerance: float = 1e-6) -> CompiledTreeEnsemble:
+    """إنشاء وتجميع محرك أشجار للنماذج المعطاة"""
+    engine = CompiledTreeEnsemble(tolerance=tolerance)
+    engine.compile(models, n_features, probe_X)
+    return engine
@@ -0,0 +1,231 @@
+"""
+Purged Walk-Forward Cross-Validation
+التحقق المتقاطع الزمني مع التطهير وفجوة الحظر
+
+الصفوف في بيانات الأسعار متداخلة زمنياً: هدف الصف i يعتمد على أسعار i+1..i+horizon
+لذلك التقسيم العشوائي يسرّب المستقبل إلى التدريب. هنا كل طية تتدرب على الماضي فقط
+وتُختبر على الفترة التالية، مع حذف آخر horizon صف قبل الاختبار (purge) وفجوة
+إضافية (embargo) لتقليل الارتباط بين نهاية التدريب وبداية الاختبار.
+
+الطيات تعمل في عمليات متوازية، ومصفوفة الميزات تُشارك عبر الذاكرة المشتركة
+بدلاً من نسخها لكل عملية.
+"""
+
+import os
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+# معاملات الخيوط الداخلية - تُضبط على 1 داخل العمليات المتوازية لتجنب تزاحم الأنوية
+THREAD_PARAMS = ('n_jobs', 'thread_count')
+
+
+def single_threaded(estimator):
+    """نسخة من النموذج بخيط داخلي واحد + المعاملات الأصلية لاستعادتها"""
+    estimator = clone(estimator)
+    thread_params = {p: v for p, v in estimator.get_params().items() if p in THREAD_PARAMS}
+    if thread_params:
+        estimator.set_params(**{p: 1 for p in thread_params})
+    return estimator, thread_params
+
+
+class PurgedWalkForwardSplit:
+    """
+    تقسيم زمني متوسع: الطية k تتدرب على [0, test_start - gap) وتُختبر على [test_start, test_end)
+    gap = purge (أفق الهدف) + embargo (افتراضياً 1% من عدد الصفوف)
+
+    متوافق مع واجهة sklearn (split / get_n_splits) فيمكن تمريره كـ cv لأي بحث معاملات
+    """
+
+    def __init__(self, n_splits: int = 5, purge: int = 1, embargo: Optional[int] = None,
+                 test_size: Optional[int] = None, min_train_size: Optional[int] = None):
+        if n_splits < 1:
+            raise ValueError("n_splits يجب أن يكون 1 على الأقل")
+        self.n_splits = n_splits
+        self.purge = max(0, int(purge))
+        self.embargo = embargo
+        self.test_size = test_size
+        self.min_train_size = min_train_size
+
+    def gap(self, n_samples: int) -> int:
+        return self.purge + resolve_embargo(self.embargo, n_samples)
+
+    def get_n_splits(self, X=None, y=None, groups=None) -> int:
+        return self.n_splits
+
+    def split(self, X, y=None, groups=None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        n_samples = len(X)
+        gap = self.gap(n_samples)
+        test_size = self.test_size or (n_samples - gap) // (self.n_splits + 1)
+        min_train = self.min_train_size or test_size
+
+        first_test_start = n_samples - self.n_splits * test_size
+        if test_size < 1 or first_test_start - gap < min_train:
+            raise ValueError(
+                f"بيانات غير كافية لـ {self.n_splits} طيات: {n_samples} صف، "
+                f"اختبار {test_size}، فجوة {gap}"
+            )
+
+        indices = np.arange(n_samples)
+        for k in range(self.n_splits):
+            test_start = first_test_start + k * test_size
+            train_end = test_start - gap
+            yield indices[:train_end], indices[test_start:test_start + test_size]
+
+
+def resolve_embargo(embargo: Optional[int], n_samples: int) -> int:
+    """فجوة الحظر: القيمة المعطاة أو 1% من عدد الصفوف"""
+    if embargo is None:
+        return int(n_samples * 0.01)
+    return max(0, int(embargo))
+
+
+def chronological_train_test_split(X, y, test_size: float = 0.2, purge: int = 1,
+                                   embargo: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    بديل train_test_split للسلاسل الزمنية: الاختبار هو آخر test_size من البيانات
+    وتُحذف purge + embargo صفوف من نهاية التدريب
+    """
+    n_samples = len(X)
+    n_test = max(1, int(round(n_samples * test_size)))
+    train_end = n_samples - n_test - purge - resolve_embargo(embargo, n_samples)
+    if train_end < 1:
+        raise ValueError("بيانات غير كافية للتقسيم الزمني")
+    return X[:train_end], X[n_samples - n_test:], y[:train_end], y[n_samples - n_test:]
+
+
+def _fold_metrics(y_true, y_pred) -> Dict[str, float]:
+    return {
+        "accuracy": float(accuracy_score(y_true, y_pred)),
+        "precision": float(precision_score(y_true, y_pred, average='weighted', zero_division=0)),
+        "recall": float(recall_score(y_true, y_pred, average='weighted', zero_division=0)),
+        "f1_score": float(f1_score(y_true, y_pred, average='weighted', zero_division=0))
+    }
+
+
+def _fit_and_score(estimator, X, y, train_idx, test_idx, scaler=None) -> Dict[str, Any]:
+    """تدريب وتقييم طية واحدة"""
+    start = datetime.now()
+    X_train, X_test = X[train_idx], X[test_idx]
+    y_train, y_test = y[train_idx], y[test_idx]
+
+    if len(np.unique(y_train)) < 2:
+        return {"error": "صنف واحد فقط في بيانات تدريب الطية"}
+
+    if scaler is not None:
+        # المطبّع يُدرَّب على ماضي الطية فقط
+        scaler = clone(scaler)
+        X_train = scaler.fit_transform(X_train)
+        X_test = scaler.transform(X_test)
+
+    estimator.fit(X_train, y_train)
+    metrics = _fold_metrics(y_test, estimator.predict(X_test))
+    metrics.update({
+        "train_samples": int(len(train_idx)),
+        "test_samples": int(len(test_idx)),
+        "fit_time_seconds": round((datetime.now() - start).total_seconds(), 3)
+    })
+    return metrics
+
+
+def _attach(spec: Tuple[str, tuple, str]):
+    """ربط مصفوفة numpy بكتلة ذاكرة مشتركة موجودة (بدون نسخ)"""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _shared_fold_worker(estimator, X_spec, y_spec, train_idx, test_idx, scaler=None) -> Dict[str, Any]:
+    """عامل الطية في عملية منفصلة - يقرأ X و y من الذاكرة المشتركة"""
+    X_shm, X = _attach(X_spec)
+    y_shm, y = _attach(y_spec)
+    try:
+        return _fit_and_score(estimator, X, y, train_idx, test_idx, scaler)
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        del X, y
+        X_shm.close()
+        y_shm.close()
+
+
+def _to_shared(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple[str, tuple, str]]:
+    """نسخ المصفوفة مرة واحدة إلى ذاكرة مشتركة"""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def walk_forward_cross_validate(estimator, X, y, splitter: PurgedWalkForwardSplit = None,
+                                scaler=None, n_jobs: int = -1) -> Dict[str, Any]:
+    """
+    تقييم نموذج بالتحقق الزمني المتقاطع
+
+    n_jobs: عدد العمليات (-1 = عدد الأنوية). مع عملية واحدة تعمل الطيات تسلسلياً بدون ذاكرة مشتركة
+    scaler: مطبّع اختياري يُدرَّب داخل كل طية على بيانات التدريب فقط
+    """
+    start = datetime.now()
+    splitter = splitter or PurgedWalkForwardSplit()
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    folds = list(splitter.split(X, y))
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(folds))
+
+    if n_jobs == 1:
+        fold_results = []
+        for train_idx, test_idx in folds:
+            try:
+                fold_results.append(_fit_and_score(clone(estimator), X, y, train_idx, test_idx, scaler))
+            except Exception as e:
+                fold_results.append({"error": str(e)})
+    else:
+        fold_estimator, _ = single_threaded(estimator)
+        X_shm, X_spec = _to_shared(X)
+        y_shm, y_spec = _to_shared(y)
+        try:
+            # spawn وليس fork: مكتبات OpenMP (LightGBM/XGBoost) قد تتجمد بعد fork
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as executor:
+                futures = [
+                    executor.submit(_shared_fold_worker, fold_estimator, X_spec, y_spec,
+                                    train_idx, test_idx, scaler)
+                    for train_idx, test_idx in folds
+                ]
+                fold_results = [future.result() for future in futures]
+        finally:
+            X_shm.close()
+            X_shm.unlink()
+            y_shm.close()
+            y_shm.unlink()
+
+    return summarize_folds(fold_results, splitter, len(X), n_jobs, (datetime.now() - start).total_seconds())
+
+
+def summarize_folds(fold_results: List[Dict[str, Any]], splitter: PurgedWalkForwardSplit,
+                    n_samples: int, n_jobs: int, elapsed: float) -> Dict[str, Any]:
+    """متوسط وانحراف مقاييس الطيات الناجحة"""
+    valid = [r for r in fold_results if 'error' not in r]
+    summary = {
+        "n_splits": splitter.n_splits,
+        "purge": splitter.purge,
+        "embargo": resolve_embargo(splitter.embargo, n_samples),
+        "successful_folds": len(valid),
+        "workers": n_jobs,
+        "cv_time_seconds": round(elapsed, 2),
+        "folds": fold_results
+    }
+    for metric in ("accuracy", "precision", "recall", "f1_score"):
+        values = [r[metric] for r in valid]
+        summary[f"mean_{metric}"] = round(float(np.mean(values)), 4) if values else None
+        summary[f"std_{metric}"] = round(float(np.std(values)), 4) if values else None
+    return summary